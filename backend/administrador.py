@@ -1,6 +1,7 @@
 # administrador.py
 from db_coneccion import get_mysql_session, get_mongodb
 from auth import get_current_user
+from sqlalchemy import func
 from modelo_sql import Transaccion
 
 def ver_reportes():
@@ -23,12 +24,24 @@ def ver_reportes():
             monto = t.cantidadEjecutada * float(t.precioEjecucion)
             print(f"--- Transacción #{idx} ---")
             print(f" Bolsa: {t.bolsaOrigen}")
-            print(f" Instrumento/Activo: (Buscar en Orden ID: {t.idOrdenCompra} / {t.idOrdenVenta})")
+            print(f" Instrumento/Activo: {t.instrumento or 'N/D'} (Órdenes: {t.idOrdenCompra} / {t.idOrdenVenta})")
             print(f" Cantidad Ejecutada: {t.cantidadEjecutada}")
             print(f" Precio de Ejecución: ${t.precioEjecucion}")
             print(f" Monto Total: ${monto:,.2f}")
             print(f" Fecha: {t.fechaEjecucion.strftime('%Y-%m-%d %H:%M:%S')}\n")
 
+        # Resumen agrupado en MySQL (índice instrumento + fechaEjecucion)
+        resumen = session.query(
+            Transaccion.instrumento,
+            func.count(Transaccion.idTransaccion),
+            func.sum(Transaccion.cantidadEjecutada),
+            func.sum(Transaccion.cantidadEjecutada * Transaccion.precioEjecucion)
+        ).group_by(Transaccion.instrumento).all()
+
+        print(" Resumen por instrumento:")
+        for instrumento, cantidad, volumen, monto in resumen:
+            print(f"  {instrumento or 'N/D':<12} {cantidad:>6} transacciones | Volumen: {volumen} | Monto: ${float(monto):,.2f}")
+
 def configurar_tarifas_mercado():
     user = get_current_user()
     if user is None or user['rol'] != 'Admin':
@@ -1,15 +1,41 @@
 # app.py - VERSIÓN CORREGIDA
-from fastapi import FastAPI, HTTPException, Depends, Header
+from fastapi import FastAPI, HTTPException, Depends, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from pydantic import BaseModel
 from typing import Optional, List
 import bcrypt
+from bson import ObjectId
+from bson.errors import InvalidId
 from datetime import datetime
-from sqlalchemy import text
+from sqlalchemy import text, update, select, func
+import csv
+import io
 
-from db_coneccion import get_mongodb, get_mysql_session
+from db_coneccion import (
+    get_mongodb, get_mysql_session, get_mysql_read_session, registrar_escritura,
+    metricas_circuit_breakers, metricas_replica, Engine_MYSQL, Engine_MYSQL_REPLICA,
+    es_sesion_replica, retraso_replica, REPLICA_MARGEN_ESCRITURA
+)
+from circuit_breaker import CircuitoAbiertoError
+from libro_ordenes import indice_ordenes
+from journal_ordenes import Journal
+from motor_ordenes import procesar_orden, validar_orden, colocacion
+from shards import grupo_shards
+from auditoria import auditoria, COLECCION_AUDITORIA
+from posiciones import libro_posiciones, reconstruir_posiciones
+from riesgo import control_riesgo, COLECCION_LIMITES, CAMPOS_LIMITE
+from subasta import gestor_subastas, calzar, precio_indicativo
+from particiones import leer_archivo, iterar_archivo, agregar_archivo
+from frontend_estatico import frontend_estatico
+from transacciones_recientes import transacciones_recientes
+from consultas_lentas import registro_consultas, MiddlewareRuta
+from versiones import versiones, CACHE_CONTROL
 from modelo_sql import Orden, Transaccion
-import random
+from carga_lote import lanzar_carga, estado_cargas, ruta_en_directorio_cargas, TAM_LOTE
+from bloqueo_instancia import bloqueo_instancia
+import asyncio
+import os
 
 app = FastAPI(title="NUAM Exchange API", version="1.0.0")
 
@@ -22,8 +48,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Registro de consultas lentas (ruta en curso vía contextvar)
+app.add_middleware(MiddlewareRuta)
+registro_consultas.instalar(Engine_MYSQL)
+registro_consultas.instalar(Engine_MYSQL_REPLICA)
+
 sesiones_activas = {}
 
+# Journal de eventos de órdenes (opcional): directorio para journal + snapshots
+JOURNAL_DIR = os.getenv("NUAM_JOURNAL_DIR")
+
+@app.exception_handler(CircuitoAbiertoError)
+async def circuito_abierto_handler(request: Request, exc: CircuitoAbiertoError):
+    """Fallo inmediato (503) mientras una base de datos está marcada como caída."""
+    return JSONResponse(
+        status_code=503,
+        content={"success": False, "message": str(exc)},
+        headers={"Retry-After": str(max(int(exc.reintentar_en), 1))},
+    )
+
 # ============= MODELOS PYDANTIC =============
 
 class LoginRequest(BaseModel):
@@ -48,10 +91,70 @@ class OrdenResponse(BaseModel):
     orden: Optional[dict] = None
     transaccion: Optional[dict] = None
 
+class ModificarOrdenRequest(BaseModel):
+    cantidad: Optional[int] = None
+    precioLimite: Optional[float] = None
+
+class CancelacionResponse(BaseModel):
+    success: bool
+    message: str
+    canceladas: List[int] = []
+
 class TarifaRequest(BaseModel):
     bolsa: str
     tarifa_base: float
 
+class SubastaRequest(BaseModel):
+    instrumento: str
+    bolsa: str
+    intervalo_segundos: Optional[float] = None   # calce periódico; None = calce manual
+
+class CargaRequest(BaseModel):
+    archivo: str  # relativo a NUAM_CARGAS_DIR
+    formato: Optional[str] = None  # csv | ndjson (por defecto según la extensión)
+    idUsuario: Optional[str] = None
+    perfilBolsa: Optional[str] = None
+    lote: int = TAM_LOTE
+    semilla: Optional[int] = None
+
+class LimiteRiesgoRequest(BaseModel):
+    ambito: str                       # 'global', 'bolsa' o 'usuario'
+    clave: Optional[str] = None       # bolsa o idUsuario según el ámbito
+    max_notional_orden: Optional[float] = None
+    max_posicion_instrumento: Optional[int] = None
+    max_ordenes_abiertas: Optional[int] = None
+
+# ============= VERSIONES PARA ETAG =============
+
+def marca_ordenes(id_usuario):
+    """Altas y cambios de las órdenes del usuario (índice idUsuario, fechaActualizacion)."""
+    with get_mysql_session() as session:
+        return tuple(session.execute(
+            select(func.count(), func.max(Orden.fechaActualizacion)).where(Orden.idUsuario == id_usuario)
+        ).one())
+
+def marca_transacciones():
+    with get_mysql_session() as session:
+        return session.execute(select(func.max(Transaccion.idTransaccion))).scalar() or 0
+
+def marca_tarifas():
+    db = get_mongodb()
+    if db is None:
+        return None
+    config_col = db["configuracion_mercado"]
+    ultima = config_col.find_one({}, {"_id": 0, "timestamp": 1}, sort=[("timestamp", -1)])
+    return config_col.count_documents({}), (ultima or {}).get("timestamp")
+
+versiones.registrar_fuente("ordenes", marca_ordenes)
+versiones.registrar_fuente("transacciones", marca_transacciones)
+versiones.registrar_fuente("tarifas", marca_tarifas)
+
+def encabezados_cache(etag):
+    encabezados = {"Cache-Control": CACHE_CONTROL}
+    if etag is not None:
+        encabezados["ETag"] = etag
+    return encabezados
+
 # ============= FUNCIÓN PARA OBTENER TOKEN =============
 
 def get_session_token(authorization: Optional[str] = Header(None)):
@@ -83,6 +186,7 @@ async def login(request: LoginRequest):
     usuario = usuarios_col.find_one({"username": request.username})
     
     if not usuario:
+        auditoria.registrar("login_fallido", None, username=request.username, motivo="usuario_no_encontrado")
         return LoginResponse(
             success=False,
             message="Usuario no encontrado"
@@ -90,6 +194,7 @@ async def login(request: LoginRequest):
     
     password_hash = bytes(usuario['password'])
     if not bcrypt.checkpw(request.password.encode(), password_hash):
+        auditoria.registrar("login_fallido", str(usuario['_id']), username=request.username, motivo="password")
         return LoginResponse(
             success=False,
             message="Contraseña incorrecta"
@@ -105,6 +210,7 @@ async def login(request: LoginRequest):
     }
     
     sesiones_activas[session_token] = user_data
+    auditoria.registrar("login", user_data['idUsuario'], username=user_data['nombre'], rol=user_data['rol'])
     
     return LoginResponse(
         success=True,
@@ -119,6 +225,7 @@ async def logout(session_token: str = Depends(get_session_token)):
     if session_token in sesiones_activas:
         user = sesiones_activas[session_token]
         del sesiones_activas[session_token]
+        auditoria.registrar("logout", user['idUsuario'])
         return {"success": True, "message": f"Sesión cerrada para {user['nombre']}"}
     return {"success": False, "message": "Sesión no encontrada"}
 
@@ -135,86 +242,257 @@ async def colocar_orden(
     if user['rol'] not in ['Operador', 'Admin']:
         raise HTTPException(status_code=403, detail="No tiene permisos para colocar órdenes")
     
-    if request.tipo not in ['Compra', 'Venta']:
-        return OrdenResponse(success=False, message="Tipo de orden inválido")
+    motivo = validar_orden(request.instrumento, request.tipo, request.cantidad)
+    if motivo is not None:
+        return OrdenResponse(success=False, message=motivo)
+    
+    precio_final = request.precioLimite if request.precioLimite and request.precioLimite > 0 else None
+    
+    # Controles pre-trade en memoria; la exposición queda reservada hasta conocer el resultado
+    reserva, ejecutar, motivo = colocacion.reservar(user, request.instrumento, request.tipo, request.cantidad, precio_final)
+    if motivo is not None:
+        auditoria.registrar("orden_rechazada_riesgo", user['idUsuario'], instrumento=request.instrumento,
+                            tipo=request.tipo, cantidad=request.cantidad, precioLimite=precio_final, motivo=motivo)
+        return OrdenResponse(success=False, message=motivo)
+    
+    try:
+        if grupo_shards.activo:
+            # El shard dueño del instrumento procesa sus órdenes en orden de llegada
+            resultado = await asyncio.wrap_future(grupo_shards.enviar_orden(
+                user, request.instrumento, request.tipo, request.cantidad, precio_final, ejecutar
+            ))
+        else:
+            resultado = procesar_orden(user, request.instrumento, request.tipo, request.cantidad, precio_final, ejecutar)
+    except Exception:
+        colocacion.descartar(reserva)
+        raise
+    
+    colocacion.confirmar(user, reserva, resultado)
+    auditoria.registrar("orden_colocada", user['idUsuario'], orden=resultado["orden"])
+    if resultado["transaccion"] is not None:
+        auditoria.registrar("orden_ejecutada", user['idUsuario'], idOrden=resultado["orden"]["idOrden"],
+                            transaccion=resultado["transaccion"], bolsa=user['perfilBolsa'])
+    
+    return OrdenResponse(
+        success=True,
+        message=resultado["mensaje"],
+        orden=resultado["orden"],
+        transaccion=resultado["transaccion"]
+    )
+
+def asegurar_indice_cargado():
+    """Carga el índice de órdenes pendientes si aún no se pudo cargar al iniciar."""
+    if not indice_ordenes.cargado:
+        with get_mysql_session() as session:
+            indice_ordenes.cargar_desde_db(session)
+            control_riesgo.cargar_precios_referencia(session)
+        control_riesgo.cargar_desde_indice(indice_ordenes.ordenes())
+
+def perfil_bolsa_de(id_usuario: str):
+    """perfilBolsa del usuario (de una sesión activa o de MongoDB), o None si no se puede determinar."""
+    for usuario in list(sesiones_activas.values()):
+        if usuario['idUsuario'] == id_usuario:
+            return usuario['perfilBolsa']
+    db = get_mongodb()
+    if db is None:
+        return None
+    try:
+        usuario = db["usuarios"].find_one({"_id": ObjectId(id_usuario)}, {"perfilBolsa": 1})
+    except InvalidId:
+        return None
+    return usuario.get("perfilBolsa") if usuario else None
+
+def tomar_orden_propia(id_orden: int, user: dict):
+    """Retira la orden del índice verificando que el usuario pueda operar sobre ella."""
+    orden = indice_ordenes.obtener(id_orden)
+    if orden is None:
+        raise HTTPException(status_code=404, detail="Orden no encontrada o no está pendiente")
+    if orden.idUsuario != user['idUsuario'] and user['rol'] != 'Admin':
+        raise HTTPException(status_code=403, detail="No puede modificar órdenes de otro usuario")
+    orden = indice_ordenes.tomar(id_orden)
+    if orden is None:
+        raise HTTPException(status_code=404, detail="Orden no encontrada o no está pendiente")
+    return orden
+
+@app.delete("/api/orden/{id_orden}", response_model=OrdenResponse)
+async def cancelar_orden(
+    id_orden: int,
+    session_token: str = Depends(get_session_token)
+):
+    """Cancelar una orden pendiente"""
+    user = get_current_user(session_token)
+    asegurar_indice_cargado()
+    orden = tomar_orden_propia(id_orden, user)
+    
+    try:
+        with get_mysql_session() as session:
+            resultado = session.execute(
+                update(Orden)
+                .where(Orden.idOrden == id_orden, Orden.estado == 'Pendiente')
+                .values(estado='Cancelada')
+            )
+    except Exception:
+        indice_ordenes.devolver(orden)
+        raise
+    
+    if resultado.rowcount == 0:
+        indice_ordenes.descartar(orden)
+        control_riesgo.orden_cerrada(id_orden)
+        return OrdenResponse(success=False, message="La orden ya no está pendiente")
+    
+    registrar_escritura(orden.idUsuario)
+    versiones.invalidar("ordenes", orden.idUsuario)
+    indice_ordenes.confirmar_cancelacion([orden])
+    control_riesgo.orden_cerrada(id_orden)
+    auditoria.registrar("orden_cancelada", orden.idUsuario, idOrden=id_orden, por=user['idUsuario'])
+    orden_data = orden.to_dict()
+    orden_data["estado"] = "Cancelada"
+    return OrdenResponse(success=True, message=f"Orden {id_orden} cancelada", orden=orden_data)
+
+@app.patch("/api/orden/{id_orden}", response_model=OrdenResponse)
+async def modificar_orden(
+    id_orden: int,
+    request: ModificarOrdenRequest,
+    session_token: str = Depends(get_session_token)
+):
+    """Modificar cantidad y/o precio límite de una orden pendiente"""
+    user = get_current_user(session_token)
+    
+    if request.cantidad is None and request.precioLimite is None:
+        return OrdenResponse(success=False, message="Debe indicar cantidad o precioLimite")
     
-    if request.cantidad <= 0:
+    if request.cantidad is not None and request.cantidad <= 0:
         return OrdenResponse(success=False, message="La cantidad debe ser mayor a cero")
     
-    precio_final = request.precioLimite if request.precioLimite and request.precioLimite > 0 else None
+    asegurar_indice_cargado()
+    orden = tomar_orden_propia(id_orden, user)
+    
+    cambios = {}
+    if request.cantidad is not None:
+        cambios["cantidad"] = request.cantidad   # pendiente; en MySQL se suma a lo ya ejecutado
+    if request.precioLimite is not None:
+        cambios["precioLimite"] = request.precioLimite if request.precioLimite > 0 else None
     
-    nueva_orden = Orden(
-        idUsuario=user['idUsuario'],
-        tipo=request.tipo,
-        instrumento=request.instrumento,
-        cantidad=request.cantidad,
-        precioLimite=precio_final
+    # Límites de la bolsa del dueño de la orden (un Admin puede modificar órdenes ajenas)
+    bolsa = user['perfilBolsa'] if orden.idUsuario == user['idUsuario'] else perfil_bolsa_de(orden.idUsuario)
+    if bolsa is None:
+        indice_ordenes.devolver(orden)
+        return OrdenResponse(success=False, message="No se pudo determinar la bolsa del dueño de la orden")
+    
+    motivo = control_riesgo.verificar_modificacion(
+        id_orden, orden.idUsuario, bolsa,
+        cambios.get("cantidad", orden.cantidad), cambios.get("precioLimite", orden.precioLimite)
     )
+    if motivo is not None:
+        indice_ordenes.devolver(orden)
+        return OrdenResponse(success=False, message=motivo)
     
-    with get_mysql_session() as session:
-        session.add(nueva_orden)
-        session.flush()
-        
-        orden_data = {
-            "idOrden": nueva_orden.idOrden,
-            "tipo": nueva_orden.tipo,
-            "instrumento": nueva_orden.instrumento,
-            "cantidad": nueva_orden.cantidad,
-            "precioLimite": float(nueva_orden.precioLimite) if nueva_orden.precioLimite else None,
-            "estado": nueva_orden.estado,
-            "fechaCreacion": nueva_orden.fechaCreacion.isoformat()
-        }
-        
-        transaccion_data = None
-        if random.random() < 0.7:
-            precio_ejecucion = precio_final if precio_final else round(random.uniform(90.00, 100.00), 2)
-            
-            nueva_orden.estado = 'Ejecutada'
-            
-            transaccion = Transaccion(
-                idOrdenCompra=str(nueva_orden.idOrden) if request.tipo == 'Compra' else 'MATCH_FICTICIO',
-                idOrdenVenta=str(nueva_orden.idOrden) if request.tipo == 'Venta' else 'MATCH_FICTICIO',
-                precioEjecucion=precio_ejecucion,
-                cantidadEjecutada=request.cantidad,
-                fechaEjecucion=datetime.utcnow(),
-                bolsaOrigen=user['perfilBolsa']
+    try:
+        with get_mysql_session() as session:
+            resultado = session.execute(
+                update(Orden)
+                .where(Orden.idOrden == id_orden, Orden.estado == 'Pendiente')
+                .values(**{k: func.coalesce(Orden.cantidadEjecutada, 0) + v if k == "cantidad" else v
+                           for k, v in cambios.items()})
             )
-            session.add(transaccion)
-            session.flush()
-            
-            transaccion_data = {
-                "idTransaccion": transaccion.idTransaccion,
-                "precioEjecucion": float(transaccion.precioEjecucion),
-                "cantidadEjecutada": transaccion.cantidadEjecutada,
-                "monto": float(transaccion.precioEjecucion) * transaccion.cantidadEjecutada,
-                "fechaEjecucion": transaccion.fechaEjecucion.isoformat()
-            }
-            
-            orden_data["estado"] = "Ejecutada"
-            mensaje = f"Orden ejecutada exitosamente a ${precio_ejecucion}"
-        else:
-            mensaje = "Orden registrada. Pendiente de match en el Order Book"
-        
-        return OrdenResponse(
-            success=True,
-            message=mensaje,
-            orden=orden_data,
-            transaccion=transaccion_data
-        )
+    except Exception:
+        indice_ordenes.devolver(orden)
+        raise
+    
+    if resultado.rowcount == 0:
+        indice_ordenes.descartar(orden)
+        control_riesgo.orden_cerrada(id_orden)
+        return OrdenResponse(success=False, message="La orden ya no está pendiente")
+    
+    orden.cantidad = cambios.get("cantidad", orden.cantidad)
+    orden.precioLimite = cambios.get("precioLimite", orden.precioLimite)
+    registrar_escritura(orden.idUsuario)
+    versiones.invalidar("ordenes", orden.idUsuario)
+    indice_ordenes.confirmar_modificacion(orden)
+    control_riesgo.orden_modificada(id_orden, orden.cantidad)
+    auditoria.registrar("orden_modificada", orden.idUsuario, idOrden=id_orden, por=user['idUsuario'],
+                        cantidad=orden.cantidad, precioLimite=orden.precioLimite)
+    
+    return OrdenResponse(success=True, message=f"Orden {id_orden} modificada", orden=orden.to_dict())
+
+@app.delete("/api/ordenes", response_model=CancelacionResponse)
+async def cancelar_ordenes(
+    instrumento: Optional[str] = None,
+    idUsuario: Optional[str] = None,
+    session_token: str = Depends(get_session_token)
+):
+    """Cancelar todas las órdenes pendientes del usuario (opcionalmente de un instrumento).
+    Un Admin puede indicar otro idUsuario, o solo el instrumento para cancelarlo completo."""
+    user = get_current_user(session_token)
+    
+    if user['rol'] == 'Admin':
+        if idUsuario is None and instrumento is None:
+            idUsuario = user['idUsuario']
+    else:
+        if idUsuario is not None and idUsuario != user['idUsuario']:
+            raise HTTPException(status_code=403, detail="No puede cancelar órdenes de otro usuario")
+        idUsuario = user['idUsuario']
+    
+    asegurar_indice_cargado()
+    ordenes = indice_ordenes.tomar_varias(idUsuario, instrumento)
+    if not ordenes:
+        return CancelacionResponse(success=True, message="No hay órdenes pendientes para cancelar")
+    
+    ids = [o.idOrden for o in ordenes]
+    try:
+        with get_mysql_session() as session:
+            session.execute(
+                update(Orden)
+                .where(Orden.idOrden.in_(ids), Orden.estado == 'Pendiente')
+                .values(estado='Cancelada')
+            )
+    except Exception:
+        for o in ordenes:
+            indice_ordenes.devolver(o)
+        raise
+    
+    for id_usuario in {o.idUsuario for o in ordenes}:
+        registrar_escritura(id_usuario)
+        versiones.invalidar("ordenes", id_usuario)
+    indice_ordenes.confirmar_cancelacion(ordenes)
+    for id_orden in ids:
+        control_riesgo.orden_cerrada(id_orden)
+    auditoria.registrar("cancelacion_masiva", idUsuario, instrumento=instrumento, por=user['idUsuario'], ids=ids)
+    
+    return CancelacionResponse(
+        success=True,
+        message=f"{len(ids)} órdenes canceladas",
+        canceladas=ids
+    )
 
 @app.get("/api/ordenes")
 async def obtener_ordenes(
+    response: Response,
     limite: int = 20,
-    session_token: str = Depends(get_session_token)
+    session_token: str = Depends(get_session_token),
+    if_none_match: Optional[str] = Header(None)
 ):
     """Obtener las últimas órdenes del usuario"""
     user = get_current_user(session_token)
     
-    with get_mysql_session() as session:
+    # La versión se lee antes que los datos: si cambian entre medio, el ETag queda viejo (nunca adelantado)
+    clave = ("ordenes", user['idUsuario'])
+    etag = versiones.etag(clave, limite)
+    encabezados = encabezados_cache(etag)
+    if versiones.no_modificado(if_none_match, etag):
+        return Response(status_code=304, headers=encabezados)
+    
+    with get_mysql_read_session(user['idUsuario']) as session:
         ordenes = session.query(Orden).filter(
             Orden.idUsuario == user['idUsuario']
         ).order_by(Orden.fechaCreacion.desc()).limit(limite).all()
         
+        # Un cambio de otro proceso puede no haber llegado aún a la réplica: sin ETag para esta versión
+        if es_sesion_replica(session) and versiones.cambio_reciente(
+                clave, (retraso_replica() or 0) + REPLICA_MARGEN_ESCRITURA):
+            encabezados.pop("ETag", None)
+        response.headers.update(encabezados)
+        
         return {
             "success": True,
             "ordenes": [
@@ -223,6 +501,7 @@ async def obtener_ordenes(
                     "tipo": o.tipo,
                     "instrumento": o.instrumento,
                     "cantidad": o.cantidad,
+                    "cantidadEjecutada": o.cantidadEjecutada or 0,
                     "precioLimite": float(o.precioLimite) if o.precioLimite else None,
                     "estado": o.estado,
                     "fechaCreacion": o.fechaCreacion.isoformat()
@@ -231,40 +510,294 @@ async def obtener_ordenes(
             ]
         }
 
+@app.get("/api/posiciones")
+async def obtener_posiciones(
+    idUsuario: Optional[str] = None,
+    session_token: str = Depends(get_session_token)
+):
+    """Posición neta y costo promedio por instrumento (desde memoria)"""
+    user = get_current_user(session_token)
+    
+    if idUsuario is not None and idUsuario != user['idUsuario'] and user['rol'] != 'Admin':
+        raise HTTPException(status_code=403, detail="No puede ver posiciones de otro usuario")
+    
+    posiciones = libro_posiciones.de_usuario(idUsuario or user['idUsuario'])
+    
+    return {
+        "success": True,
+        "posiciones": [
+            dict(instrumento=instrumento, **estado.to_dict())
+            for instrumento, estado in sorted(posiciones.items())
+        ]
+    }
+
 # ============= RUTAS DE ADMINISTRADOR =============
 
+def serializar_transaccion(t):
+    """Convierte una fila de `transacciones` (MySQL o archivo) a dict JSON."""
+    return {
+        "idTransaccion": t["idTransaccion"],
+        "bolsaOrigen": t["bolsaOrigen"],
+        "instrumento": t.get("instrumento"),
+        "idOrdenCompra": t["idOrdenCompra"],
+        "idOrdenVenta": t["idOrdenVenta"],
+        "cantidadEjecutada": t["cantidadEjecutada"],
+        "precioEjecucion": float(t["precioEjecucion"]),
+        "monto": t["cantidadEjecutada"] * float(t["precioEjecucion"]),
+        "fechaEjecucion": t["fechaEjecucion"].isoformat()
+    }
+
+LADOS_TRANSACCION = {"Compra": "idOrdenCompraRef", "Venta": "idOrdenVentaRef"}
+AGRUPACIONES_REPORTE = ("instrumento", "bolsaOrigen", "dia")
+
+def validar_filtros_reporte(bolsa: Optional[str], lado: Optional[str], group_by: Optional[str] = None):
+    """Mensaje de error si algún filtro de /api/reportes es inválido, o None"""
+    if bolsa is not None and bolsa not in ['CL', 'PE', 'CO']:
+        return "Bolsa inválida"
+    if lado is not None and lado not in LADOS_TRANSACCION:
+        return "Lado inválido: use Compra o Venta"
+    if group_by is not None:
+        invalidas = [c for c in group_by.split(",") if c.strip() not in AGRUPACIONES_REPORTE]
+        if invalidas or not group_by.strip():
+            return f"group_by inválido: use {', '.join(AGRUPACIONES_REPORTE)}"
+    return None
+
+def condiciones_transacciones(desde, hasta, instrumento=None, bolsa=None, lado=None, monto_minimo=None):
+    """Condiciones WHERE sobre `transacciones`; la fecha primero (poda de particiones e índices)."""
+    condiciones = []
+    if desde is not None:
+        condiciones.append(Transaccion.fechaEjecucion >= desde)
+    if hasta is not None:
+        condiciones.append(Transaccion.fechaEjecucion < hasta)
+    if instrumento is not None:
+        condiciones.append(Transaccion.instrumento == instrumento)
+    if bolsa is not None:
+        condiciones.append(Transaccion.bolsaOrigen == bolsa)
+    if lado is not None:
+        # Lado con una orden real (no MATCH_FICTICIO) en la transacción
+        condiciones.append(getattr(Transaccion, LADOS_TRANSACCION[lado]).is_not(None))
+    if monto_minimo is not None:
+        condiciones.append(Transaccion.monto >= monto_minimo)
+    return condiciones
+
+def filtros_archivo_transacciones(instrumento=None, bolsa=None, lado=None, monto_minimo=None):
+    """Los mismos filtros en el formato de particiones.iterar_archivo/agregar_archivo."""
+    filtros = {}
+    if instrumento is not None:
+        filtros["instrumento"] = instrumento
+    if bolsa is not None:
+        filtros["bolsaOrigen"] = bolsa
+    if lado is not None:
+        filtros[LADOS_TRANSACCION[lado]] = ("no_nulo", None)
+    if monto_minimo is not None:
+        filtros["monto"] = (">=", monto_minimo)
+    return filtros or None
+
+def consulta_transacciones(desde: Optional[datetime], hasta: Optional[datetime], instrumento: Optional[str] = None,
+                           bolsa: Optional[str] = None, lado: Optional[str] = None,
+                           monto_minimo: Optional[float] = None):
+    """SELECT sobre `transacciones` acotado por fecha (poda de particiones) y filtros."""
+    return (
+        select(Transaccion.__table__)
+        .where(*condiciones_transacciones(desde, hasta, instrumento, bolsa, lado, monto_minimo))
+        .order_by(Transaccion.fechaEjecucion.desc())
+    )
+
+def agregado_transacciones(session, agrupar, desde, hasta, instrumento=None, bolsa=None, lado=None,
+                           monto_minimo=None):
+    """
+    Transacciones, volumen, monto y VWAP por las columnas `agrupar`: GROUP BY en
+    SQL (sobre el índice de agregados) más el agregado del archivo Parquet.
+    """
+    columnas = [
+        func.date(Transaccion.fechaEjecucion).label("dia") if c == "dia" else getattr(Transaccion, c)
+        for c in agrupar
+    ]
+    consulta = select(
+        *columnas,
+        func.count().label("transacciones"),
+        func.sum(Transaccion.cantidadEjecutada).label("volumen"),
+        func.sum(Transaccion.monto).label("monto")
+    ).where(
+        *condiciones_transacciones(desde, hasta, instrumento, bolsa, lado, monto_minimo)
+    ).group_by(*columnas)
+    filas = list(session.execute(consulta).mappings().all())
+    filas += agregar_archivo("transacciones", agrupar, desde, hasta,
+                             filtros_archivo_transacciones(instrumento, bolsa, lado, monto_minimo))
+    
+    resumen = {}
+    for fila in filas:
+        clave = tuple(str(fila[c]) if c == "dia" else fila[c] for c in agrupar)
+        actual = resumen.setdefault(clave, {"transacciones": 0, "volumen": 0, "monto": 0.0})
+        actual["transacciones"] += fila["transacciones"]
+        actual["volumen"] += int(fila["volumen"] or 0)
+        actual["monto"] += float(fila["monto"] or 0)
+    
+    grupos = [
+        dict(zip(agrupar, clave), vwap=d["monto"] / d["volumen"] if d["volumen"] else None, **d)
+        for clave, d in resumen.items()
+    ]
+    if "dia" in agrupar:
+        grupos.sort(key=lambda g: g["dia"], reverse=True)
+    else:
+        grupos.sort(key=lambda g: g["monto"], reverse=True)
+    return grupos
+
+def ultimas_transacciones(session, limite: int):
+    """Las `limite` transacciones más recientes de MySQL, completadas con el archivo."""
+    transacciones = list(session.execute(consulta_transacciones(None, None).limit(limite)).mappings().all())
+    # Los meses archivados son siempre más antiguos que los que siguen en MySQL
+    if len(transacciones) < limite:
+        transacciones += leer_archivo("transacciones", None, None, None, limite=limite - len(transacciones))
+    return [serializar_transaccion(t) for t in transacciones]
+
 @app.get("/api/reportes")
 async def ver_reportes(
+    response: Response,
     limite: int = 10,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    instrumento: Optional[str] = None,
+    bolsaOrigen: Optional[str] = None,
+    lado: Optional[str] = None,
+    monto_minimo: Optional[float] = None,
+    group_by: Optional[str] = None,
+    session_token: str = Depends(get_session_token),
+    if_none_match: Optional[str] = Header(None)
+):
+    """
+    Ver reporte consolidado de transacciones (Solo Admin).
+    Filtros: desde/hasta, instrumento, bolsaOrigen, lado (Compra/Venta) y
+    monto_minimo. Con group_by (instrumento,bolsaOrigen,dia) retorna los
+    agregados calculados en la base en lugar de las transacciones.
+    """
+    user = get_current_user(session_token)
+    
+    if user['rol'] != 'Admin':
+        raise HTTPException(status_code=403, detail="Solo administradores pueden ver reportes")
+    
+    error = validar_filtros_reporte(bolsaOrigen, lado, group_by)
+    if error:
+        return {"success": False, "message": error}
+    filtros = dict(instrumento=instrumento, bolsa=bolsaOrigen, lado=lado, monto_minimo=monto_minimo)
+    
+    etag = versiones.etag(("transacciones",), limite, desde, hasta, group_by, *filtros.values())
+    encabezados = encabezados_cache(etag)
+    if versiones.no_modificado(if_none_match, etag):
+        return Response(status_code=304, headers=encabezados)
+    
+    if group_by is not None:
+        agrupar = list(dict.fromkeys(c.strip() for c in group_by.split(",")))
+        with get_mysql_read_session() as session:
+            grupos = agregado_transacciones(session, agrupar, desde, hasta, **filtros)
+            desde_replica = es_sesion_replica(session)
+        if not (desde_replica and versiones.cambio_reciente(
+                ("transacciones",), (retraso_replica() or 0) + REPLICA_MARGEN_ESCRITURA)):
+            response.headers.update(encabezados)
+        return {"success": True, "group_by": agrupar, "grupos": grupos}
+    
+    # Últimas N sin filtros: desde el buffer en memoria (o se vuelve a llenar desde MySQL)
+    sin_filtros = desde is None and hasta is None and all(v is None for v in filtros.values())
+    if sin_filtros and 0 < limite <= transacciones_recientes.capacidad:
+        response.headers.update(encabezados)
+        # La marca de versiones detecta transacciones escritas por otros procesos
+        datos = transacciones_recientes.ultimas(limite, versiones.version("transacciones"))
+        if datos is None:
+            with get_mysql_session() as session:
+                recientes = ultimas_transacciones(session, transacciones_recientes.capacidad)
+            transacciones_recientes.cargar(recientes)
+            return {"success": True, "transacciones": recientes[:limite]}
+        return Response(b'{"success":true,"transacciones":' + datos + b'}', media_type="application/json",
+                        headers=encabezados)
+    
+    with get_mysql_read_session() as session:
+        transacciones = session.execute(
+            consulta_transacciones(desde, hasta, **filtros).limit(limite)
+        ).mappings().all()
+        desde_replica = es_sesion_replica(session)
+    
+    # Si la réplica pudo no tener aún las últimas ejecuciones, no se fija ETag para esta versión
+    if not (desde_replica and versiones.cambio_reciente(
+            ("transacciones",), (retraso_replica() or 0) + REPLICA_MARGEN_ESCRITURA)):
+        response.headers.update(encabezados)
+    
+    # Los meses archivados son siempre más antiguos que los que siguen en MySQL
+    transacciones = list(transacciones)
+    if len(transacciones) < limite:
+        transacciones += leer_archivo("transacciones", desde, hasta, filtros_archivo_transacciones(**filtros),
+                                      limite=limite - len(transacciones))
+    
+    return {
+        "success": True,
+        "transacciones": [serializar_transaccion(t) for t in transacciones]
+    }
+
+@app.get("/api/reportes/por-instrumento")
+async def reporte_por_instrumento(
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
     session_token: str = Depends(get_session_token)
 ):
-    """Ver reporte consolidado de transacciones (Solo Admin)"""
+    """Volumen, monto y VWAP por instrumento, agregados en SQL y en el archivo (Solo Admin)"""
     user = get_current_user(session_token)
     
     if user['rol'] != 'Admin':
         raise HTTPException(status_code=403, detail="Solo administradores pueden ver reportes")
     
-    with get_mysql_session() as session:
-        transacciones = session.query(Transaccion).order_by(
-            Transaccion.fechaEjecucion.desc()
-        ).limit(limite).all()
-        
-        return {
-            "success": True,
-            "transacciones": [
-                {
-                    "idTransaccion": t.idTransaccion,
-                    "bolsaOrigen": t.bolsaOrigen,
-                    "idOrdenCompra": t.idOrdenCompra,
-                    "idOrdenVenta": t.idOrdenVenta,
-                    "cantidadEjecutada": t.cantidadEjecutada,
-                    "precioEjecucion": float(t.precioEjecucion),
-                    "monto": t.cantidadEjecutada * float(t.precioEjecucion),
-                    "fechaEjecucion": t.fechaEjecucion.isoformat()
-                }
-                for t in transacciones
-            ]
-        }
+    with get_mysql_read_session() as session:
+        instrumentos = agregado_transacciones(session, ["instrumento"], desde, hasta)
+    
+    return {"success": True, "instrumentos": instrumentos}
+
+@app.get("/api/reportes/exportar")
+async def exportar_reportes(
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    instrumento: Optional[str] = None,
+    bolsaOrigen: Optional[str] = None,
+    lado: Optional[str] = None,
+    monto_minimo: Optional[float] = None,
+    session_token: str = Depends(get_session_token)
+):
+    """Exportar transacciones a CSV, incluyendo los meses archivados (Solo Admin)"""
+    user = get_current_user(session_token)
+    
+    if user['rol'] != 'Admin':
+        raise HTTPException(status_code=403, detail="Solo administradores pueden exportar reportes")
+    
+    error = validar_filtros_reporte(bolsaOrigen, lado)
+    if error:
+        return {"success": False, "message": error}
+    filtros = dict(instrumento=instrumento, bolsa=bolsaOrigen, lado=lado, monto_minimo=monto_minimo)
+    
+    columnas = ["idTransaccion", "bolsaOrigen", "instrumento", "idOrdenCompra", "idOrdenVenta",
+                "cantidadEjecutada", "precioEjecucion", "monto", "fechaEjecucion"]
+    
+    def generar_csv():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=columnas)
+        writer.writeheader()
+        with get_mysql_read_session() as session:
+            resultado = session.execute(
+                consulta_transacciones(desde, hasta, **filtros).execution_options(stream_results=True, yield_per=5000)
+            ).mappings()
+            for lote in resultado.partitions():
+                writer.writerows(serializar_transaccion(t) for t in lote)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        for lote in iterar_archivo("transacciones", desde, hasta, filtros_archivo_transacciones(**filtros)):
+            writer.writerows(serializar_transaccion(t) for t in lote)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    
+    return StreamingResponse(
+        generar_csv(),
+        media_type="text/csv",
+        headers={"Content-Disposition": "attachment; filename=transacciones.csv"}
+    )
 
 @app.post("/api/tarifas")
 async def configurar_tarifas(
@@ -291,6 +824,8 @@ async def configurar_tarifas(
         {"$set": {"tarifa_base": request.tarifa_base, "timestamp": datetime.now()}},
         upsert=True
     )
+    versiones.invalidar("tarifas")
+    auditoria.registrar("tarifa_configurada", user['idUsuario'], bolsa=request.bolsa, tarifa_base=request.tarifa_base)
     
     return {
         "success": True,
@@ -298,26 +833,432 @@ async def configurar_tarifas(
     }
 
 @app.get("/api/tarifas")
-async def obtener_tarifas(session_token: str = Depends(get_session_token)):
+async def obtener_tarifas(
+    response: Response,
+    session_token: str = Depends(get_session_token),
+    if_none_match: Optional[str] = Header(None)
+):
     """Obtener tarifas configuradas"""
     user = get_current_user(session_token)
     
+    etag = versiones.etag(("tarifas",))
+    if versiones.no_modificado(if_none_match, etag):
+        return Response(status_code=304, headers=encabezados_cache(etag))
+    
     db = get_mongodb()
     if db is None:
         raise HTTPException(status_code=500, detail="Error de conexión a MongoDB")
     
     config_col = db["configuracion_mercado"]
     tarifas = list(config_col.find({}, {"_id": 0}))
+    response.headers.update(encabezados_cache(etag))
     
     return {
         "success": True,
         "tarifas": tarifas
     }
 
+@app.get("/api/auditoria")
+async def consultar_auditoria(
+    idUsuario: Optional[str] = None,
+    evento: Optional[str] = None,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    limite: int = 100,
+    session_token: str = Depends(get_session_token)
+):
+    """Consultar el registro de auditoría (Solo Admin)"""
+    user = get_current_user(session_token)
+    
+    if user['rol'] != 'Admin':
+        raise HTTPException(status_code=403, detail="Solo administradores pueden ver la auditoría")
+    
+    db = get_mongodb()
+    if db is None:
+        raise HTTPException(status_code=500, detail="Error de conexión a MongoDB")
+    
+    filtro = {}
+    if idUsuario:
+        filtro["idUsuario"] = idUsuario
+    if evento:
+        filtro["evento"] = evento
+    if desde or hasta:
+        filtro["timestamp"] = {}
+        if desde:
+            filtro["timestamp"]["$gte"] = desde
+        if hasta:
+            filtro["timestamp"]["$lt"] = hasta
+    
+    eventos = db[COLECCION_AUDITORIA].find(filtro, {"_id": 0}).sort("timestamp", -1).limit(min(limite, 1000))
+    
+    return {
+        "success": True,
+        "eventos": [dict(e, timestamp=e["timestamp"].isoformat()) for e in eventos]
+    }
+
+@app.post("/api/posiciones/reconstruir")
+async def reconstruir_posiciones_endpoint(session_token: str = Depends(get_session_token)):
+    """Recalcular posiciones desde el historial de ejecuciones (Solo Admin)"""
+    user = get_current_user(session_token)
+    
+    if user['rol'] != 'Admin':
+        raise HTTPException(status_code=403, detail="Solo administradores pueden reconstruir posiciones")
+    
+    def reconstruir():
+        # Las ejecuciones de todos los procesos esperan mientras se reescribe la tabla (ver posiciones.py)
+        total = reconstruir_posiciones()
+        with get_mysql_session() as session:
+            libro_posiciones.cargar_desde_db(session)
+        return total
+    
+    total = await asyncio.to_thread(reconstruir)
+    auditoria.registrar("posiciones_reconstruidas", user['idUsuario'], total=total)
+    
+    return {"success": True, "message": f"{total} posiciones reconstruidas"}
+
+@app.get("/api/riesgo/limites")
+async def obtener_limites_riesgo(session_token: str = Depends(get_session_token)):
+    """Límites pre-trade vigentes (Solo Admin)"""
+    user = get_current_user(session_token)
+    
+    if user['rol'] != 'Admin':
+        raise HTTPException(status_code=403, detail="Solo administradores pueden ver los límites de riesgo")
+    
+    return {"success": True, "limites": control_riesgo.limites(), "metricas": control_riesgo.metricas()}
+
+@app.post("/api/riesgo/limites")
+async def configurar_limites_riesgo(
+    request: LimiteRiesgoRequest,
+    session_token: str = Depends(get_session_token)
+):
+    """Configurar límites pre-trade globales, por bolsa o por usuario (Solo Admin)"""
+    user = get_current_user(session_token)
+    
+    if user['rol'] != 'Admin':
+        raise HTTPException(status_code=403, detail="Solo administradores pueden configurar límites de riesgo")
+    
+    if request.ambito not in ['global', 'bolsa', 'usuario']:
+        return {"success": False, "message": "Ámbito inválido"}
+    if request.ambito == 'bolsa' and request.clave not in ['CL', 'PE', 'CO']:
+        return {"success": False, "message": "Bolsa inválida"}
+    if request.ambito == 'usuario' and not request.clave:
+        return {"success": False, "message": "Debe indicar el idUsuario"}
+    
+    valores = {c: getattr(request, c) for c in CAMPOS_LIMITE if getattr(request, c) is not None}
+    if not valores:
+        return {"success": False, "message": "Debe indicar al menos un límite"}
+    if any(v <= 0 for v in valores.values()):
+        return {"success": False, "message": "Los límites deben ser mayores a cero"}
+    
+    db = get_mongodb()
+    if db is None:
+        raise HTTPException(status_code=500, detail="Error de conexión a MongoDB")
+    
+    clave = None if request.ambito == 'global' else request.clave
+    db[COLECCION_LIMITES].update_one(
+        {"ambito": request.ambito, "clave": clave},
+        {"$set": dict(valores, timestamp=datetime.now())},
+        upsert=True
+    )
+    control_riesgo.fijar_limites(request.ambito, clave, **valores)
+    auditoria.registrar("limites_riesgo_configurados", user['idUsuario'], ambito=request.ambito, clave=clave, **valores)
+    
+    return {"success": True, "message": "Límites de riesgo actualizados", "limites": control_riesgo.limites()}
+
+# ============= CONSULTAS LENTAS =============
+
+@app.get("/api/consultas-lentas")
+async def reporte_consultas_lentas(
+    limite: int = 50,
+    session_token: str = Depends(get_session_token)
+):
+    """Consultas MySQL sobre el umbral agrupadas por forma, con EXPLAIN e índices sugeridos (Solo Admin)"""
+    user = get_current_user(session_token)
+    
+    if user['rol'] != 'Admin':
+        raise HTTPException(status_code=403, detail="Solo administradores pueden ver las consultas lentas")
+    
+    return {"success": True, **registro_consultas.reporte(limite)}
+
+@app.delete("/api/consultas-lentas")
+async def reiniciar_consultas_lentas(session_token: str = Depends(get_session_token)):
+    """Vacía el registro, p. ej. tras crear los índices sugeridos (Solo Admin)"""
+    user = get_current_user(session_token)
+    
+    if user['rol'] != 'Admin':
+        raise HTTPException(status_code=403, detail="Solo administradores pueden reiniciar el registro")
+    
+    registro_consultas.reiniciar()
+    return {"success": True, "message": "Registro de consultas lentas reiniciado"}
+
+# ============= CARGAS POR LOTES =============
+
+@app.post("/api/cargas")
+async def iniciar_carga(request: CargaRequest, session_token: str = Depends(get_session_token)):
+    """Cargar órdenes desde un CSV/NDJSON de NUAM_CARGAS_DIR en segundo plano (Solo Admin)"""
+    user = get_current_user(session_token)
+    
+    if user['rol'] != 'Admin':
+        raise HTTPException(status_code=403, detail="Solo administradores pueden cargar órdenes por lotes")
+    if request.formato not in (None, "csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="Formato inválido (csv o ndjson)")
+    if request.perfilBolsa is not None and request.perfilBolsa not in ("CL", "PE", "CO"):
+        raise HTTPException(status_code=400, detail="Bolsa inválida")
+    if request.lote <= 0:
+        raise HTTPException(status_code=400, detail="El tamaño de lote debe ser mayor a cero")
+    
+    ruta = ruta_en_directorio_cargas(request.archivo)
+    if ruta is None:
+        raise HTTPException(status_code=404, detail="Archivo no encontrado en el directorio de cargas")
+    
+    # El hash del archivo (idCarga) y el hilo de la carga no bloquean el event loop
+    id_carga = await asyncio.to_thread(
+        lanzar_carga, ruta, request.formato, request.lote, request.idUsuario, request.perfilBolsa, request.semilla
+    )
+    if id_carga is None:
+        raise HTTPException(status_code=409, detail="Esa carga ya está en curso")
+    auditoria.registrar("carga_lote_iniciada", user['idUsuario'], idCarga=id_carga, archivo=request.archivo)
+    
+    return {"success": True, "message": "Carga iniciada", "idCarga": id_carga}
+
+@app.get("/api/cargas")
+async def obtener_cargas(session_token: str = Depends(get_session_token)):
+    """Avance de las cargas por lotes (Solo Admin)"""
+    user = get_current_user(session_token)
+    
+    if user['rol'] != 'Admin':
+        raise HTTPException(status_code=403, detail="Solo administradores pueden ver las cargas por lotes")
+    
+    with get_mysql_session() as session:
+        cargas = estado_cargas(session)
+    return {"success": True, "cargas": cargas}
+
+# ============= SUBASTAS =============
+
+def aplicar_calce(resumen: dict, por: Optional[str] = None):
+    """Refleja un calce en los controles de riesgo, leer-lo-escrito y auditoría."""
+    if resumen["precio"] is not None:
+        control_riesgo.precio_referencia[resumen["instrumento"]] = resumen["precio"]
+    for id_orden, _, _, restante in resumen["ejecuciones"]:
+        if restante:
+            control_riesgo.orden_modificada(id_orden, restante)
+        else:
+            control_riesgo.orden_cerrada(id_orden)
+    for id_orden, _ in resumen["retiradas"]:
+        control_riesgo.orden_cerrada(id_orden)
+    for id_usuario in {e[1] for e in resumen["ejecuciones"] + resumen["retiradas"]}:
+        registrar_escritura(id_usuario)
+        versiones.invalidar("ordenes", id_usuario)
+    if resumen["transacciones"]:
+        versiones.invalidar("transacciones")
+        transacciones_recientes.invalidar()
+    auditoria.registrar("subasta_calzada", por, instrumento=resumen["instrumento"], precio=resumen["precio"],
+                        volumen=resumen["volumen"], transacciones=resumen["transacciones"])
+    return {k: v for k, v in resumen.items() if k not in ("ejecuciones", "retiradas")}
+
+@app.get("/api/subastas")
+async def obtener_subastas(session_token: str = Depends(get_session_token)):
+    """Instrumentos en fase de subasta con su precio y volumen indicativos"""
+    get_current_user(session_token)
+    
+    subastas = gestor_subastas.estado()
+    for instrumento, subasta in subastas.items():
+        precio, volumen, desbalance = precio_indicativo(
+            indice_ordenes.de_instrumento(instrumento), control_riesgo.precio_referencia.get(instrumento)
+        )
+        subasta.update(precio_indicativo=precio, volumen_indicativo=volumen, desbalance=desbalance)
+    return {"success": True, "subastas": subastas}
+
+@app.post("/api/subastas")
+async def abrir_subasta(
+    request: SubastaRequest,
+    session_token: str = Depends(get_session_token)
+):
+    """Poner un instrumento en fase de subasta (Solo Admin)"""
+    user = get_current_user(session_token)
+    
+    if user['rol'] != 'Admin':
+        raise HTTPException(status_code=403, detail="Solo administradores pueden abrir subastas")
+    
+    if request.bolsa not in ['CL', 'PE', 'CO']:
+        return {"success": False, "message": "Bolsa inválida"}
+    if request.intervalo_segundos is not None and request.intervalo_segundos <= 0:
+        return {"success": False, "message": "El intervalo debe ser mayor a cero"}
+    
+    asegurar_indice_cargado()
+    gestor_subastas.abrir(request.instrumento, request.bolsa, request.intervalo_segundos)
+    auditoria.registrar("subasta_abierta", user['idUsuario'], instrumento=request.instrumento,
+                        bolsa=request.bolsa, intervalo=request.intervalo_segundos)
+    
+    return {"success": True, "message": f"{request.instrumento} en fase de subasta ({request.bolsa})"}
+
+@app.post("/api/subastas/{instrumento}/calzar")
+async def calzar_subasta(
+    instrumento: str,
+    cerrar: bool = True,
+    session_token: str = Depends(get_session_token)
+):
+    """Calce de la subasta; con cerrar=true el instrumento vuelve a negociación continua (Solo Admin)"""
+    user = get_current_user(session_token)
+    
+    if user['rol'] != 'Admin':
+        raise HTTPException(status_code=403, detail="Solo administradores pueden calzar subastas")
+    
+    subasta = gestor_subastas.obtener(instrumento)
+    if subasta is None:
+        raise HTTPException(status_code=404, detail="El instrumento no está en subasta")
+    
+    resumen = await asyncio.to_thread(
+        calzar, instrumento, subasta["bolsa"], control_riesgo.precio_referencia.get(instrumento)
+    )
+    if cerrar:
+        gestor_subastas.cerrar(instrumento)
+    
+    return {"success": True, "calce": aplicar_calce(resumen, user['idUsuario'])}
+
+@app.delete("/api/subastas/{instrumento}")
+async def cerrar_subasta(
+    instrumento: str,
+    session_token: str = Depends(get_session_token)
+):
+    """Volver a negociación continua sin calzar; las órdenes siguen en el libro (Solo Admin)"""
+    user = get_current_user(session_token)
+    
+    if user['rol'] != 'Admin':
+        raise HTTPException(status_code=403, detail="Solo administradores pueden cerrar subastas")
+    
+    if gestor_subastas.cerrar(instrumento) is None:
+        raise HTTPException(status_code=404, detail="El instrumento no está en subasta")
+    auditoria.registrar("subasta_cerrada", user['idUsuario'], instrumento=instrumento)
+    
+    return {"success": True, "message": f"{instrumento} vuelve a negociación continua"}
+
+async def ciclo_subastas():
+    """Calza las subastas periódicas cuando vence su intervalo"""
+    while True:
+        await asyncio.sleep(0.5)
+        for instrumento, bolsa in gestor_subastas.vencidas():
+            try:
+                resumen = await asyncio.to_thread(
+                    calzar, instrumento, bolsa, control_riesgo.precio_referencia.get(instrumento)
+                )
+                aplicar_calce(resumen)
+            except Exception as e:
+                print(f"Error en el calce periódico de {instrumento}: {e}")
+
+# ============= EVENTOS DE CICLO DE VIDA =============
+
+@app.on_event("startup")
+async def tomar_bloqueo_instancia():
+    """Con journal, antes de recuperarlo: un solo escritor (excluye a main.py --cargar y a otra API)"""
+    bloqueo_instancia.tomar("API NUAM")
+
+@app.on_event("shutdown")
+async def liberar_bloqueo_instancia():
+    bloqueo_instancia.liberar()
+
+@app.on_event("startup")
+async def iniciar_shards():
+    """Lanza los procesos shard de órdenes si NUAM_SHARDS > 0 (un solo proceso de API por base: otro falla aquí)"""
+    if grupo_shards.num_shards > 0:
+        grupo_shards.iniciar()
+
+@app.on_event("shutdown")
+async def detener_shards():
+    grupo_shards.detener()
+
+@app.on_event("startup")
+async def iniciar_auditoria():
+    auditoria.iniciar()
+
+@app.on_event("shutdown")
+async def detener_auditoria():
+    """Escribe en MongoDB los eventos de auditoría aún en memoria"""
+    auditoria.detener()
+
+@app.on_event("startup")
+async def cargar_estado_en_memoria():
+    """Reconstruye el índice de órdenes pendientes (journal si está habilitado, si no MySQL)"""
+    if JOURNAL_DIR:
+        total = indice_ordenes.usar_journal(Journal(JOURNAL_DIR))
+        if total is not None:
+            print(f"Índice de órdenes recuperado desde el journal: {total} órdenes pendientes.")
+            return
+    try:
+        with get_mysql_session() as session:
+            total = indice_ordenes.cargar_desde_db(session)
+        print(f"Índice de órdenes cargado: {total} órdenes pendientes.")
+    except Exception as e:
+        print(f"No se pudo cargar el índice de órdenes: {e}")
+
+@app.on_event("startup")
+async def cargar_posiciones():
+    """Carga en memoria la tabla de posiciones"""
+    try:
+        with get_mysql_session() as session:
+            total = libro_posiciones.cargar_desde_db(session)
+        print(f"Posiciones cargadas: {total}.")
+    except Exception as e:
+        print(f"No se pudieron cargar las posiciones: {e}")
+
+@app.on_event("startup")
+async def cargar_riesgo():
+    """Límites persistidos, precios de referencia y exposiciones de las órdenes en reposo"""
+    db = get_mongodb()
+    if db is not None:
+        try:
+            control_riesgo.cargar_limites(db)
+        except Exception as e:
+            print(f"No se pudieron cargar los límites de riesgo: {e}")
+    try:
+        with get_mysql_session() as session:
+            total = control_riesgo.cargar_precios_referencia(session)
+        print(f"Precios de referencia cargados: {total} instrumentos.")
+    except Exception as e:
+        print(f"No se pudieron cargar los precios de referencia: {e}")
+    control_riesgo.cargar_desde_indice(indice_ordenes.ordenes())
+
+@app.on_event("startup")
+async def cargar_transacciones_recientes():
+    """Precarga el buffer de últimas transacciones para /api/reportes"""
+    if not transacciones_recientes.habilitado:
+        return
+    try:
+        with get_mysql_session() as session:
+            transacciones_recientes.cargar(ultimas_transacciones(session, transacciones_recientes.capacidad))
+    except Exception as e:
+        print(f"No se pudieron precargar las últimas transacciones: {e}")
+
+@app.on_event("startup")
+async def iniciar_ciclo_subastas():
+    app.state.ciclo_subastas = asyncio.create_task(ciclo_subastas())
+
+@app.on_event("shutdown")
+async def detener_ciclo_subastas():
+    app.state.ciclo_subastas.cancel()
+
+@app.on_event("startup")
+async def cargar_frontend():
+    """Modo producción: build del frontend servido desde la API (NUAM_FRONTEND_DIST)"""
+    if frontend_estatico is None:
+        return
+    try:
+        total = frontend_estatico.cargar()
+        print(f"Frontend cargado desde {frontend_estatico.directorio}: {total} archivos.")
+    except Exception as e:
+        print(f"No se pudo cargar el frontend: {e}")
+
+@app.on_event("shutdown")
+async def guardar_estado_en_memoria():
+    """Snapshot final del índice de órdenes y cierre del journal"""
+    indice_ordenes.cerrar()
+
 # ============= RUTAS DE PRUEBA =============
 
 @app.get("/")
-async def root():
+async def root(request: Request):
+    if frontend_estatico is not None and frontend_estatico.recursos:
+        return servir_frontend("index.html", request)
     return {
         "message": "NUAM Exchange API",
         "version": "1.0.0",
@@ -347,5 +1288,39 @@ async def health_check():
     return {
         "mongodb": "connected" if mongo_ok else "disconnected",
         "mysql": "connected" if mysql_ok else "disconnected",
-        "status": "healthy" if (mongo_ok and mysql_ok) else "degraded"
-    }
\ No newline at end of file
+        "status": "healthy" if (mongo_ok and mysql_ok) else "degraded",
+        "circuit_breakers": metricas_circuit_breakers()
+    }
+
+@app.get("/metricas")
+async def metricas():
+    """Métricas operativas del backend (estado de circuit breakers)"""
+    return {
+        "circuit_breakers": metricas_circuit_breakers(),
+        "shards": grupo_shards.metricas(),
+        "replica_lectura": metricas_replica(),
+        "auditoria": auditoria.metricas(),
+        "riesgo": control_riesgo.metricas(),
+        "frontend": frontend_estatico.metricas() if frontend_estatico is not None else None,
+        "transacciones_recientes": transacciones_recientes.metricas(),
+        "consultas_lentas": registro_consultas.metricas(),
+        "versiones": versiones.metricas()
+    }
+
+# ============= FRONTEND (MODO PRODUCCIÓN) =============
+# Debe registrarse al final: captura toda ruta GET que no sea de la API
+
+def servir_frontend(ruta: str, request: Request):
+    respuesta = frontend_estatico.responder(
+        ruta, request.headers.get("accept-encoding", ""), request.headers.get("if-none-match")
+    )
+    if respuesta is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return respuesta
+
+if frontend_estatico is not None:
+    @app.api_route("/{ruta:path}", methods=["GET", "HEAD"], include_in_schema=False)
+    async def frontend(ruta: str, request: Request):
+        if ruta == "api" or ruta.startswith("api/"):
+            raise HTTPException(status_code=404, detail="Not Found")
+        return servir_frontend(ruta, request)
@@ -0,0 +1,155 @@
+# auditoria.py
+"""
+Registro de auditoría (logins, órdenes, ejecuciones, tarifas) en MongoDB.
+
+Los eventos se encolan en memoria y un hilo los escribe con insert_many al
+juntar `tam_lote` eventos o cada `intervalo` segundos, así /api/orden no
+espera un round-trip a Mongo. La cola es acotada: si se llena, el evento se
+descarta y se contabiliza (registrar se llama desde endpoints async y nunca
+bloquea).
+
+Si un lote falla se reintenta en el ciclo siguiente. Los documentos conservan
+el `_id` que les asignó insert_many, así que los que ya habían quedado
+escritos dan clave duplicada (11000) y se cuentan como escritos; los que
+fallaron por otro motivo del documento se descartan.
+"""
+import atexit
+import queue
+import threading
+import time
+from datetime import datetime
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError
+
+from db_coneccion import get_mongodb
+
+COLECCION_AUDITORIA = "auditoria"
+
+
+def crear_indices_auditoria(db):
+    """Índices para consultar por usuario, por tipo de evento y por tiempo."""
+    col = db[COLECCION_AUDITORIA]
+    col.create_index([("idUsuario", ASCENDING), ("timestamp", DESCENDING)])
+    col.create_index([("evento", ASCENDING), ("timestamp", DESCENDING)])
+    col.create_index([("timestamp", DESCENDING)])
+
+
+class AuditoriaBuffer:
+
+    def __init__(self, tam_lote=500, intervalo=1.0, capacidad=20000):
+        self.tam_lote = tam_lote
+        self.intervalo = intervalo
+        self.capacidad = capacidad
+        self._cola = queue.Queue(maxsize=capacidad)
+        self._reintentos = []
+        self._hilo = None
+        self._detener = threading.Event()
+        self._indices_creados = False
+        self.escritos = 0
+        self.descartados = 0
+        self.lotes = 0
+
+    def iniciar(self):
+        if self._hilo is not None:
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._bucle, name="auditoria", daemon=True)
+        self._hilo.start()
+        atexit.register(self.detener)
+
+    def registrar(self, evento, id_usuario=None, **detalle):
+        """Encola un evento de auditoría sin bloquear (con la cola llena se descarta)."""
+        documento = {
+            "evento": evento,
+            "idUsuario": id_usuario,
+            "timestamp": datetime.utcnow(),
+            "detalle": detalle,
+        }
+        try:
+            self._cola.put_nowait(documento)
+        except queue.Full:
+            self.descartados += 1
+
+    def _tomar_lote(self):
+        """Espera hasta juntar `tam_lote` eventos o hasta que venza `intervalo`."""
+        lote = []
+        limite = time.monotonic() + self.intervalo
+        while len(lote) < self.tam_lote:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(self._cola.get(timeout=restante))
+            except queue.Empty:
+                break
+        return lote
+
+    def _escribir(self, lote):
+        lote = self._reintentos + lote
+        self._reintentos = []
+        if not lote:
+            return
+        db = get_mongodb()
+        try:
+            if db is None:
+                raise ConnectionError("MongoDB no disponible")
+            if not self._indices_creados:
+                crear_indices_auditoria(db)
+                self._indices_creados = True
+            db[COLECCION_AUDITORIA].insert_many(lote, ordered=False)
+            self.escritos += len(lote)
+            self.lotes += 1
+        except BulkWriteError as e:
+            # ordered=False: todo lo que no figura en writeErrors quedó escrito
+            errores = e.details.get("writeErrors", [])
+            duplicados = sum(1 for err in errores if err.get("code") == 11000)
+            self.escritos += len(lote) - len(errores) + duplicados
+            self.descartados += len(errores) - duplicados
+            self.lotes += 1
+            if len(errores) > duplicados:
+                print(f"Auditoría: {len(errores) - duplicados} eventos rechazados por MongoDB: "
+                      f"{next(err.get('errmsg') for err in errores if err.get('code') != 11000)}")
+        except Exception as e:
+            print(f"Error al escribir auditoría ({len(lote)} eventos): {e}")
+            # Se reintenta en el próximo ciclo (con los mismos _id) sin superar la capacidad
+            sobrantes = len(lote) - self.capacidad
+            if sobrantes > 0:
+                self.descartados += sobrantes
+                lote = lote[sobrantes:]
+            self._reintentos = lote
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            self._escribir(self._tomar_lote())
+        # Vaciar lo que quede en la cola al detener
+        restantes = []
+        while True:
+            try:
+                restantes.append(self._cola.get_nowait())
+            except queue.Empty:
+                break
+        for i in range(0, len(restantes), self.tam_lote):
+            self._escribir(restantes[i:i + self.tam_lote])
+        if self._reintentos:
+            self._escribir([])
+
+    def detener(self):
+        """Escribe lo pendiente y detiene el hilo (se llama al apagar la API)."""
+        if self._hilo is None:
+            return
+        self._detener.set()
+        self._hilo.join(timeout=30)
+        self._hilo = None
+
+    def metricas(self):
+        return {
+            "en_cola": self._cola.qsize(),
+            "pendientes_reintento": len(self._reintentos),
+            "escritos": self.escritos,
+            "descartados": self.descartados,
+            "lotes": self.lotes,
+        }
+
+
+auditoria = AuditoriaBuffer()
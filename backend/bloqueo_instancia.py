@@ -0,0 +1,96 @@
+# bloqueo_instancia.py
+"""
+Bloqueo exclusivo del journal de órdenes (NUAM_JOURNAL_DIR) entre procesos.
+
+Solo puede haber un escritor del journal: la API que lo usa para recuperar el
+índice de órdenes pendientes, o `python main.py --cargar` / el menú de
+consola con la API detenida. La API lo toma al iniciar si hay journal y la
+consola lo toma antes de escribir órdenes; mientras la API corre, las cargas
+se hacen con POST /api/cargas dentro de ella.
+
+Sin journal no se toma ningún bloqueo: varios procesos de la API (workers)
+pueden correr sobre la misma base; la consola escribe directo en MySQL y las
+APIs en marcha ven sus órdenes pendientes al reiniciar.
+
+El archivo es <NUAM_JOURNAL_DIR>/instancia.lock; el sistema operativo lo
+libera si el proceso termina sin liberarlo.
+"""
+import os
+
+try:
+    import fcntl
+except ImportError:   # Windows
+    fcntl = None
+    import msvcrt
+
+JOURNAL_DIR = os.getenv("NUAM_JOURNAL_DIR")
+
+
+class BloqueoOcupado(RuntimeError):
+    """Otro proceso tiene el bloqueo de la instancia."""
+
+
+def ruta_bloqueo():
+    """Archivo de bloqueo del journal, o None si el journal no está habilitado."""
+    if not JOURNAL_DIR:
+        return None
+    os.makedirs(JOURNAL_DIR, exist_ok=True)
+    return os.path.join(JOURNAL_DIR, "instancia.lock")
+
+
+class BloqueoInstancia:
+
+    def __init__(self, ruta=None):
+        self.ruta = ruta
+        self._archivo = None
+
+    @property
+    def requerido(self):
+        """Hay journal (o una ruta explícita) que proteger."""
+        return bool(self.ruta or JOURNAL_DIR)
+
+    @property
+    def tomado(self):
+        return self._archivo is not None
+
+    def tomar(self, dueno):
+        """Toma el bloqueo sin esperar; lanza BloqueoOcupado si lo tiene otro proceso. Sin journal no hace nada."""
+        if self._archivo is not None or not self.requerido:
+            return
+        self.ruta = self.ruta or ruta_bloqueo()
+        archivo = open(self.ruta, "a+", encoding="utf-8")
+        try:
+            if fcntl is not None:
+                fcntl.flock(archivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                archivo.seek(0)
+                msvcrt.locking(archivo.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            try:
+                archivo.seek(0)
+                quien = archivo.read().strip() or "otro proceso"
+            except OSError:
+                quien = "otro proceso"
+            archivo.close()
+            raise BloqueoOcupado(f"{quien} tiene el bloqueo {self.ruta}")
+        archivo.seek(0)
+        archivo.truncate()
+        archivo.write(f"{dueno} (pid {os.getpid()})\n")
+        archivo.flush()
+        self._archivo = archivo
+
+    def liberar(self):
+        if self._archivo is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._archivo.fileno(), fcntl.LOCK_UN)
+            else:
+                self._archivo.seek(0)
+                msvcrt.locking(self._archivo.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._archivo.close()
+            self._archivo = None
+
+
+bloqueo_instancia = BloqueoInstancia()
@@ -0,0 +1,276 @@
+# carga_lote.py
+"""
+Carga no interactiva de órdenes desde CSV o NDJSON (archivos de fin de día
+de bolsas asociadas).
+
+Cada registro pasa por los mismos pasos que /api/orden: validar_orden, el
+control pre-trade y la fase de subasta (motor_ordenes.ColocacionOrdenes), la
+ejecución de ejecutar_ordenes y, tras el commit, el índice de órdenes en
+reposo, posiciones, riesgo y versiones. Los registros se procesan en lotes con
+un commit por lote; el avance queda en `cargas_lote` dentro de esa misma
+transacción, así que al volver a ejecutar la carga tras una falla se retoma
+desde el primer lote no confirmado sin duplicar órdenes.
+
+Campos: instrumento, tipo, cantidad, precioLimite (opcional) y, si el archivo
+mezcla usuarios, idUsuario y perfilBolsa (si no, --id-usuario / --bolsa).
+Los registros rechazados (inválidos o por riesgo) se escriben en
+<archivo>.rechazos.ndjson.
+
+Con la API en marcha la carga se lanza dentro de ella (POST /api/cargas con
+un archivo de NUAM_CARGAS_DIR), que así mantiene su estado en memoria. Con la
+API detenida:
+    python main.py --cargar ordenes.csv --id-usuario <id> --bolsa CL [--lote 1000]
+Con NUAM_JOURNAL_DIR toma el bloqueo del journal (bloqueo_instancia.py) y se
+niega a correr si una API lo tiene. Sin journal no hay bloqueo: las APIs en
+marcha no ven las órdenes pendientes ni la exposición de la carga hasta
+reiniciar, por eso con la API en marcha conviene POST /api/cargas.
+"""
+import csv
+import hashlib
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime
+
+from db_coneccion import get_mysql_session
+from modelo_sql import CargaLote
+from motor_ordenes import validar_orden, ejecutar_ordenes, colocacion, estado_de_consola
+from bloqueo_instancia import bloqueo_instancia, BloqueoOcupado
+
+TAM_LOTE = 1000
+DIRECTORIO_CARGAS = os.getenv("NUAM_CARGAS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cargas"))
+
+
+def identificador_carga(ruta):
+    """Id de la carga: nombre del archivo + hash de su contenido (el mismo archivo se retoma)."""
+    digest = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            digest.update(bloque)
+    return f"{os.path.basename(ruta)[:80]}:{digest.hexdigest()[:16]}"
+
+
+def leer_registros(ruta, formato=None):
+    """Genera dicts (o None para líneas NDJSON vacías/ilegibles) en el orden del archivo."""
+    formato = formato or ("ndjson" if ruta.lower().endswith((".ndjson", ".jsonl")) else "csv")
+    with open(ruta, newline="", encoding="utf-8") as f:
+        if formato == "csv":
+            yield from csv.DictReader(f)
+            return
+        for linea in f:
+            linea = linea.strip()
+            if not linea:
+                yield None
+                continue
+            try:
+                yield json.loads(linea)
+            except ValueError:
+                yield None
+
+
+def a_pedido(registro, usuario_defecto):
+    """Convierte un registro a (usuario, instrumento, tipo, cantidad, precio). Retorna (pedido, motivo)."""
+    if not isinstance(registro, dict):
+        return None, "Registro ilegible"
+    try:
+        instrumento = str(registro.get("instrumento") or "").strip().upper()
+        tipo = str(registro.get("tipo") or "").strip().capitalize()
+        cantidad = int(registro.get("cantidad"))
+        precio = registro.get("precioLimite")
+        precio = float(precio) if precio not in (None, "") else None
+    except (TypeError, ValueError):
+        return None, "Cantidad o precio inválidos"
+
+    motivo = validar_orden(instrumento, tipo, cantidad)
+    if motivo is not None:
+        return None, motivo
+
+    usuario = usuario_defecto
+    if registro.get("idUsuario"):
+        usuario = {"idUsuario": str(registro["idUsuario"]),
+                   "perfilBolsa": registro.get("perfilBolsa") or (usuario_defecto or {}).get("perfilBolsa")}
+    if usuario is None or not usuario.get("perfilBolsa"):
+        return None, "Registro sin idUsuario/perfilBolsa y sin --id-usuario/--bolsa"
+
+    precio_final = precio if precio and precio > 0 else None
+    return (usuario, instrumento, tipo, cantidad, precio_final), None
+
+
+def _iniciar_carga(id_carga, ruta):
+    """Retorna el estado de la carga (creándola si es nueva)."""
+    with get_mysql_session() as session:
+        carga = session.get(CargaLote, id_carga)
+        if carga is None:
+            carga = CargaLote(idCarga=id_carga, archivo=os.path.abspath(ruta)[-255:])
+            session.add(carga)
+            session.flush()
+        return {
+            "estado": carga.estado,
+            "procesadas": carga.lineasProcesadas or 0,
+            "creadas": carga.ordenesCreadas or 0,
+            "ejecutadas": carga.ordenesEjecutadas or 0,
+            "rechazadas": carga.rechazadas or 0,
+        }
+
+
+def cargar_archivo(ruta, formato=None, tam_lote=TAM_LOTE, id_usuario=None, bolsa=None, semilla=None, avance=True):
+    """
+    Carga el archivo completo (o lo que falte de él) sobre el estado en memoria
+    de este proceso. Retorna el resumen de la carga.
+    """
+    id_carga = identificador_carga(ruta)
+    estado = _iniciar_carga(id_carga, ruta)
+    if estado["estado"] == 'Completada':
+        print(f"ℹ El archivo ya fue cargado ({id_carga}): {estado['creadas']} órdenes.")
+        return estado
+    if estado["procesadas"]:
+        print(f"↻ Retomando la carga {id_carga} desde el registro {estado['procesadas'] + 1}.")
+    else:
+        print(f"▶ Carga {id_carga}")
+
+    usuario_defecto = {"idUsuario": id_usuario, "perfilBolsa": bolsa} if id_usuario else None
+    rng = random.Random(semilla) if semilla is not None else random
+    ruta_rechazos = f"{ruta}.rechazos.ndjson"
+
+    registros = itertools.islice(leer_registros(ruta, formato), estado["procesadas"], None)
+    inicio = time.perf_counter()
+    creadas_sesion = 0
+    while True:
+        lote = list(itertools.islice(registros, tam_lote))
+        if not lote:
+            break
+
+        # Control pre-trade por registro, como en /api/orden: la exposición queda reservada hasta el commit
+        pedidos, reservas, rechazos = [], [], []
+        for i, registro in enumerate(lote, start=estado["procesadas"] + 1):
+            pedido, motivo = a_pedido(registro, usuario_defecto)
+            if pedido is not None:
+                reserva, ejecutar, motivo = colocacion.reservar(*pedido)
+                if motivo is None:
+                    pedidos.append(pedido + (ejecutar,))
+                    reservas.append(reserva)
+                    continue
+            rechazos.append({"registro": i, "motivo": motivo, "datos": registro})
+
+        posiciones = {}
+        try:
+            with get_mysql_session() as session:
+                carga = session.get(CargaLote, id_carga, with_for_update=True)
+                if carga.lineasProcesadas != estado["procesadas"]:
+                    raise RuntimeError(f"La carga {id_carga} avanzó en otro proceso; se detiene esta ejecución.")
+                resultados = ejecutar_ordenes(session, pedidos, rng, posiciones) if pedidos else []
+                ejecutadas = sum(1 for r in resultados if r["transaccion"] is not None)
+
+                carga.lineasProcesadas += len(lote)
+                carga.ordenesCreadas += len(resultados)
+                carga.ordenesEjecutadas += ejecutadas
+                carga.rechazadas += len(rechazos)
+                carga.fechaActualizacion = datetime.utcnow()
+        except Exception:
+            for reserva in reservas:
+                colocacion.descartar(reserva)
+            raise
+
+        # Confirmado el lote: índice (y journal), posiciones, riesgo y versiones; luego los rechazos
+        for pedido, reserva, resultado in zip(pedidos, reservas, resultados):
+            colocacion.confirmar(pedido[0], reserva, resultado)
+        if rechazos:
+            with open(ruta_rechazos, "a", encoding="utf-8") as f:
+                for rechazo in rechazos:
+                    f.write(json.dumps(rechazo, ensure_ascii=False, default=str) + "\n")
+
+        estado["procesadas"] += len(lote)
+        estado["creadas"] += len(resultados)
+        estado["ejecutadas"] += ejecutadas
+        estado["rechazadas"] += len(rechazos)
+        creadas_sesion += len(resultados)
+        if avance:
+            transcurrido = time.perf_counter() - inicio
+            print(f"\r  {estado['procesadas']:,} registros | {estado['creadas']:,} órdenes "
+                  f"({estado['ejecutadas']:,} ejecutadas) | {estado['rechazadas']:,} rechazadas | "
+                  f"{creadas_sesion / transcurrido:,.0f} órdenes/s", end="", flush=True)
+
+    with get_mysql_session() as session:
+        session.get(CargaLote, id_carga).estado = 'Completada'
+    estado["estado"] = 'Completada'
+
+    transcurrido = time.perf_counter() - inicio
+    print(f"\n✅ Carga {id_carga} completada en {transcurrido:.1f}s: {estado['creadas']:,} órdenes "
+          f"({estado['ejecutadas']:,} ejecutadas), {estado['rechazadas']:,} rechazadas.")
+    if estado["rechazadas"]:
+        print(f"   Detalle de rechazos en {ruta_rechazos}")
+    return estado
+
+
+# ============= CARGA POR CONSOLA (API DETENIDA) =============
+
+def cargar_archivo_local(ruta, formato=None, tam_lote=TAM_LOTE, id_usuario=None, bolsa=None, semilla=None):
+    """`python main.py --cargar`: pensado para la API detenida (si no, usar POST /api/cargas)."""
+    if not bloqueo_instancia.requerido:
+        print("ℹ Sin NUAM_JOURNAL_DIR: una API en marcha verá las órdenes pendientes de esta carga al reiniciar.")
+    try:
+        with estado_de_consola("carga por lotes (main.py --cargar)"):
+            return cargar_archivo(ruta, formato, tam_lote, id_usuario, bolsa, semilla)
+    except BloqueoOcupado as e:
+        print(f"❌ No se puede cargar mientras la API usa el journal: {e}. Use POST /api/cargas.")
+        return None
+
+
+# ============= CARGA DENTRO DE LA API =============
+
+_lock_cargas = threading.Lock()
+_cargas_en_curso = {}   # idCarga -> hilo
+_errores_cargas = {}    # idCarga -> mensaje del último intento fallido
+
+
+def ruta_en_directorio_cargas(archivo):
+    """Ruta de `archivo` dentro de NUAM_CARGAS_DIR, o None si está fuera de él o no existe."""
+    base = os.path.realpath(DIRECTORIO_CARGAS)
+    ruta = os.path.realpath(os.path.join(base, archivo))
+    if os.path.commonpath([base, ruta]) != base or not os.path.isfile(ruta):
+        return None
+    return ruta
+
+
+def lanzar_carga(ruta, formato=None, tam_lote=TAM_LOTE, id_usuario=None, bolsa=None, semilla=None):
+    """Inicia la carga en un hilo de la API. Retorna el idCarga, o None si ya está en curso."""
+    id_carga = identificador_carga(ruta)
+
+    def ejecutar():
+        try:
+            cargar_archivo(ruta, formato, tam_lote, id_usuario, bolsa, semilla, avance=False)
+        except Exception as e:
+            print(f"❌ Error en la carga {id_carga}: {e}")
+            _errores_cargas[id_carga] = str(e)
+        finally:
+            with _lock_cargas:
+                _cargas_en_curso.pop(id_carga, None)
+
+    with _lock_cargas:
+        if id_carga in _cargas_en_curso:
+            return None
+        _errores_cargas.pop(id_carga, None)
+        hilo = _cargas_en_curso[id_carga] = threading.Thread(target=ejecutar, name=f"carga-{id_carga}", daemon=True)
+    hilo.start()
+    return id_carga
+
+
+def estado_cargas(session, limite=50):
+    """Últimas cargas con su avance, si siguen en curso en esta API y el error del último intento."""
+    cargas = session.query(CargaLote).order_by(CargaLote.fechaActualizacion.desc()).limit(limite).all()
+    return [{
+        "idCarga": c.idCarga,
+        "archivo": c.archivo,
+        "estado": c.estado,
+        "enCurso": c.idCarga in _cargas_en_curso,
+        "lineasProcesadas": c.lineasProcesadas,
+        "ordenesCreadas": c.ordenesCreadas,
+        "ordenesEjecutadas": c.ordenesEjecutadas,
+        "rechazadas": c.rechazadas,
+        "error": _errores_cargas.get(c.idCarga),
+        "fechaInicio": c.fechaInicio.isoformat() if c.fechaInicio else None,
+        "fechaActualizacion": c.fechaActualizacion.isoformat() if c.fechaActualizacion else None,
+    } for c in cargas]
@@ -0,0 +1,110 @@
+# circuit_breaker.py
+import threading
+import time
+
+
+class CircuitoAbiertoError(Exception):
+    """Se lanza cuando el circuit breaker rechaza una llamada sin intentarla."""
+
+    def __init__(self, nombre, reintentar_en):
+        self.nombre = nombre
+        self.reintentar_en = reintentar_en
+        super().__init__(
+            f"Servicio '{nombre}' no disponible (circuito abierto). "
+            f"Reintente en {reintentar_en:.0f}s."
+        )
+
+    def __reduce__(self):
+        # Permite reenviar la excepción entre procesos (ver shards.py)
+        return (self.__class__, (self.nombre, self.reintentar_en))
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker de tres estados para dependencias externas.
+
+    - closed: las llamadas pasan; se cuentan los fallos consecutivos.
+    - open: las llamadas fallan de inmediato durante `tiempo_apertura` segundos.
+    - half_open: se deja pasar una sola llamada de prueba; si funciona el
+      circuito se cierra, si falla vuelve a abrirse.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, nombre, umbral_fallos=5, tiempo_apertura=30.0):
+        self.nombre = nombre
+        self.umbral_fallos = umbral_fallos
+        self.tiempo_apertura = tiempo_apertura
+        self._lock = threading.Lock()
+        self._estado = self.CLOSED
+        self._fallos_consecutivos = 0
+        self._abierto_desde = 0.0
+        self._prueba_en_curso = False
+        # Contadores para /metricas
+        self._total_exitos = 0
+        self._total_fallos = 0
+        self._total_rechazos = 0
+        self._total_aperturas = 0
+
+    @property
+    def estado(self):
+        with self._lock:
+            return self._estado_actual(time.monotonic())
+
+    def _estado_actual(self, ahora):
+        if self._estado == self.OPEN and ahora - self._abierto_desde >= self.tiempo_apertura:
+            self._estado = self.HALF_OPEN
+            self._prueba_en_curso = False
+        return self._estado
+
+    def permitir(self):
+        """Reserva el paso de una llamada o lanza CircuitoAbiertoError."""
+        with self._lock:
+            ahora = time.monotonic()
+            estado = self._estado_actual(ahora)
+            if estado == self.CLOSED:
+                return
+            if estado == self.HALF_OPEN and not self._prueba_en_curso:
+                self._prueba_en_curso = True
+                return
+            self._total_rechazos += 1
+            restante = max(self.tiempo_apertura - (ahora - self._abierto_desde), 0.0)
+            raise CircuitoAbiertoError(self.nombre, restante)
+
+    def registrar_exito(self):
+        with self._lock:
+            self._total_exitos += 1
+            self._fallos_consecutivos = 0
+            self._prueba_en_curso = False
+            self._estado = self.CLOSED
+
+    def registrar_fallo(self):
+        with self._lock:
+            self._total_fallos += 1
+            self._fallos_consecutivos += 1
+            self._prueba_en_curso = False
+            if self._estado == self.HALF_OPEN or self._fallos_consecutivos >= self.umbral_fallos:
+                if self._estado != self.OPEN:
+                    self._total_aperturas += 1
+                self._estado = self.OPEN
+                self._abierto_desde = time.monotonic()
+
+    def liberar(self):
+        """Libera la llamada reservada sin contarla como éxito ni como fallo."""
+        with self._lock:
+            self._prueba_en_curso = False
+
+    def metricas(self):
+        with self._lock:
+            return {
+                "estado": self._estado_actual(time.monotonic()),
+                "fallos_consecutivos": self._fallos_consecutivos,
+                "umbral_fallos": self.umbral_fallos,
+                "tiempo_apertura": self.tiempo_apertura,
+                "total_exitos": self._total_exitos,
+                "total_fallos": self._total_fallos,
+                "total_rechazos": self._total_rechazos,
+                "total_aperturas": self._total_aperturas,
+            }
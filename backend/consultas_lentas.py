@@ -0,0 +1,321 @@
+# consultas_lentas.py
+"""
+Registro de consultas lentas de MySQL con EXPLAIN automático y sugerencia de
+índices.
+
+- Eventos before/after_cursor_execute de SQLAlchemy sobre los engines: toda
+  consulta que supere NUAM_SLOW_QUERY_MS (por defecto 100 ms) se registra con
+  su SQL normalizado (forma), parámetros, duración y la ruta HTTP que la
+  originó (contextvar fijado por MiddlewareRuta).
+- Cuando una forma se repite NUAM_SLOW_QUERY_EXPLAIN veces se captura su
+  EXPLAIN en un hilo aparte (EXPLAIN QUERY PLAN en SQLite).
+- sugerencias(): para las formas cuyo plan recorre la tabla completa u ordena
+  en memoria (filesort), propone un índice con las columnas de igualdad del
+  WHERE, luego las de rango y las del ORDER BY, si el modelo aún no lo tiene.
+  Los índices del modelo los crea create_all_mysql_tables en tablas nuevas y
+  migraciones.py en las existentes.
+"""
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+
+from sqlalchemy import event
+
+from modelo_sql import Base
+
+UMBRAL_MS = float(os.getenv("NUAM_SLOW_QUERY_MS", "100"))
+EXPLAIN_DESDE = int(os.getenv("NUAM_SLOW_QUERY_EXPLAIN", "3"))
+MAX_FORMAS = 500
+MAX_RECIENTES = 200
+MAX_LARGO_PARAMETROS = 300
+
+ruta_actual = ContextVar("ruta_actual", default=None)
+_en_explain = threading.local()
+
+
+# ============= NORMALIZACIÓN =============
+
+_RE_LISTA = re.compile(r"\(\s*(?:%s|\?|%\(\w+\)s|:\w+)(?:\s*,\s*(?:%s|\?|%\(\w+\)s|:\w+))+\s*\)")
+_RE_CADENA = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_RE_NUMERO = re.compile(r"(?<![\w`\".])-?\d+(?:\.\d+)?\b")
+_RE_ESPACIOS = re.compile(r"\s+")
+_RE_SEGMENTO_ID = re.compile(r"/\d+(?=/|$)")
+
+
+def normalizar(sql):
+    """Forma de la consulta: literales como ?, listas IN colapsadas y espacios compactados."""
+    forma = _RE_CADENA.sub("?", sql)
+    forma = _RE_NUMERO.sub("?", forma)
+    forma = _RE_LISTA.sub("(?+)", forma)
+    return _RE_ESPACIOS.sub(" ", forma).strip()
+
+
+def ruta_normalizada(metodo, ruta):
+    return f"{metodo} {_RE_SEGMENTO_ID.sub('/{id}', ruta)}"
+
+
+def _resumir_parametros(parametros, executemany):
+    if executemany:
+        return f"<executemany: {len(parametros)} filas>"
+    texto = repr(parametros)
+    return texto if len(texto) <= MAX_LARGO_PARAMETROS else texto[:MAX_LARGO_PARAMETROS] + "…"
+
+
+class MiddlewareRuta:
+    """Middleware ASGI que deja la ruta en curso en `ruta_actual` para atribuirle las consultas."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = ruta_actual.set(ruta_normalizada(scope["method"], scope["path"]))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            ruta_actual.reset(token)
+
+
+# ============= ANÁLISIS DEL SQL Y DEL PLAN =============
+
+_RE_TABLA = re.compile(r"\bFROM\s+[`\"]?(\w+)[`\"]?", re.IGNORECASE)
+_RE_WHERE = re.compile(r"\bWHERE\b(.*?)(?:\bGROUP BY\b|\bORDER BY\b|\bLIMIT\b|\bFOR UPDATE\b|$)", re.IGNORECASE)
+_RE_ORDER = re.compile(r"\bORDER BY\b(.*?)(?:\bLIMIT\b|\bFOR UPDATE\b|$)", re.IGNORECASE)
+_RE_CONDICION = re.compile(
+    r"(?:[`\"]?(\w+)[`\"]?\.)?[`\"]?(\w+)[`\"]?\s*(=|>=|<=|<>|!=|<|>|\bIN\b|\bBETWEEN\b|\bIS\b)", re.IGNORECASE
+)
+_RE_COLUMNA = re.compile(r"(?:[`\"]?(\w+)[`\"]?\.)?[`\"]?(\w+)[`\"]?")
+
+
+def columnas_indice(forma):
+    """(tabla, columnas) del índice que serviría a la consulta, o (tabla, []) si no hay filtros."""
+    m = _RE_TABLA.search(forma)
+    if m is None:
+        return None, []
+    tabla = m.group(1)
+    modelo = Base.metadata.tables.get(tabla)
+    columnas_tabla = set(modelo.columns.keys()) if modelo is not None else None
+
+    def propia(t, c):
+        return (t is None or t == tabla) and (columnas_tabla is None or c in columnas_tabla)
+
+    igualdad, rango, orden = [], [], []
+    where = _RE_WHERE.search(forma)
+    if where:
+        for t, c, op in _RE_CONDICION.findall(where.group(1)):
+            if not propia(t, c) or op in ("<>", "!="):
+                continue
+            destino = igualdad if op.upper() in ("=", "IS") else rango
+            if c not in igualdad and c not in rango:
+                destino.append(c)
+    order = _RE_ORDER.search(forma)
+    if order:
+        for parte in order.group(1).split(","):
+            m = _RE_COLUMNA.search(parte.strip())
+            if m and propia(m.group(1), m.group(2)) and m.group(2) not in igualdad + rango + orden:
+                orden.append(m.group(2))
+    # MySQL solo aprovecha la primera columna de rango; el ORDER BY sirve si no hay rango
+    columnas = igualdad + (rango[:1] if rango else orden)
+    return tabla, columnas
+
+
+def plan_ineficiente(plan):
+    """Motivos por los que el EXPLAIN indica un recorrido completo u ordenamiento en memoria."""
+    motivos = set()
+    for fila in plan or []:
+        if "type" in fila:   # MySQL
+            if fila.get("type") == "ALL":
+                motivos.add("recorrido completo")
+            if "filesort" in str(fila.get("Extra") or ""):
+                motivos.add("filesort")
+        else:                # SQLite (EXPLAIN QUERY PLAN)
+            detalle = str(fila.get("detail", ""))
+            if detalle.startswith("SCAN") and "INDEX" not in detalle:
+                motivos.add("recorrido completo")
+            if "TEMP B-TREE" in detalle:
+                motivos.add("filesort")
+    return sorted(motivos)
+
+
+def indices_del_modelo(tabla):
+    modelo = Base.metadata.tables.get(tabla)
+    if modelo is None:
+        return []
+    indices = [tuple(c.name for c in modelo.primary_key.columns)]
+    indices += [tuple(c.name for c in indice.columns) for indice in modelo.indexes]
+    return indices
+
+
+# ============= REGISTRO =============
+
+class RegistroConsultas:
+
+    def __init__(self, umbral_ms=UMBRAL_MS, explain_desde=EXPLAIN_DESDE):
+        self.umbral_ms = umbral_ms
+        self.explain_desde = explain_desde
+        self._lock = threading.Lock()
+        self._formas = {}   # forma -> estadísticas
+        self._recientes = deque(maxlen=MAX_RECIENTES)
+        self.descartadas = 0
+
+    def instalar(self, engine):
+        if engine is None or event.contains(engine, "before_cursor_execute", self._antes):
+            return
+        event.listen(engine, "before_cursor_execute", self._antes)
+        event.listen(engine, "after_cursor_execute", self._despues)
+        event.listen(engine, "handle_error", self._error)
+
+    def _antes(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("inicio_consulta", []).append(time.perf_counter())
+
+    def _despues(self, conn, cursor, statement, parameters, context, executemany):
+        inicios = conn.info.get("inicio_consulta")
+        if not inicios:
+            return
+        duracion_ms = (time.perf_counter() - inicios.pop()) * 1000
+        if duracion_ms < self.umbral_ms or getattr(_en_explain, "activo", False):
+            return
+        self.registrar(conn.engine, statement, parameters, executemany, duracion_ms)
+
+    def _error(self, contexto):
+        # after_cursor_execute no se emite si la consulta falla
+        if contexto.connection is not None and contexto.statement is not None:
+            inicios = contexto.connection.info.get("inicio_consulta")
+            if inicios:
+                inicios.pop()
+
+    def registrar(self, engine, statement, parameters, executemany, duracion_ms):
+        forma = normalizar(statement)
+        ruta = ruta_actual.get()
+        ahora = datetime.utcnow()
+        capturar_explain = False
+        with self._lock:
+            datos = self._formas.get(forma)
+            if datos is None:
+                if len(self._formas) >= MAX_FORMAS:
+                    self.descartadas += 1
+                    return
+                datos = self._formas[forma] = {
+                    "forma": forma, "veces": 0, "total_ms": 0.0, "max_ms": 0.0,
+                    "rutas": {}, "ultima": None, "parametros": None, "explain": None,
+                    "explain_pendiente": False,
+                }
+            datos["veces"] += 1
+            datos["total_ms"] += duracion_ms
+            datos["max_ms"] = max(datos["max_ms"], duracion_ms)
+            datos["rutas"][ruta] = datos["rutas"].get(ruta, 0) + 1
+            datos["ultima"] = ahora
+            datos["parametros"] = _resumir_parametros(parameters, executemany)
+            self._recientes.append({
+                "forma": forma, "duracion_ms": round(duracion_ms, 1), "ruta": ruta,
+                "parametros": datos["parametros"], "fecha": ahora.isoformat(),
+            })
+            if (datos["veces"] >= self.explain_desde and datos["explain"] is None
+                    and not datos["explain_pendiente"] and not executemany
+                    and statement.lstrip().upper().startswith("SELECT")):
+                datos["explain_pendiente"] = capturar_explain = True
+        if capturar_explain:
+            threading.Thread(target=self._capturar_explain, args=(engine, forma, statement, parameters),
+                             daemon=True).start()
+
+    def _capturar_explain(self, engine, forma, statement, parameters):
+        prefijo = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+        _en_explain.activo = True
+        try:
+            with engine.connect() as conn:
+                filas = conn.exec_driver_sql(prefijo + statement, parameters).mappings().all()
+            plan = [{k: (v if isinstance(v, (int, float, type(None))) else str(v)) for k, v in f.items()}
+                    for f in filas]
+        except Exception as e:
+            print(f"No se pudo obtener el EXPLAIN de una consulta lenta: {e}")
+            plan = [{"error": str(e)}]
+        finally:
+            _en_explain.activo = False
+        with self._lock:
+            datos = self._formas.get(forma)
+            if datos is not None:
+                datos["explain"] = plan
+                datos["explain_pendiente"] = False
+
+    def sugerencias(self):
+        """Índices sugeridos a partir de las formas con EXPLAIN ineficiente."""
+        with self._lock:
+            formas = [dict(d) for d in self._formas.values() if d["explain"]]
+        propuestas = {}
+        for datos in formas:
+            motivos = plan_ineficiente(datos["explain"])
+            if not motivos:
+                continue
+            tabla, columnas = columnas_indice(datos["forma"])
+            if not tabla or not columnas:
+                continue
+            clave = (tabla, tuple(columnas))
+            existentes = indices_del_modelo(tabla)
+            en_modelo = any(indice[:len(columnas)] == tuple(columnas) for indice in existentes)
+            propuesta = propuestas.setdefault(clave, {
+                "tabla": tabla,
+                "columnas": columnas,
+                "motivos": set(),
+                "consultas": 0,
+                "total_ms": 0.0,
+                "en_modelo": en_modelo,
+                "indice": "Index({})".format(", ".join(f'"{n}"' for n in [f"ix_{tabla}_{'_'.join(columnas)}"] + columnas)),
+                "ddl": f"CREATE INDEX ix_{tabla}_{'_'.join(columnas)} ON {tabla} ({', '.join(columnas)})",
+            })
+            propuesta["motivos"].update(motivos)
+            propuesta["consultas"] += datos["veces"]
+            propuesta["total_ms"] += datos["total_ms"]
+        resultado = []
+        for propuesta in sorted(propuestas.values(), key=lambda p: -p["total_ms"]):
+            propuesta["motivos"] = sorted(propuesta["motivos"])
+            propuesta["total_ms"] = round(propuesta["total_ms"], 1)
+            propuesta["accion"] = ("El modelo ya define este índice: ejecutar migraciones.py" if propuesta["en_modelo"]
+                                   else "Agregar el índice a __table_args__ en modelo_sql.py")
+            resultado.append(propuesta)
+        return resultado
+
+    def reporte(self, limite=50):
+        with self._lock:
+            formas = sorted(self._formas.values(), key=lambda d: -d["total_ms"])[:limite]
+            formas = [{
+                "forma": d["forma"],
+                "veces": d["veces"],
+                "total_ms": round(d["total_ms"], 1),
+                "promedio_ms": round(d["total_ms"] / d["veces"], 1),
+                "max_ms": round(d["max_ms"], 1),
+                "rutas": d["rutas"],
+                "ultima": d["ultima"].isoformat(),
+                "parametros": d["parametros"],
+                "explain": d["explain"],
+            } for d in formas]
+            recientes = list(self._recientes)[-limite:][::-1]
+        return {
+            "umbral_ms": self.umbral_ms,
+            "explain_desde": self.explain_desde,
+            "formas": formas,
+            "recientes": recientes,
+            "sugerencias": self.sugerencias(),
+        }
+
+    def reiniciar(self):
+        with self._lock:
+            self._formas.clear()
+            self._recientes.clear()
+            self.descartadas = 0
+
+    def metricas(self):
+        return {
+            "umbral_ms": self.umbral_ms,
+            "formas": len(self._formas),
+            "consultas": sum(d["veces"] for d in self._formas.values()),
+            "descartadas": self.descartadas,
+        }
+
+
+registro_consultas = RegistroConsultas()
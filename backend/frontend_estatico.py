@@ -0,0 +1,136 @@
+# frontend_estatico.py
+"""
+Modo producción: la API sirve el build del frontend (frontend/dist) desde su
+mismo origen, así que las llamadas del dashboard no pasan por CORS ni por el
+preflight OPTIONS que provoca el header Authorization.
+
+- Al iniciar se carga el build en memoria con su ETag (hash del contenido).
+- Variantes precomprimidas: se usan los .br/.gz que genera `npm run build`
+  (scripts/precomprimir.js); si faltan, se comprimen al cargar (gzip siempre,
+  brotli si está instalado el paquete `brotli`).
+- /assets/* (nombres con hash de Vite): Cache-Control immutable por un año.
+  index.html y el resto: no-cache, revalidado con If-None-Match (304).
+- Rutas desconocidas sin extensión devuelven index.html (SPA).
+
+Se habilita con NUAM_FRONTEND_DIST=<ruta a frontend/dist>.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él solo se usan los .br ya generados
+    brotli = None
+
+FRONTEND_DIST = os.getenv("NUAM_FRONTEND_DIST")
+
+CACHE_INMUTABLE = "public, max-age=31536000, immutable"
+CACHE_REVALIDAR = "no-cache"
+TIPOS_COMPRIMIBLES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+TAMANO_MINIMO_COMPRESION = 1024
+EXTENSIONES_VARIANTE = {".br": "br", ".gz": "gzip"}
+
+
+class Recurso:
+    """Archivo del build en memoria con sus variantes comprimidas."""
+    __slots__ = ("contenido", "tipo", "etag", "cache", "variantes")
+
+    def __init__(self, contenido, tipo, cache):
+        self.contenido = contenido
+        self.tipo = tipo
+        self.etag = hashlib.sha256(contenido).hexdigest()[:20]
+        self.cache = cache
+        self.variantes = {}   # "br" | "gzip" -> bytes
+
+    def comprimible(self):
+        return len(self.contenido) >= TAMANO_MINIMO_COMPRESION and self.tipo.startswith(TIPOS_COMPRIMIBLES)
+
+
+def _leer(ruta):
+    with open(ruta, "rb") as f:
+        return f.read()
+
+
+class FrontendEstatico:
+
+    def __init__(self, directorio):
+        self.directorio = os.path.abspath(directorio)
+        self.recursos = {}
+        self.solicitudes = 0
+        self.no_modificadas = 0
+
+    def cargar(self):
+        """Carga el build completo; retorna la cantidad de archivos."""
+        recursos = {}
+        variantes = {}
+        for raiz, _, archivos in os.walk(self.directorio):
+            for nombre in archivos:
+                ruta = os.path.join(raiz, nombre)
+                relativa = os.path.relpath(ruta, self.directorio).replace(os.sep, "/")
+                base, extension = os.path.splitext(relativa)
+                if extension in EXTENSIONES_VARIANTE:
+                    variantes[(base, EXTENSIONES_VARIANTE[extension])] = ruta
+                    continue
+                tipo = mimetypes.guess_type(nombre)[0] or "application/octet-stream"
+                if tipo.startswith("text/") or tipo == "application/javascript":
+                    tipo += "; charset=utf-8"
+                cache = CACHE_INMUTABLE if relativa.startswith("assets/") else CACHE_REVALIDAR
+                recursos[relativa] = Recurso(_leer(ruta), tipo, cache)
+
+        for (relativa, codificacion), ruta in variantes.items():
+            if relativa in recursos:
+                recursos[relativa].variantes[codificacion] = _leer(ruta)
+        for recurso in recursos.values():
+            if not recurso.comprimible():
+                continue
+            if "gzip" not in recurso.variantes:
+                recurso.variantes["gzip"] = gzip.compress(recurso.contenido, compresslevel=9, mtime=0)
+            if "br" not in recurso.variantes and brotli is not None:
+                recurso.variantes["br"] = brotli.compress(recurso.contenido)
+
+        if "index.html" not in recursos:
+            raise RuntimeError(f"{self.directorio} no contiene index.html: ejecute `npm run build` en frontend/")
+        self.recursos = recursos
+        return len(recursos)
+
+    def _recurso(self, ruta):
+        ruta = ruta.lstrip("/") or "index.html"
+        recurso = self.recursos.get(ruta)
+        if recurso is None and "." not in ruta.rsplit("/", 1)[-1]:
+            recurso = self.recursos.get("index.html")   # ruta de la SPA
+        return recurso
+
+    def responder(self, ruta, accept_encoding="", if_none_match=None):
+        """Response para `ruta`, o None si no existe en el build."""
+        recurso = self._recurso(ruta)
+        if recurso is None:
+            return None
+        self.solicitudes += 1
+
+        aceptadas = {c.split(";")[0].strip() for c in (accept_encoding or "").split(",")}
+        codificacion = next((c for c in ("br", "gzip") if c in aceptadas and c in recurso.variantes), None)
+        etag = f'"{recurso.etag}-{codificacion}"' if codificacion else f'"{recurso.etag}"'
+        headers = {"ETag": etag, "Cache-Control": recurso.cache, "Vary": "Accept-Encoding"}
+
+        if if_none_match and etag in (e.strip() for e in if_none_match.split(",")):
+            self.no_modificadas += 1
+            return Response(status_code=304, headers=headers)
+        if codificacion:
+            headers["Content-Encoding"] = codificacion
+            return Response(recurso.variantes[codificacion], media_type=recurso.tipo, headers=headers)
+        return Response(recurso.contenido, media_type=recurso.tipo, headers=headers)
+
+    def metricas(self):
+        return {
+            "archivos": len(self.recursos),
+            "bytes": sum(len(r.contenido) for r in self.recursos.values()),
+            "solicitudes": self.solicitudes,
+            "no_modificadas": self.no_modificadas,
+        }
+
+
+frontend_estatico = FrontendEstatico(FRONTEND_DIST) if FRONTEND_DIST else None
@@ -0,0 +1,214 @@
+# journal_ordenes.py
+"""
+Journal binario append-only de eventos de órdenes (nueva, ejecución,
+cancelación, modificación) con snapshots periódicos del libro.
+
+- Registros de tamaño fijo escritos secuencialmente; fsync por lotes
+  (cada `lote_fsync` eventos o cada `intervalo_fsync` segundos).
+- La lectura usa mmap + struct.iter_unpack, sin parsear línea a línea.
+- Un snapshot guarda las órdenes en reposo junto con la posición del journal
+  en la que fue tomado: al iniciar se carga el snapshot y se reproduce solo
+  la cola posterior.
+"""
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+
+NUEVA = 1
+EJECUCION = 2
+CANCELACION = 3
+MODIFICACION = 4
+
+LADOS = ("Compra", "Venta")
+EPOCH = datetime(1970, 1, 1)
+
+# evento, seq, ts_us, idOrden, cantidad, precio (NaN = mercado), lado, instrumento, idUsuario, crc
+REGISTRO = struct.Struct("<BQqQqdB20s24sI")
+CUERPO = REGISTRO.size - 4
+# magic, versión, seq, offset del journal, cantidad de órdenes
+CABECERA_SNAPSHOT = struct.Struct("<8sHQQQ")
+MAGIC_SNAPSHOT = b"NUAMSNAP"
+VERSION_SNAPSHOT = 1
+REGISTROS_VERIFICADOS = 1024  # cola del journal cuyo CRC se valida al recuperar
+
+
+def _a_microsegundos(fecha):
+    return int((fecha - EPOCH) / timedelta(microseconds=1)) if fecha else 0
+
+def _desde_microsegundos(valor):
+    return EPOCH + timedelta(microseconds=valor) if valor else None
+
+def _texto(valor):
+    return valor.rstrip(b"\0").decode()
+
+def empaquetar(evento, seq, orden, cantidad=None):
+    """
+    Serializa un evento de la orden (cualquier objeto con los atributos de
+    OrdenReposo). En EJECUCION, `cantidad` es la cantidad ejecutada.
+    """
+    precio = float(orden.precioLimite) if orden.precioLimite else float("nan")
+    cantidad = orden.cantidad if cantidad is None else cantidad
+    cuerpo = REGISTRO.pack(
+        evento, seq, _a_microsegundos(orden.fechaCreacion), orden.idOrden, cantidad, precio,
+        LADOS.index(orden.tipo), orden.instrumento.encode(), orden.idUsuario.encode(), 0
+    )[:CUERPO]
+    return cuerpo + struct.pack("<I", zlib.crc32(cuerpo))
+
+def desempaquetar(registro):
+    """Campos de OrdenReposo (sin idOrden) a partir de un registro leído con REGISTRO."""
+    _, _, ts, _, cantidad, precio, lado, instrumento, usuario, _ = registro
+    return (
+        _texto(usuario), LADOS[lado], _texto(instrumento), cantidad,
+        None if precio != precio else precio, _desde_microsegundos(ts)
+    )
+
+class Journal:
+    """Escritor del journal con fsync agrupado."""
+
+    def __init__(self, directorio, lote_fsync=256, intervalo_fsync=0.05):
+        os.makedirs(directorio, exist_ok=True)
+        self.directorio = directorio
+        self.ruta = os.path.join(directorio, "ordenes.journal")
+        self.ruta_snapshot = os.path.join(directorio, "ordenes.snapshot")
+        self.lote_fsync = lote_fsync
+        self.intervalo_fsync = intervalo_fsync
+        self._lock = threading.Lock()
+        self._pendientes = 0
+        self._ultimo_fsync = time.monotonic()
+        self._archivo = None
+        self.seq = 0
+
+    def abrir(self, seq):
+        """Abre el journal para escritura continuando desde `seq`."""
+        self._archivo = open(self.ruta, "ab", buffering=1 << 20)
+        self.seq = seq
+        self._hilo = threading.Thread(target=self._fsync_periodico, daemon=True)
+        self._hilo.start()
+
+    @property
+    def offset(self):
+        return self._archivo.tell() if self._archivo else 0
+
+    def anotar(self, evento, orden, cantidad=None):
+        """Agrega un evento al journal. Retorna su número de secuencia."""
+        with self._lock:
+            self.seq += 1
+            self._archivo.write(empaquetar(evento, self.seq, orden, cantidad))
+            self._pendientes += 1
+            if self._pendientes >= self.lote_fsync:
+                self._sincronizar()
+            return self.seq
+
+    def _sincronizar(self):
+        self._archivo.flush()
+        os.fsync(self._archivo.fileno())
+        self._pendientes = 0
+        self._ultimo_fsync = time.monotonic()
+
+    def sincronizar(self):
+        with self._lock:
+            if self._archivo and self._pendientes:
+                self._sincronizar()
+
+    def _fsync_periodico(self):
+        while self._archivo is not None:
+            time.sleep(self.intervalo_fsync)
+            with self._lock:
+                if self._archivo is not None and self._pendientes and \
+                        time.monotonic() - self._ultimo_fsync >= self.intervalo_fsync:
+                    self._sincronizar()
+
+    def cerrar(self):
+        with self._lock:
+            if self._archivo is not None:
+                self._sincronizar()
+                self._archivo.close()
+                self._archivo = None
+
+    # ---------- Snapshots ----------
+
+    def posicion(self):
+        """(seq, offset) consistentes para tomar un snapshot."""
+        with self._lock:
+            if self._archivo is not None:
+                self._sincronizar()
+            return self.seq, self.offset
+
+    def escribir_snapshot(self, ordenes, seq, offset):
+        """Escribe atómicamente (tmp + fsync + rename) las órdenes en reposo."""
+        temporal = self.ruta_snapshot + ".tmp"
+        with open(temporal, "wb", buffering=1 << 20) as f:
+            f.write(CABECERA_SNAPSHOT.pack(MAGIC_SNAPSHOT, VERSION_SNAPSHOT, seq, offset, len(ordenes)))
+            for orden in ordenes:
+                f.write(empaquetar(NUEVA, seq, orden))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, self.ruta_snapshot)
+
+    def leer_snapshot(self):
+        """
+        Retorna (seq, offset, {idOrden: registro}) o (0, 0, {}) si no hay
+        snapshot. Los registros se decodifican con desempaquetar().
+        """
+        if not os.path.exists(self.ruta_snapshot):
+            return 0, 0, {}
+        with open(self.ruta_snapshot, "rb") as f:
+            datos = f.read()
+        magic, version, seq, offset, total = CABECERA_SNAPSHOT.unpack_from(datos)
+        if magic != MAGIC_SNAPSHOT or version != VERSION_SNAPSHOT:
+            raise ValueError(f"Snapshot inválido: {self.ruta_snapshot}")
+        cuerpo = memoryview(datos)[CABECERA_SNAPSHOT.size:CABECERA_SNAPSHOT.size + total * REGISTRO.size]
+        return seq, offset, {registro[3]: registro for registro in REGISTRO.iter_unpack(cuerpo)}
+
+    # ---------- Recuperación ----------
+
+    def reproducir(self, ordenes, offset=0):
+        """
+        Aplica sobre `ordenes` ({idOrden: registro}) los eventos desde `offset`.
+        Descarta un registro final incompleto o corrupto (escritura cortada)
+        truncando el archivo. Retorna (seq, eventos_aplicados).
+        """
+        if not os.path.exists(self.ruta) or os.path.getsize(self.ruta) <= offset:
+            return None, 0
+        tamano = os.path.getsize(self.ruta)
+        valido = offset + (tamano - offset) // REGISTRO.size * REGISTRO.size
+        seq, aplicados = None, 0
+        with open(self.ruta, "r+b") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+                vista = memoryview(mapa)
+                # Solo la cola (lo no sincronizado) puede haber quedado a medio escribir
+                inicio_cola = max(offset, valido - REGISTROS_VERIFICADOS * REGISTRO.size)
+                for pos in range(inicio_cola, valido, REGISTRO.size):
+                    crc = struct.unpack_from("<I", vista, pos + CUERPO)[0]
+                    if zlib.crc32(vista[pos:pos + CUERPO]) != crc:
+                        valido = pos
+                        break
+
+                # Se guardan los registros crudos; solo se decodifican los que sobreviven
+                obtener, quitar = ordenes.get, ordenes.pop
+                registro = None
+                for registro in REGISTRO.iter_unpack(vista[offset:valido]):
+                    evento = registro[0]
+                    if evento == NUEVA or evento == MODIFICACION:
+                        ordenes[registro[3]] = registro
+                    elif evento == CANCELACION:
+                        quitar(registro[3], None)
+                    elif evento == EJECUCION:
+                        actual = obtener(registro[3])
+                        if actual is not None:
+                            restante = actual[4] - registro[4]
+                            if restante > 0:
+                                ordenes[registro[3]] = actual[:4] + (restante,) + actual[5:]
+                            else:
+                                del ordenes[registro[3]]
+                    aplicados += 1
+                if registro is not None:
+                    seq = registro[1]
+                vista.release()
+            if valido < tamano:
+                f.truncate(valido)
+        return seq, aplicados
@@ -0,0 +1,242 @@
+# libro_ordenes.py
+import threading
+from datetime import datetime
+
+from modelo_sql import Orden
+from journal_ordenes import NUEVA, EJECUCION, CANCELACION, MODIFICACION, desempaquetar
+
+
+class OrdenReposo:
+    """Orden pendiente (en reposo) en el Order Book en memoria."""
+    __slots__ = ("idOrden", "idUsuario", "tipo", "instrumento", "cantidad", "precioLimite", "fechaCreacion")
+
+    def __init__(self, idOrden, idUsuario, tipo, instrumento, cantidad, precioLimite, fechaCreacion):
+        self.idOrden = idOrden
+        self.idUsuario = idUsuario
+        self.tipo = tipo
+        self.instrumento = instrumento
+        self.cantidad = cantidad
+        self.precioLimite = precioLimite
+        self.fechaCreacion = fechaCreacion
+
+    @classmethod
+    def desde_orden(cls, orden):
+        """Desde una fila de `ordenes`: en reposo queda lo que falta por ejecutar."""
+        return cls(orden.idOrden, orden.idUsuario, orden.tipo, orden.instrumento,
+                   orden.cantidad - (orden.cantidadEjecutada or 0), orden.precioLimite, orden.fechaCreacion)
+
+    @classmethod
+    def desde_dict(cls, id_usuario, orden_data):
+        """Desde el dict `orden` que retorna motor_ordenes.procesar_orden."""
+        return cls(orden_data["idOrden"], id_usuario, orden_data["tipo"], orden_data["instrumento"],
+                   orden_data["cantidad"], orden_data["precioLimite"],
+                   datetime.fromisoformat(orden_data["fechaCreacion"]))
+
+    def copia(self):
+        return OrdenReposo(self.idOrden, self.idUsuario, self.tipo, self.instrumento,
+                           self.cantidad, self.precioLimite, self.fechaCreacion)
+
+    def to_dict(self):
+        return {
+            "idOrden": self.idOrden,
+            "tipo": self.tipo,
+            "instrumento": self.instrumento,
+            "cantidad": self.cantidad,
+            "precioLimite": float(self.precioLimite) if self.precioLimite else None,
+            "estado": "Pendiente",
+            "fechaCreacion": self.fechaCreacion.isoformat() if self.fechaCreacion else None
+        }
+
+
+class IndiceOrdenes:
+    """
+    Índice en memoria idOrden -> orden pendiente, con índices secundarios por
+    usuario e instrumento. Cancelar o modificar una orden es O(1) y no requiere
+    recorrer el libro ni consultar la tabla `ordenes`.
+
+    Si se adjunta un Journal, cada cambio confirmado se anota en él y cada
+    `snapshot_cada` eventos se escribe un snapshot del índice, de modo que al
+    reiniciar se recupera sin consultar MySQL.
+    """
+
+    def __init__(self, snapshot_cada=100000):
+        self._lock = threading.Lock()
+        self._ordenes = {}
+        self._por_usuario = {}      # idUsuario -> {instrumento -> set(idOrden)}
+        self._por_instrumento = {}  # instrumento -> set(idOrden)
+        self.cargado = False
+        self.snapshot_cada = snapshot_cada
+        self._journal = None
+        self._eventos_sin_snapshot = 0
+        self._hilo_snapshot = None
+
+    def __len__(self):
+        return len(self._ordenes)
+
+    def _agregar(self, orden):
+        self._ordenes[orden.idOrden] = orden
+        self._por_usuario.setdefault(orden.idUsuario, {}).setdefault(orden.instrumento, set()).add(orden.idOrden)
+        self._por_instrumento.setdefault(orden.instrumento, set()).add(orden.idOrden)
+
+    def _sacar(self, id_orden):
+        orden = self._ordenes.pop(id_orden, None)
+        if orden is None:
+            return None
+        por_instr = self._por_usuario.get(orden.idUsuario, {})
+        ids = por_instr.get(orden.instrumento)
+        if ids is not None:
+            ids.discard(id_orden)
+            if not ids:
+                del por_instr[orden.instrumento]
+                if not por_instr:
+                    del self._por_usuario[orden.idUsuario]
+        ids = self._por_instrumento.get(orden.instrumento)
+        if ids is not None:
+            ids.discard(id_orden)
+            if not ids:
+                del self._por_instrumento[orden.instrumento]
+        return orden
+
+    def _anotar(self, evento, orden, cantidad=None):
+        """Anota el evento en el journal (si hay). Se llama con el lock tomado."""
+        if self._journal is None:
+            return
+        self._journal.anotar(evento, orden, cantidad)
+        self._eventos_sin_snapshot += 1
+        if self._eventos_sin_snapshot >= self.snapshot_cada and \
+                (self._hilo_snapshot is None or not self._hilo_snapshot.is_alive()):
+            self._eventos_sin_snapshot = 0
+            seq, offset = self._journal.posicion()
+            copia = [o.copia() for o in self._ordenes.values()]
+            self._hilo_snapshot = threading.Thread(
+                target=self._journal.escribir_snapshot, args=(copia, seq, offset), daemon=True
+            )
+            self._hilo_snapshot.start()
+
+    def registrar(self, orden):
+        """Agrega una orden pendiente nueva al índice."""
+        with self._lock:
+            self._agregar(orden)
+            self._anotar(NUEVA, orden)
+
+    def devolver(self, orden):
+        """Reinserta una orden tomada cuyo cambio no llegó a confirmarse en MySQL."""
+        with self._lock:
+            self._agregar(orden)
+
+    def obtener(self, id_orden):
+        return self._ordenes.get(id_orden)
+
+    def ordenes(self):
+        """Copia de la lista de órdenes en reposo."""
+        with self._lock:
+            return list(self._ordenes.values())
+
+    def de_instrumento(self, instrumento):
+        """Órdenes en reposo de un instrumento (sin quitarlas del índice)."""
+        with self._lock:
+            return [self._ordenes[i] for i in self._por_instrumento.get(instrumento, ())]
+
+    def tomar(self, id_orden):
+        """Quita y retorna la orden (None si no está pendiente). Ver confirmar_*."""
+        with self._lock:
+            return self._sacar(id_orden)
+
+    def confirmar_cancelacion(self, ordenes):
+        """Anota las cancelaciones ya confirmadas en MySQL de órdenes tomadas."""
+        with self._lock:
+            for orden in ordenes:
+                self._anotar(CANCELACION, orden)
+
+    def descartar(self, orden):
+        """
+        Anota el retiro de una orden tomada que ya no estaba pendiente en MySQL
+        (ejecutada o cancelada por otro camino), para que el journal no la
+        reponga al recuperar.
+        """
+        with self._lock:
+            self._anotar(CANCELACION, orden)
+
+    def confirmar_modificacion(self, orden):
+        """Reinserta una orden tomada y modificada, ya confirmada en MySQL."""
+        with self._lock:
+            self._agregar(orden)
+            self._anotar(MODIFICACION, orden)
+
+    def registrar_ejecucion(self, id_orden, cantidad):
+        """Descuenta una ejecución de una orden en reposo; la quita si queda en cero."""
+        with self._lock:
+            orden = self._ordenes.get(id_orden)
+            if orden is None:
+                return None
+            self._anotar(EJECUCION, orden, cantidad)
+            if cantidad >= orden.cantidad:
+                return self._sacar(id_orden)
+            orden.cantidad -= cantidad
+            return orden
+
+    def tomar_varias(self, id_usuario=None, instrumento=None):
+        """Quita y retorna todas las órdenes de un usuario y/o instrumento."""
+        with self._lock:
+            if id_usuario is not None:
+                por_instr = self._por_usuario.get(id_usuario, {})
+                if instrumento is not None:
+                    ids = list(por_instr.get(instrumento, ()))
+                else:
+                    ids = [i for conjunto in por_instr.values() for i in conjunto]
+            elif instrumento is not None:
+                ids = list(self._por_instrumento.get(instrumento, ()))
+            else:
+                ids = []
+            return [self._sacar(i) for i in ids]
+
+    def _reemplazar(self, ordenes):
+        self._ordenes.clear()
+        self._por_usuario.clear()
+        self._por_instrumento.clear()
+        for o in ordenes:
+            self._agregar(o)
+        self.cargado = True
+
+    def cargar_desde_db(self, session):
+        """Reconstruye el índice con las órdenes 'Pendiente' guardadas en MySQL."""
+        pendientes = session.query(Orden).filter(Orden.estado == 'Pendiente').all()
+        with self._lock:
+            self._reemplazar(OrdenReposo.desde_orden(o) for o in pendientes)
+            if self._journal is not None:
+                # El estado de MySQL pasa a ser la base del journal
+                seq, offset = self._journal.posicion()
+                self._journal.escribir_snapshot(list(self._ordenes.values()), seq, offset)
+                self._eventos_sin_snapshot = 0
+        return len(pendientes)
+
+    def usar_journal(self, journal):
+        """
+        Adjunta el journal y recupera el índice desde el último snapshot más la
+        cola de eventos. Retorna la cantidad de órdenes recuperadas, o None si
+        el journal está vacío (el índice debe cargarse desde MySQL).
+        """
+        seq, offset, ordenes = journal.leer_snapshot()
+        ultimo_seq, aplicados = journal.reproducir(ordenes, offset)
+        journal.abrir(ultimo_seq or seq)
+        with self._lock:
+            self._journal = journal
+            if seq == 0 and ultimo_seq is None:
+                return None
+            self._reemplazar(OrdenReposo(id_orden, *desempaquetar(r)) for id_orden, r in ordenes.items())
+            self._eventos_sin_snapshot = aplicados
+        return len(ordenes)
+
+    def cerrar(self):
+        """Escribe un snapshot final y cierra el journal."""
+        if self._journal is None:
+            return
+        if self._hilo_snapshot is not None:
+            self._hilo_snapshot.join()
+        with self._lock:
+            seq, offset = self._journal.posicion()
+            self._journal.escribir_snapshot(list(self._ordenes.values()), seq, offset)
+            self._journal.cerrar()
+            self._journal = None
+
+indice_ordenes = IndiceOrdenes()
@@ -1,9 +1,11 @@
 # main.py
+import argparse
 import os
 from auth import login, logout, get_current_user
 from operador import colocar_orden
 from administrador import ver_reportes, configurar_tarifas_mercado
 from seteo_programa import inicializar_todo
+from carga_lote import cargar_archivo_local, TAM_LOTE
 
 def abrir_html_conceptual():
     """Abre el archivo HTML de bienvenida para cumplir el requisito de 'apertura html'."""
@@ -63,7 +65,22 @@ def menu_administrador():
             print(" Opción no válida.")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="NUAM Exchange (menú interactivo o carga de órdenes por lotes)")
+    parser.add_argument("--cargar", metavar="ARCHIVO",
+                        help="Carga órdenes desde un CSV/NDJSON sin menú interactivo (con la API detenida)")
+    parser.add_argument("--formato", choices=["csv", "ndjson"], help="Por defecto, según la extensión del archivo")
+    parser.add_argument("--lote", type=int, default=TAM_LOTE, help="Órdenes por commit")
+    parser.add_argument("--id-usuario", help="Usuario de las órdenes sin columna idUsuario")
+    parser.add_argument("--bolsa", choices=["CL", "PE", "CO"], help="Bolsa de las órdenes sin columna perfilBolsa")
+    parser.add_argument("--semilla", type=int, help="Semilla de la simulación de ejecución (reproducible)")
+    args = parser.parse_args()
+
     inicializar_todo() # Prepara ambas bases de datos
+
+    if args.cargar:
+        estado = cargar_archivo_local(args.cargar, args.formato, args.lote, args.id_usuario, args.bolsa, args.semilla)
+        raise SystemExit(0 if estado is not None else 1)
+
     abrir_html_conceptual() # Abre la ventana de bienvenida
     
     while True:
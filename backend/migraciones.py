@@ -0,0 +1,231 @@
+# migraciones.py
+"""
+Migraciones de esquema sobre tablas ya existentes (create_all no agrega
+columnas ni índices a tablas creadas con una versión anterior del modelo).
+
+- Columnas nuevas (nullable) e índices del modelo que falten en MySQL; los
+  índices reemplazados (INDICES_REEMPLAZADOS) se eliminan.
+- transacciones: backfill de `instrumento` e `idOrdenCompraRef`/`idOrdenVentaRef`
+  por lotes desde `ordenes`, de `monto` (precio * cantidad), y reescritura de
+  los Parquet archivados que aún no tienen esas columnas.
+
+El backfill de instrumento guarda su avance (último idTransaccion recorrido)
+en `migraciones_puntos_control`: las transacciones cuya orden no está en
+MySQL quedan con instrumento NULL y no se vuelven a recorrer en cada inicio.
+
+Es idempotente; la ejecuta seteo_programa.py o:
+    python migraciones.py
+"""
+import os
+from datetime import datetime
+
+from sqlalchemy import inspect, select, update, bindparam, text
+
+from db_coneccion import Engine_MYSQL, get_mysql_session
+from modelo_sql import Base, Orden, Transaccion, PuntoControlMigracion
+
+LOTE_BACKFILL = 10000
+# Índices reemplazados por otro del modelo (mismo propósito, otras columnas)
+INDICES_REEMPLAZADOS = {
+    "transacciones": ["ix_transacciones_fecha_agregados"],   # -> ix_transacciones_fecha_agregados_lado
+}
+
+
+def id_orden_numerico(valor):
+    """idOrden entero a partir de idOrdenCompra/idOrdenVenta (None para 'MATCH_FICTICIO')."""
+    return int(valor) if valor and str(valor).isdigit() else None
+
+
+def migrar_esquema(base=Base):
+    """Agrega columnas nullable e índices del modelo que falten en las tablas existentes y elimina los reemplazados."""
+    agregadas = []
+    with Engine_MYSQL.begin() as conn:
+        existentes_tablas = set(inspect(conn).get_table_names())
+        for tabla in base.metadata.sorted_tables:
+            if tabla.name not in existentes_tablas:
+                continue
+            existentes = {c["name"] for c in inspect(conn).get_columns(tabla.name)}
+            for col in tabla.columns:
+                if col.name in existentes:
+                    continue
+                if not col.nullable:
+                    print(f"⚠ Columna {tabla.name}.{col.name} NOT NULL: requiere migración manual.")
+                    continue
+                tipo = col.type.compile(dialect=conn.dialect)
+                conn.execute(text(f"ALTER TABLE {tabla.name} ADD COLUMN {col.name} {tipo} NULL"))
+                agregadas.append(f"{tabla.name}.{col.name}")
+            for indice in tabla.indexes:
+                indice.create(conn, checkfirst=True)
+            existentes_indices = {i["name"] for i in inspect(conn).get_indexes(tabla.name)}
+            for nombre in INDICES_REEMPLAZADOS.get(tabla.name, []):
+                if nombre in existentes_indices:
+                    conn.execute(text(f"DROP INDEX {nombre} ON {tabla.name}"))
+                    print(f"✅ Índice reemplazado eliminado: {tabla.name}.{nombre}")
+    for nombre in agregadas:
+        print(f"✅ Columna agregada: {nombre}")
+    return agregadas
+
+
+def _instrumentos_de_ordenes(session, ids):
+    if not ids:
+        return {}
+    return dict(session.execute(
+        select(Orden.idOrden, Orden.instrumento).where(Orden.idOrden.in_(ids))
+    ).all())
+
+
+def _punto_control(session, nombre):
+    """Fila del punto de control del backfill `nombre`, bloqueada (se crea en 0 si no existe)."""
+    punto = session.get(PuntoControlMigracion, nombre, with_for_update=True)
+    if punto is None:
+        punto = PuntoControlMigracion(nombre=nombre, ultimoId=0)
+        session.add(punto)
+    return punto
+
+
+def backfill_transacciones(lote=LOTE_BACKFILL):
+    """
+    Completa instrumento y referencias tipadas de las transacciones anteriores
+    a la migración, desde el último idTransaccion recorrido en una ejecución previa.
+    """
+    tabla = Transaccion.__table__
+    with get_mysql_session() as session:
+        inicio = _punto_control(session, "transacciones_instrumento").ultimoId
+    actualizar = (
+        update(tabla)
+        .where(tabla.c.idTransaccion == bindparam("_id"))
+        .values(instrumento=bindparam("_instrumento"),
+                idOrdenCompraRef=bindparam("_compra"),
+                idOrdenVentaRef=bindparam("_venta"))
+    )
+    ultimo, total, sin_orden = inicio, 0, 0
+    while True:
+        with get_mysql_session() as session:
+            filas = session.execute(
+                select(tabla.c.idTransaccion, tabla.c.idOrdenCompra, tabla.c.idOrdenVenta)
+                .where(tabla.c.idTransaccion > ultimo, tabla.c.instrumento.is_(None))
+                .order_by(tabla.c.idTransaccion)
+                .limit(lote)
+            ).all()
+            if not filas:
+                break
+            ultimo = filas[-1].idTransaccion
+
+            refs = [(f.idTransaccion, id_orden_numerico(f.idOrdenCompra), id_orden_numerico(f.idOrdenVenta))
+                    for f in filas]
+            instrumentos = _instrumentos_de_ordenes(
+                session, {i for _, compra, venta in refs for i in (compra, venta) if i is not None}
+            )
+            parametros = []
+            for id_transaccion, compra, venta in refs:
+                instrumento = instrumentos.get(compra) or instrumentos.get(venta)
+                sin_orden += instrumento is None
+                parametros.append({"_id": id_transaccion, "_instrumento": instrumento,
+                                   "_compra": compra, "_venta": venta})
+            session.connection().execute(actualizar, parametros)
+            # El avance se guarda en la misma transacción que el lote
+            punto = _punto_control(session, "transacciones_instrumento")
+            punto.ultimoId = max(punto.ultimoId, ultimo)
+            punto.fechaActualizacion = datetime.utcnow()
+        total += len(filas)
+        print(f"  transacciones: {total} filas completadas")
+    if sin_orden:
+        print(f"⚠ {sin_orden} transacciones sin orden en MySQL (¿archivada?): instrumento queda en NULL.")
+    return total
+
+
+def backfill_monto(lote=LOTE_BACKFILL):
+    """Completa `monto` = precioEjecucion * cantidadEjecutada por rangos de idTransaccion."""
+    tabla = Transaccion.__table__
+    ultimo, total = 0, 0
+    while True:
+        with get_mysql_session() as session:
+            ids = session.execute(
+                select(tabla.c.idTransaccion)
+                .where(tabla.c.idTransaccion > ultimo, tabla.c.monto.is_(None))
+                .order_by(tabla.c.idTransaccion)
+                .limit(lote)
+            ).scalars().all()
+            if not ids:
+                break
+            ultimo = ids[-1]
+            session.execute(
+                update(tabla)
+                .where(tabla.c.idTransaccion.between(ids[0], ids[-1]), tabla.c.monto.is_(None))
+                .values(monto=tabla.c.precioEjecucion * tabla.c.cantidadEjecutada)
+            )
+        total += len(ids)
+        print(f"  transacciones: {total} montos completados")
+    return total
+
+
+def migrar_archivo_transacciones():
+    """Reescribe los Parquet de transacciones archivados sin las columnas `instrumento` o `monto`."""
+    from particiones import ARCHIVO_DIR, esquema_archivo, pa, pq, ds
+
+    carpeta = os.path.join(ARCHIVO_DIR, "transacciones")
+    if pa is None or not os.path.isdir(carpeta):
+        return 0
+    esquema = esquema_archivo("transacciones")
+    carpeta_ordenes = os.path.join(ARCHIVO_DIR, "ordenes")
+    ordenes_archivadas = None
+    if os.path.isdir(carpeta_ordenes):
+        ordenes_archivadas = ds.dataset(carpeta_ordenes, schema=esquema_archivo("ordenes"), format="parquet")
+
+    reescritos = 0
+    for raiz, _, archivos in os.walk(carpeta):
+        for nombre in archivos:
+            if not nombre.endswith(".parquet") or nombre.startswith("_"):
+                continue
+            ruta = os.path.join(raiz, nombre)
+            existentes = pq.read_schema(ruta).names
+            if "instrumento" in existentes and "monto" in existentes:
+                continue
+            filas = pq.read_table(ruta).to_pylist()
+            for t in filas:
+                t["monto"] = t["precioEjecucion"] * t["cantidadEjecutada"]
+            if "instrumento" not in existentes:
+                _completar_instrumentos(filas, ordenes_archivadas)
+
+            temporal = os.path.join(raiz, f"_{nombre}.tmp")
+            pq.write_table(pa.Table.from_pylist(filas, schema=esquema), temporal, compression="zstd")
+            os.replace(temporal, ruta)
+            reescritos += 1
+    if reescritos:
+        print(f"✅ Archivos de transacciones migrados: {reescritos}")
+    return reescritos
+
+
+def _completar_instrumentos(filas, ordenes_archivadas):
+    """Referencias tipadas e instrumento de transacciones archivadas (desde órdenes archivadas o MySQL)."""
+    from particiones import ds
+
+    ids = set()
+    for t in filas:
+        t["idOrdenCompraRef"] = id_orden_numerico(t["idOrdenCompra"])
+        t["idOrdenVentaRef"] = id_orden_numerico(t["idOrdenVenta"])
+        ids.update(i for i in (t["idOrdenCompraRef"], t["idOrdenVentaRef"]) if i is not None)
+
+    instrumentos = {}
+    if ordenes_archivadas is not None and ids:
+        encontradas = ordenes_archivadas.to_table(
+            columns=["idOrden", "instrumento"], filter=ds.field("idOrden").isin(list(ids))
+        )
+        instrumentos = dict(zip(encontradas["idOrden"].to_pylist(), encontradas["instrumento"].to_pylist()))
+    faltantes = ids - instrumentos.keys()
+    if faltantes:
+        with get_mysql_session() as session:
+            instrumentos.update(_instrumentos_de_ordenes(session, faltantes))
+    for t in filas:
+        t["instrumento"] = instrumentos.get(t["idOrdenCompraRef"]) or instrumentos.get(t["idOrdenVentaRef"])
+
+
+def migrar_todo():
+    migrar_esquema()
+    backfill_transacciones()
+    backfill_monto()
+    migrar_archivo_transacciones()
+
+
+if __name__ == "__main__":
+    migrar_todo()
@@ -1,5 +1,6 @@
 # modelo_sql.py
-from sqlalchemy import Column, Integer, String, Float, DateTime, Enum
+from sqlalchemy import Column, Integer, String, Float, DateTime, Enum, Index
+from sqlalchemy.dialects.mysql import DATETIME
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
@@ -13,9 +14,20 @@ class Orden(Base):
     tipo = Column(Enum('Compra', 'Venta'), nullable=False)
     instrumento = Column(String(20), nullable=False)
     cantidad = Column(Integer, nullable=False)
+    # Ejecutado hasta ahora (calces parciales de subasta); pendiente = cantidad - cantidadEjecutada
+    cantidadEjecutada = Column(Integer, nullable=True, default=0)
     precioLimite = Column(Float, nullable=True)
     estado = Column(Enum('Pendiente', 'Ejecutada', 'Cancelada'), default='Pendiente')
     fechaCreacion = Column(DateTime, default=datetime.utcnow)
+    # Alta o último cambio (versiones.py: ETag de /api/ordenes); microsegundos en MySQL
+    fechaActualizacion = Column(DateTime().with_variant(DATETIME(fsp=6), "mysql"),
+                                default=datetime.utcnow, onupdate=datetime.utcnow, nullable=True)
+    
+    # GET /api/ordenes: últimas órdenes del usuario sin filesort; versión de sus órdenes
+    __table_args__ = (
+        Index("ix_ordenes_usuario_fecha", "idUsuario", "fechaCreacion"),
+        Index("ix_ordenes_usuario_actualizacion", "idUsuario", "fechaActualizacion"),
+    )
     
     def __repr__(self):
         return f"<Orden {self.idOrden}: {self.tipo} {self.cantidad} {self.instrumento} @ {self.precioLimite}>"
@@ -26,10 +38,80 @@ class Transaccion(Base):
     idTransaccion = Column(Integer, primary_key=True, autoincrement=True)
     idOrdenCompra = Column(String(50), nullable=False)
     idOrdenVenta = Column(String(50), nullable=False)
+    # Referencias tipadas a `ordenes` (None para la contraparte ficticia). Sin
+    # FOREIGN KEY: MySQL no las admite en tablas particionadas (particiones.py).
+    idOrdenCompraRef = Column(Integer, nullable=True, index=True)
+    idOrdenVentaRef = Column(Integer, nullable=True, index=True)
+    instrumento = Column(String(20), nullable=True)
     precioEjecucion = Column(Float, nullable=False)
     cantidadEjecutada = Column(Integer, nullable=False)
-    fechaEjecucion = Column(DateTime, default=datetime.utcnow)
+    fechaEjecucion = Column(DateTime, default=datetime.utcnow, index=True)
     bolsaOrigen = Column(String(20), nullable=False)
+    # precioEjecucion * cantidadEjecutada, guardado para filtrar por notional en SQL
+    monto = Column(Float, nullable=True)
+    
+    # Reportes: listados por fecha descendente filtrados por instrumento o bolsa
+    # (igualdad primero, luego el rango de fechas), y agregados por rango de
+    # fechas que se resuelven solo con el índice (cubriente, incluido el filtro
+    # de lado; en los listados ese filtro se evalúa sobre el índice antes de
+    # leer la fila)
+    __table_args__ = (
+        Index("ix_transacciones_instrumento_fecha", "instrumento", "fechaEjecucion"),
+        Index("ix_transacciones_bolsa_fecha", "bolsaOrigen", "fechaEjecucion"),
+        Index("ix_transacciones_fecha_agregados_lado", "fechaEjecucion", "instrumento", "bolsaOrigen",
+              "cantidadEjecutada", "monto", "idOrdenCompraRef", "idOrdenVentaRef"),
+    )
+    
+    def __repr__(self):
+        return f"<Transaccion {self.idTransaccion}: {self.cantidadEjecutada} {self.instrumento} @ ${self.precioEjecucion}>"
+
+class Posicion(Base):
+    __tablename__ = 'posiciones'
+    
+    idUsuario = Column(String(50), primary_key=True)
+    instrumento = Column(String(20), primary_key=True)
+    cantidadNeta = Column(Integer, nullable=False, default=0)
+    costoPromedio = Column(Float, nullable=False, default=0.0)
+    pnlRealizado = Column(Float, nullable=False, default=0.0)
+    fechaActualizacion = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<Posicion {self.idUsuario}/{self.instrumento}: {self.cantidadNeta} @ {self.costoPromedio}>"
+
+class CargaLote(Base):
+    __tablename__ = 'cargas_lote'
+    
+    # Punto de control de carga_lote.py: se actualiza en la misma transacción que cada lote
+    idCarga = Column(String(100), primary_key=True)
+    archivo = Column(String(255), nullable=False)
+    lineasProcesadas = Column(Integer, nullable=False, default=0)
+    ordenesCreadas = Column(Integer, nullable=False, default=0)
+    ordenesEjecutadas = Column(Integer, nullable=False, default=0)
+    rechazadas = Column(Integer, nullable=False, default=0)
+    estado = Column(Enum('En curso', 'Completada'), nullable=False, default='En curso')
+    fechaInicio = Column(DateTime, default=datetime.utcnow)
+    fechaActualizacion = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<CargaLote {self.idCarga}: {self.lineasProcesadas} líneas ({self.estado})>"
+
+class PuntoControlMigracion(Base):
+    __tablename__ = 'migraciones_puntos_control'
+    
+    # Último id recorrido por cada backfill de migraciones.py (no se vuelve a recorrer)
+    nombre = Column(String(50), primary_key=True)
+    ultimoId = Column(Integer, nullable=False, default=0)
+    fechaActualizacion = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<PuntoControlMigracion {self.nombre}: {self.ultimoId}>"
+
+class Bloqueo(Base):
+    __tablename__ = 'bloqueos'
+    
+    # Filas candado entre procesos: FOR SHARE para quienes pueden convivir,
+    # FOR UPDATE para quien necesita exclusividad (p. ej. reconstruir posiciones)
+    nombre = Column(String(50), primary_key=True)
     
     def __repr__(self):
-        return f"<Transaccion {self.idTransaccion}: {self.cantidadEjecutada} @ ${self.precioEjecucion}>"
\ No newline at end of file
+        return f"<Bloqueo {self.nombre}>"
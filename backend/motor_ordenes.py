@@ -0,0 +1,258 @@
+# motor_ordenes.py
+import os
+import random
+from contextlib import contextmanager
+from datetime import datetime
+
+from db_coneccion import get_mongodb, get_mysql_session, registrar_escritura
+from modelo_sql import Orden, Transaccion
+from posiciones import aplicar_ejecucion, bloquear_posiciones, guardar_posiciones, libro_posiciones, EstadoPosicion
+from libro_ordenes import indice_ordenes, OrdenReposo
+from riesgo import control_riesgo
+from subasta import gestor_subastas
+from transacciones_recientes import transacciones_recientes
+from versiones import versiones
+from journal_ordenes import Journal
+from bloqueo_instancia import bloqueo_instancia
+
+JOURNAL_DIR = os.getenv("NUAM_JOURNAL_DIR")
+
+PROBABILIDAD_EJECUCION = 0.7
+TIPOS_ORDEN = ('Compra', 'Venta')
+
+
+def validar_orden(instrumento, tipo, cantidad, precio_limite=None):
+    """Validaciones de entrada comunes a la API y a la carga por lotes. Retorna el motivo de rechazo o None."""
+    if not instrumento:
+        return "Instrumento requerido"
+    if tipo not in TIPOS_ORDEN:
+        return "Tipo de orden inválido"
+    if cantidad is None or cantidad <= 0:
+        return "La cantidad debe ser mayor a cero"
+    if precio_limite is not None and precio_limite < 0:
+        return "El precio límite no puede ser negativo"
+    return None
+
+
+def precio_de_ejecucion(precio_limite, rng=random):
+    """Simulación del match: precio de ejecución, o None si la orden queda en el libro."""
+    if rng.random() < PROBABILIDAD_EJECUCION:
+        return precio_limite if precio_limite else round(rng.uniform(90.00, 100.00), 2)
+    return None
+
+
+def ejecutar_ordenes(session, pedidos, rng=random, posiciones=None):
+    """
+    Registra en `session` las órdenes de `pedidos` (tuplas usuario, instrumento,
+    tipo, cantidad, precio_limite, ejecutar) y simula su ejecución, con un
+    flush por tabla para todo el lote. `posiciones` acumula {(idUsuario,
+    instrumento): EstadoPosicion} para encadenar varias ejecuciones de la misma
+    posición dentro de la transacción; quien llama lo aplica a libro_posiciones
+    tras el commit. Las órdenes con `ejecutar=False` (fase de subasta) solo se
+    registran.
+    """
+    posiciones = {} if posiciones is None else posiciones
+    modificadas = {}
+    ordenes = []
+    for usuario, instrumento, tipo, cantidad, precio_limite, ejecutar in pedidos:
+        nueva_orden = Orden(
+            idUsuario=usuario['idUsuario'],
+            tipo=tipo,
+            instrumento=instrumento,
+            cantidad=cantidad,
+            precioLimite=precio_limite
+        )
+        precio_ejecucion = precio_de_ejecucion(precio_limite, rng) if ejecutar else None
+        if precio_ejecucion is not None:
+            nueva_orden.estado = 'Ejecutada'
+            nueva_orden.cantidadEjecutada = cantidad
+        session.add(nueva_orden)
+        ordenes.append((nueva_orden, usuario, precio_ejecucion, ejecutar))
+    session.flush()
+
+    # Posiciones a modificar, bloqueadas en MySQL antes de aplicar las ejecuciones
+    posiciones.update(bloquear_posiciones(session, {
+        (usuario['idUsuario'], o.instrumento) for o, usuario, precio, _ in ordenes if precio is not None
+    } - posiciones.keys()))
+
+    resultados = []
+    transacciones = []
+    for nueva_orden, usuario, precio_ejecucion, ejecutar in ordenes:
+        orden_data = {
+            "idOrden": nueva_orden.idOrden,
+            "tipo": nueva_orden.tipo,
+            "instrumento": nueva_orden.instrumento,
+            "cantidad": nueva_orden.cantidad,
+            "precioLimite": float(nueva_orden.precioLimite) if nueva_orden.precioLimite else None,
+            "estado": nueva_orden.estado,
+            "fechaCreacion": nueva_orden.fechaCreacion.isoformat()
+        }
+        resultado = {"orden": orden_data, "transaccion": None, "posicion": None}
+        if precio_ejecucion is None:
+            resultado["mensaje"] = "Orden registrada. Pendiente de match en el Order Book" if ejecutar else \
+                "Orden registrada para la subasta. Se ejecutará al calce"
+        else:
+            tipo, instrumento = nueva_orden.tipo, nueva_orden.instrumento
+            transaccion = Transaccion(
+                idOrdenCompra=str(nueva_orden.idOrden) if tipo == 'Compra' else 'MATCH_FICTICIO',
+                idOrdenVenta=str(nueva_orden.idOrden) if tipo == 'Venta' else 'MATCH_FICTICIO',
+                idOrdenCompraRef=nueva_orden.idOrden if tipo == 'Compra' else None,
+                idOrdenVentaRef=nueva_orden.idOrden if tipo == 'Venta' else None,
+                instrumento=instrumento,
+                precioEjecucion=precio_ejecucion,
+                cantidadEjecutada=nueva_orden.cantidad,
+                monto=precio_ejecucion * nueva_orden.cantidad,
+                fechaEjecucion=datetime.utcnow(),
+                bolsaOrigen=usuario['perfilBolsa']
+            )
+            session.add(transaccion)
+            transacciones.append((transaccion, resultado))
+            clave = (usuario['idUsuario'], instrumento)
+            posicion = aplicar_ejecucion(session, usuario['idUsuario'], instrumento, tipo,
+                                         nueva_orden.cantidad, precio_ejecucion, actual=posiciones.get(clave))
+            posiciones[clave] = modificadas[clave] = posicion
+            resultado["posicion"] = posicion.to_dict()
+            resultado["mensaje"] = f"Orden ejecutada exitosamente a ${precio_ejecucion}"
+        resultados.append(resultado)
+    if transacciones:
+        guardar_posiciones(session, modificadas)
+        session.flush()
+
+    for transaccion, resultado in transacciones:
+        resultado["transaccion"] = {
+            "idTransaccion": transaccion.idTransaccion,
+            "bolsaOrigen": transaccion.bolsaOrigen,
+            "instrumento": transaccion.instrumento,
+            "idOrdenCompra": transaccion.idOrdenCompra,
+            "idOrdenVenta": transaccion.idOrdenVenta,
+            "precioEjecucion": float(transaccion.precioEjecucion),
+            "cantidadEjecutada": transaccion.cantidadEjecutada,
+            "monto": float(transaccion.monto),
+            "fechaEjecucion": transaccion.fechaEjecucion.isoformat()
+        }
+    return resultados
+
+
+def procesar_orden(usuario, instrumento, tipo, cantidad, precio_limite, ejecutar=True, rng=random):
+    """
+    Registra la orden en MySQL y simula su ejecución (Trading Core), salvo
+    con `ejecutar=False` (instrumento en subasta: queda en el libro).
+    Las validaciones de entrada ya fueron hechas por quien llama.
+    Retorna un dict con `mensaje`, `orden`, `transaccion` y `posicion` (estas
+    dos últimas en None si la orden queda pendiente).
+    """
+    posiciones = {}
+    with get_mysql_session() as session:
+        resultado = ejecutar_ordenes(session, [(usuario, instrumento, tipo, cantidad, precio_limite, ejecutar)],
+                                     rng, posiciones)[0]
+
+    # Confirmado el commit, se refleja en el mapa en memoria
+    for (id_usuario, instr), estado in posiciones.items():
+        libro_posiciones.fijar(id_usuario, instr, estado)
+    return resultado
+
+
+# ============= COLOCACIÓN: ESTADO EN MEMORIA =============
+
+class ColocacionOrdenes:
+    """
+    Pasos en memoria alrededor de la escritura de una orden (la hace
+    procesar_orden en este proceso o el shard dueño del instrumento):
+    `reservar` antes (control pre-trade y fase de subasta) y `confirmar` tras
+    el commit (índice de órdenes en reposo, posiciones, riesgo, versiones y
+    buffer de transacciones recientes). Los comparten /api/orden, la carga por
+    lotes y benchmarks/bench_motor.py, que crea una instancia con su propio
+    estado.
+    """
+
+    def __init__(self, indice=indice_ordenes, riesgo=control_riesgo, subastas=gestor_subastas,
+                 posiciones=libro_posiciones, recientes=transacciones_recientes):
+        self.indice = indice
+        self.riesgo = riesgo
+        self.subastas = subastas
+        self.posiciones = posiciones
+        self.recientes = recientes
+
+    def reservar(self, usuario, instrumento, tipo, cantidad, precio_limite):
+        """
+        Reserva la exposición de la orden (ya validada con validar_orden).
+        Retorna (reserva, ejecutar, None), o (None, None, motivo) si el control
+        pre-trade la rechaza. `ejecutar` es False si el instrumento está en
+        subasta: la orden solo se registra y se ejecuta al calce.
+        """
+        reserva, motivo = self.riesgo.reservar(usuario['idUsuario'], usuario['perfilBolsa'], instrumento,
+                                               tipo, cantidad, precio_limite)
+        if motivo is not None:
+            return None, None, motivo
+        return reserva, not self.subastas.en_subasta(instrumento), None
+
+    def descartar(self, reserva):
+        """Libera la reserva de una orden que no llegó a confirmarse en MySQL."""
+        self.riesgo.orden_cerrada(reserva)
+
+    def confirmar(self, usuario, reserva, resultado):
+        """Refleja en memoria una orden ya confirmada (resultado de procesar_orden)."""
+        id_usuario = usuario['idUsuario']
+        orden, transaccion = resultado["orden"], resultado["transaccion"]
+        registrar_escritura(id_usuario)
+        versiones.invalidar("ordenes", id_usuario)
+        if transaccion is not None:
+            versiones.invalidar("transacciones")
+            self.recientes.agregar(transaccion)
+        if resultado["posicion"] is not None:
+            # En modo shards el mapa de posiciones de la API es un espejo del shard
+            self.posiciones.fijar(id_usuario, orden["instrumento"], EstadoPosicion.desde_dict(resultado["posicion"]))
+        # Solo se indexa una vez confirmado el commit
+        if transaccion is None:
+            self.indice.registrar(OrdenReposo.desde_dict(id_usuario, orden))
+            self.riesgo.confirmar(reserva, id_orden=orden["idOrden"])
+        else:
+            self.riesgo.confirmar(reserva, precio_ejecucion=transaccion["precioEjecucion"])
+
+    def colocar(self, usuario, instrumento, tipo, cantidad, precio_limite, procesar=procesar_orden):
+        """
+        Camino completo de una orden validada: reservar, `procesar` (por
+        defecto procesar_orden) y confirmar. Retorna (resultado, None) o
+        (None, motivo) si el control pre-trade la rechaza.
+        """
+        reserva, ejecutar, motivo = self.reservar(usuario, instrumento, tipo, cantidad, precio_limite)
+        if motivo is not None:
+            return None, motivo
+        try:
+            resultado = procesar(usuario, instrumento, tipo, cantidad, precio_limite, ejecutar)
+        except Exception:
+            self.descartar(reserva)
+            raise
+        self.confirmar(usuario, reserva, resultado)
+        return resultado, None
+
+
+colocacion = ColocacionOrdenes()
+
+
+# ============= PROCESOS DE CONSOLA (API DETENIDA) =============
+
+@contextmanager
+def estado_de_consola(dueno):
+    """
+    Para colocar órdenes fuera de la API (main.py: menú y --cargar). Toma el
+    bloqueo del journal (BloqueoOcupado si una API lo tiene) y carga lo mismo
+    que la API al iniciar: índice de órdenes (journal o MySQL), posiciones y
+    riesgo. Al salir escribe el snapshot del journal y libera el bloqueo.
+    """
+    bloqueo_instancia.tomar(dueno)
+    try:
+        if JOURNAL_DIR is None or indice_ordenes.usar_journal(Journal(JOURNAL_DIR)) is None:
+            with get_mysql_session() as session:
+                indice_ordenes.cargar_desde_db(session)
+        with get_mysql_session() as session:
+            libro_posiciones.cargar_desde_db(session)
+            control_riesgo.cargar_precios_referencia(session)
+        db = get_mongodb()
+        if db is not None:
+            control_riesgo.cargar_limites(db)
+        control_riesgo.cargar_desde_indice(indice_ordenes.ordenes())
+        yield
+    finally:
+        indice_ordenes.cerrar()
+        bloqueo_instancia.liberar()
@@ -1,9 +1,7 @@
 # operador.py
-from db_coneccion import get_mysql_session
 from auth import get_current_user
-from modelo_sql import Orden, Transaccion
-import random
-from datetime import datetime
+from motor_ordenes import validar_orden, colocacion, estado_de_consola
+from bloqueo_instancia import BloqueoOcupado
 
 def colocar_orden():
     user = get_current_user()
@@ -32,40 +30,26 @@ def colocar_orden():
         return
     
     precio_final = precio_limite if precio_limite > 0 else None
-    
-    # 1. Registrar la Órden en MySQL (Order Book)
-    nueva_orden = Orden(
-        idUsuario=user['idUsuario'],
-        tipo=tipo,
-        instrumento=instrumento,
-        cantidad=cantidad,
-        precioLimite=precio_final
-    )
-
-    with get_mysql_session() as session:
-        session.add(nueva_orden)
-        # El commit ocurre al salir del bloque 'with'
+    motivo = validar_orden(instrumento, tipo, cantidad)
+    if motivo is not None:
+        print(f" {motivo}.")
+        return
 
-        print(f"\n Órden registrada (ID: {nueva_orden.idOrden}). Estado: Pendiente.")
-        
-        # 2. SIMULACIÓN DE EJECUCIÓN
-        if random.random() < 0.7: 
-            precio_ejecucion = precio_final if precio_final else round(random.uniform(90.00, 100.00), 2)
-            
-            # Actualizar Orden y crear Transacción (Modelo NUAM)
-            nueva_orden.estado = 'Ejecutada'
-            
-            transaccion = Transaccion(
-                idOrdenCompra=nueva_orden.idOrden if tipo == 'Compra' else 'MATCH_ID_FICTICIO',
-                idOrdenVenta=nueva_orden.idOrden if tipo == 'Venta' else 'MATCH_ID_FICTICIO',
-                precioEjecucion=precio_ejecucion,
-                cantidadEjecutada=cantidad,
-                fechaEjecucion=datetime.utcnow(),
-                bolsaOrigen=user['perfilBolsa']
-            )
-            session.add(transaccion)
-            session.flush() # Forzar que se obtenga el ID antes de salir
+    # Mismo camino que /api/orden: control pre-trade, registro y ejecución
+    # simulada en MySQL, posiciones e índice de órdenes pendientes (y journal)
+    try:
+        with estado_de_consola("menú de consola (colocar orden)"):
+            resultado, motivo = colocacion.colocar(user, instrumento, tipo, cantidad, precio_final)
+    except BloqueoOcupado as e:
+        print(f" La API está en marcha con journal ({e}). Coloque la orden desde la API.")
+        return
 
-            print(f" [EJECUTADA] Transacción ID: {transaccion.idTransaccion} a {precio_ejecucion}.")
-        else:
-            print(" La órden permanece en el Order Book (Pendiente de match).")
\ No newline at end of file
+    if motivo is not None:
+        print(f" [RECHAZADA] {motivo}")
+        return
+    orden, transaccion = resultado["orden"], resultado["transaccion"]
+    print(f"\n Órden registrada (ID: {orden['idOrden']}).")
+    if transaccion is not None:
+        print(f" [EJECUTADA] Transacción ID: {transaccion['idTransaccion']} a {transaccion['precioEjecucion']}.")
+    else:
+        print(f" {resultado['mensaje']}.")
@@ -0,0 +1,343 @@
+# particiones.py
+"""
+Particionado por fecha de `transacciones` / `ordenes` y archivo de datos fríos.
+
+- MySQL: cada tabla se particiona por mes (RANGE COLUMNS sobre la fecha), con
+  una partición `p_futuro` que se reorganiza a medida que avanza el calendario.
+  Las consultas recientes solo tocan las particiones calientes.
+- Archivo: los meses anteriores a `MESES_CALIENTES` se exportan a Parquet
+  comprimido en `ARCHIVO_DIR/<tabla>/mes=YYYY-MM/` y se eliminan de MySQL.
+  `leer_archivo()` los consulta para que reportes y exportaciones vean la
+  historia completa.
+
+Uso:
+    python particiones.py --particionar
+    python particiones.py --archivar [--meses-calientes 3]
+"""
+import argparse
+import os
+import uuid
+from datetime import datetime
+
+from sqlalchemy import select, delete, func, text, Integer, Float, DateTime
+
+from db_coneccion import Engine_MYSQL, get_mysql_session
+from modelo_sql import Orden, Transaccion
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow es opcional: solo se necesita para archivar/leer historia
+    pa = pc = ds = pq = None
+
+ARCHIVO_DIR = os.getenv("NUAM_ARCHIVO_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "archivo"))
+MESES_CALIENTES = int(os.getenv("NUAM_MESES_CALIENTES", "3"))
+MESES_FUTUROS = 2
+LOTE_ARCHIVO = 50000
+
+# tabla -> (modelo, columna de fecha, columna id)
+TABLAS = {
+    "transacciones": (Transaccion, "fechaEjecucion", "idTransaccion"),
+    "ordenes": (Orden, "fechaCreacion", "idOrden"),
+}
+
+
+# ============= UTILIDADES DE MESES =============
+
+def inicio_mes(fecha):
+    return datetime(fecha.year, fecha.month, 1)
+
+def sumar_meses(fecha, meses):
+    indice = fecha.year * 12 + (fecha.month - 1) + meses
+    return datetime(indice // 12, indice % 12 + 1, 1)
+
+def nombre_particion(mes):
+    return f"p{mes.year:04d}{mes.month:02d}"
+
+def etiqueta_mes(mes):
+    return f"{mes.year:04d}-{mes.month:02d}"
+
+
+# ============= PARTICIONADO EN MYSQL =============
+
+def particiones_existentes(conn, tabla):
+    filas = conn.execute(text(
+        "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :tabla AND PARTITION_NAME IS NOT NULL"
+    ), {"tabla": tabla}).fetchall()
+    return {f[0] for f in filas}
+
+def _definicion_particion(mes):
+    limite = sumar_meses(mes, 1).strftime("%Y-%m-%d")
+    return f"PARTITION {nombre_particion(mes)} VALUES LESS THAN ('{limite}')"
+
+def particionar_tabla(tabla):
+    """Convierte la tabla en particionada por mes (operación única, MySQL)."""
+    _, col_fecha, col_id = TABLAS[tabla]
+    with Engine_MYSQL.begin() as conn:
+        if particiones_existentes(conn, tabla):
+            print(f"ℹ La tabla {tabla} ya está particionada.")
+            return False
+
+        minima = conn.execute(text(f"SELECT MIN({col_fecha}) FROM {tabla}")).scalar() or datetime.utcnow()
+        mes, ultimo = inicio_mes(minima), sumar_meses(inicio_mes(datetime.utcnow()), MESES_FUTUROS)
+        definiciones = []
+        while mes <= ultimo:
+            definiciones.append(_definicion_particion(mes))
+            mes = sumar_meses(mes, 1)
+        definiciones.append("PARTITION p_futuro VALUES LESS THAN (MAXVALUE)")
+
+        # MySQL exige que la clave de partición forme parte de la PRIMARY KEY.
+        conn.execute(text(
+            f"ALTER TABLE {tabla} "
+            f"MODIFY {col_fecha} DATETIME NOT NULL, "
+            f"DROP PRIMARY KEY, ADD PRIMARY KEY ({col_id}, {col_fecha}) "
+            f"PARTITION BY RANGE COLUMNS({col_fecha}) ({', '.join(definiciones)})"
+        ))
+    print(f"✅ Tabla {tabla} particionada ({len(definiciones)} particiones).")
+    return True
+
+def crear_particiones_futuras(tabla, meses=MESES_FUTUROS):
+    """Separa de `p_futuro` los meses próximos que aún no tienen partición."""
+    with Engine_MYSQL.begin() as conn:
+        existentes = particiones_existentes(conn, tabla)
+        if not existentes:
+            return 0
+        nuevas = []
+        mes = inicio_mes(datetime.utcnow())
+        for _ in range(meses + 1):
+            if nombre_particion(mes) not in existentes:
+                nuevas.append(_definicion_particion(mes))
+            mes = sumar_meses(mes, 1)
+        if nuevas:
+            conn.execute(text(
+                f"ALTER TABLE {tabla} REORGANIZE PARTITION p_futuro INTO "
+                f"({', '.join(nuevas)}, PARTITION p_futuro VALUES LESS THAN (MAXVALUE))"
+            ))
+    return len(nuevas)
+
+
+# ============= ARCHIVO EN PARQUET =============
+
+def _requiere_pyarrow():
+    if pa is None:
+        raise RuntimeError("El archivo histórico requiere pyarrow: pip install pyarrow")
+
+def esquema_archivo(tabla):
+    """Esquema Arrow derivado de las columnas del modelo SQLAlchemy."""
+    _requiere_pyarrow()
+    modelo = TABLAS[tabla][0]
+    campos = []
+    for col in modelo.__table__.columns:
+        if isinstance(col.type, Integer):
+            tipo = pa.int64()
+        elif isinstance(col.type, Float):
+            tipo = pa.float64()
+        elif isinstance(col.type, DateTime):
+            tipo = pa.timestamp("us")
+        else:
+            tipo = pa.string()
+        campos.append(pa.field(col.name, tipo))
+    return pa.schema(campos)
+
+def meses_archivados(tabla):
+    """Meses ('YYYY-MM') con datos en el archivo, ordenados."""
+    carpeta = os.path.join(ARCHIVO_DIR, tabla)
+    if not os.path.isdir(carpeta):
+        return []
+    return sorted(n[len("mes="):] for n in os.listdir(carpeta) if n.startswith("mes="))
+
+def _archivar_mes(tabla, mes):
+    modelo, col_fecha, col_id = TABLAS[tabla]
+    tabla_sql = modelo.__table__
+    columna = tabla_sql.c[col_fecha]
+    rango = (columna >= mes, columna < sumar_meses(mes, 1))
+    if tabla == "ordenes":
+        # Las órdenes pendientes siguen vivas en el Order Book: no se archivan.
+        rango += (tabla_sql.c.estado != 'Pendiente',)
+
+    esquema = esquema_archivo(tabla)
+    carpeta = os.path.join(ARCHIVO_DIR, tabla, f"mes={etiqueta_mes(mes)}")
+    os.makedirs(carpeta, exist_ok=True)
+    nombre = f"{uuid.uuid4().hex}.parquet"
+    destino = os.path.join(carpeta, nombre)
+    temporal = os.path.join(carpeta, f"_{nombre}.tmp")  # el prefijo "_" lo oculta a leer_archivo()
+
+    total = 0
+    ids = []
+    try:
+        with get_mysql_session() as session:
+            resultado = session.execute(
+                select(tabla_sql).where(*rango).execution_options(stream_results=True, yield_per=LOTE_ARCHIVO)
+            )
+            with pq.ParquetWriter(temporal, esquema, compression="zstd") as writer:
+                for lote in resultado.mappings().partitions():
+                    writer.write_table(pa.Table.from_pylist([dict(f) for f in lote], schema=esquema))
+                    ids.extend(f[col_id] for f in lote)
+                    total += len(lote)
+
+            if total == 0:
+                return 0
+            if pq.ParquetFile(temporal).metadata.num_rows != total:
+                raise RuntimeError(f"Verificación fallida al archivar {tabla} {etiqueta_mes(mes)}")
+            os.replace(temporal, destino)
+
+            # Se borran exactamente las filas escritas, en la misma transacción.
+            columna_id = tabla_sql.c[col_id]
+            for i in range(0, len(ids), LOTE_ARCHIVO):
+                session.execute(delete(tabla_sql).where(columna_id.in_(ids[i:i + LOTE_ARCHIVO])))
+    except Exception:
+        # Sin commit no debe quedar archivo: las filas siguen en MySQL.
+        if os.path.exists(destino):
+            os.remove(destino)
+        raise
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        if not os.listdir(carpeta):
+            os.rmdir(carpeta)
+    return total
+
+def _eliminar_particion_vacia(tabla, mes):
+    _, col_fecha, _ = TABLAS[tabla]
+    nombre = nombre_particion(mes)
+    with Engine_MYSQL.begin() as conn:
+        if nombre not in particiones_existentes(conn, tabla):
+            return
+        restantes = conn.execute(text(f"SELECT COUNT(*) FROM {tabla} PARTITION ({nombre})")).scalar()
+        if restantes == 0:
+            conn.execute(text(f"ALTER TABLE {tabla} DROP PARTITION {nombre}"))
+
+def archivar_datos_frios(meses_calientes=MESES_CALIENTES):
+    """Mueve a Parquet los meses anteriores a la ventana caliente."""
+    _requiere_pyarrow()
+    corte = sumar_meses(inicio_mes(datetime.utcnow()), -meses_calientes)
+    resumen = {}
+    for tabla, (modelo, col_fecha, _) in TABLAS.items():
+        with Engine_MYSQL.connect() as conn:
+            minima = conn.execute(select(func.min(modelo.__table__.c[col_fecha]))).scalar()
+        resumen[tabla] = 0
+        if minima is None:
+            continue
+        mes = inicio_mes(minima)
+        while mes < corte:
+            archivadas = _archivar_mes(tabla, mes)
+            if Engine_MYSQL.dialect.name == "mysql":
+                _eliminar_particion_vacia(tabla, mes)
+            if archivadas:
+                print(f"  {tabla} {etiqueta_mes(mes)}: {archivadas} filas archivadas")
+            resumen[tabla] += archivadas
+            mes = sumar_meses(mes, 1)
+    return resumen
+
+def _condicion(columna, valor):
+    """Expresión de filtro: igualdad, o (operador, valor) con '>=', '<=' o ('no_nulo', None)."""
+    if not isinstance(valor, tuple):
+        return ds.field(columna) == valor
+    operador, operando = valor
+    if operador == ">=":
+        return ds.field(columna) >= operando
+    if operador == "<=":
+        return ds.field(columna) <= operando
+    if operador == "no_nulo":
+        return ds.field(columna).is_valid()
+    raise ValueError(f"Operador de filtro no soportado: {operador}")
+
+def _tablas_por_mes(tabla, desde=None, hasta=None, filtros=None, ascendente=False, columnas=None):
+    """Tablas Arrow (una por mes archivado, no vacías) con las filas que cumplen los filtros."""
+    _, col_fecha, _ = TABLAS[tabla]
+    esquema = esquema_archivo(tabla)
+
+    condiciones = []
+    if desde is not None:
+        condiciones.append(ds.field(col_fecha) >= pa.scalar(desde, pa.timestamp("us")))
+    if hasta is not None:
+        condiciones.append(ds.field(col_fecha) < pa.scalar(hasta, pa.timestamp("us")))
+    for columna, valor in (filtros or {}).items():
+        condiciones.append(_condicion(columna, valor))
+    expresion = None
+    for condicion in condiciones:
+        expresion = condicion if expresion is None else expresion & condicion
+
+    meses = meses_archivados(tabla)
+    for mes in (meses if ascendente else reversed(meses)):
+        if desde is not None and mes < etiqueta_mes(desde):
+            continue
+        if hasta is not None and mes > etiqueta_mes(hasta):
+            continue
+        dataset = ds.dataset(os.path.join(ARCHIVO_DIR, tabla, f"mes={mes}"), schema=esquema, format="parquet")
+        tabla_arrow = dataset.to_table(columns=columnas, filter=expresion)
+        if tabla_arrow.num_rows:
+            yield tabla_arrow
+
+def iterar_archivo(tabla, desde=None, hasta=None, filtros=None, ascendente=False):
+    """
+    Genera, mes a mes y del más reciente al más antiguo, las filas archivadas
+    (lista de dicts ordenada por fecha descendente). Con `ascendente=True`
+    recorre en orden cronológico. `filtros` es un dict columna -> valor de
+    igualdad, o columna -> (operador, valor) con '>=', '<=' o 'no_nulo'.
+    """
+    if pa is None:
+        return
+    col_fecha = TABLAS[tabla][1]
+    orden = "ascending" if ascendente else "descending"
+    for tabla_arrow in _tablas_por_mes(tabla, desde, hasta, filtros, ascendente):
+        yield tabla_arrow.sort_by([(col_fecha, orden)]).to_pylist()
+
+def agregar_archivo(tabla, agrupar, desde=None, hasta=None, filtros=None):
+    """
+    Agregado de las transacciones archivadas por las columnas `agrupar`:
+    lista de dicts con esas columnas más `transacciones`, `volumen` y `monto`.
+    `agrupar` admite además "dia" (fecha de ejecución, 'YYYY-MM-DD').
+    """
+    if pa is None:
+        return []
+    col_fecha = TABLAS[tabla][1]
+    columnas = [c for c in agrupar if c != "dia"] + ["cantidadEjecutada", "precioEjecucion"]
+    if "dia" in agrupar:
+        columnas.append(col_fecha)
+    tablas = list(_tablas_por_mes(tabla, desde, hasta, filtros, columnas=columnas))
+    if not tablas:
+        return []
+    datos = pa.concat_tables(tablas)
+    if "dia" in agrupar:
+        datos = datos.append_column("dia", pc.strftime(datos[col_fecha], format="%Y-%m-%d"))
+    datos = datos.append_column("monto", pc.multiply(pc.cast(datos["cantidadEjecutada"], pa.float64()),
+                                                     datos["precioEjecucion"]))
+    resultado = datos.group_by(list(agrupar)).aggregate([
+        ("cantidadEjecutada", "count"), ("cantidadEjecutada", "sum"), ("monto", "sum")
+    ])
+    return [
+        dict({c: f[c] for c in agrupar}, transacciones=f["cantidadEjecutada_count"],
+             volumen=f["cantidadEjecutada_sum"], monto=f["monto_sum"])
+        for f in resultado.to_pylist()
+    ]
+
+def leer_archivo(tabla, desde=None, hasta=None, filtros=None, limite=None):
+    """Filas archivadas más recientes (hasta `limite`), ordenadas por fecha descendente."""
+    filas = []
+    for lote in iterar_archivo(tabla, desde, hasta, filtros):
+        filas.extend(lote)
+        if limite is not None and len(filas) >= limite:
+            return filas[:limite]
+    return filas
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Particionado y archivo histórico NUAM")
+    parser.add_argument("--particionar", action="store_true", help="Particiona las tablas por mes (una vez)")
+    parser.add_argument("--archivar", action="store_true", help="Archiva los meses fríos en Parquet")
+    parser.add_argument("--meses-calientes", type=int, default=MESES_CALIENTES)
+    args = parser.parse_args()
+
+    if args.particionar:
+        for nombre in TABLAS:
+            particionar_tabla(nombre)
+    if args.archivar:
+        for nombre in TABLAS:
+            if Engine_MYSQL.dialect.name == "mysql":
+                crear_particiones_futuras(nombre)
+        print(archivar_datos_frios(args.meses_calientes))
+    if not (args.particionar or args.archivar):
+        parser.print_help()
@@ -0,0 +1,268 @@
+# posiciones.py
+"""
+Posición neta y costo promedio por usuario e instrumento.
+
+Se actualiza en cada ejecución dentro de la misma transacción que crea la
+Transaccion (tabla `posiciones`) y se mantiene en memoria para que
+/api/posiciones responda sin consultar MySQL.
+
+Escriben posiciones la API, los procesos shard, el calce de subastas y la
+carga por lotes: cada ejecución parte de la fila bloqueada en MySQL
+(SELECT ... FOR UPDATE) y le aplica el delta; el mapa en memoria es solo una
+copia de lectura y nunca la base de una escritura.
+
+Reconstrucción desde el historial (ordenes + transacciones, incluido el
+archivo Parquet):
+    python posiciones.py --reconstruir
+"""
+import argparse
+import threading
+from datetime import datetime
+
+from sqlalchemy import select, delete, union_all, literal, func
+from sqlalchemy.exc import IntegrityError
+
+from modelo_sql import Orden, Transaccion, Posicion, Bloqueo
+from migraciones import id_orden_numerico
+
+
+class EstadoPosicion:
+    __slots__ = ("cantidadNeta", "costoPromedio", "pnlRealizado", "fechaActualizacion")
+
+    def __init__(self, cantidadNeta=0, costoPromedio=0.0, pnlRealizado=0.0, fechaActualizacion=None):
+        self.cantidadNeta = cantidadNeta
+        self.costoPromedio = costoPromedio
+        self.pnlRealizado = pnlRealizado
+        self.fechaActualizacion = fechaActualizacion
+
+    def aplicar(self, tipo, cantidad, precio, fecha=None):
+        """
+        Retorna el nuevo estado tras una ejecución. Aumentar la posición
+        promedia el costo; reducirla realiza P&L al costo promedio; cruzar
+        por cero abre la nueva posición al precio de ejecución.
+        """
+        actual = self.cantidadNeta
+        delta = cantidad if tipo == 'Compra' else -cantidad
+        nueva = actual + delta
+        costo, pnl = self.costoPromedio, self.pnlRealizado
+
+        if actual == 0 or (actual > 0) == (delta > 0):
+            costo = (abs(actual) * costo + cantidad * precio) / abs(nueva)
+        else:
+            cerrada = min(abs(actual), cantidad)
+            pnl += cerrada * (precio - costo) * (1 if actual > 0 else -1)
+            if nueva == 0:
+                costo = 0.0
+            elif (nueva > 0) != (actual > 0):
+                costo = precio
+        return EstadoPosicion(nueva, costo, pnl, fecha or datetime.utcnow())
+
+    def to_dict(self):
+        return {
+            "cantidadNeta": self.cantidadNeta,
+            "costoPromedio": float(self.costoPromedio),
+            "pnlRealizado": float(self.pnlRealizado),
+            "fechaActualizacion": self.fechaActualizacion.isoformat() if self.fechaActualizacion else None
+        }
+
+    @classmethod
+    def desde_dict(cls, datos):
+        fecha = datos.get("fechaActualizacion")
+        return cls(datos["cantidadNeta"], datos["costoPromedio"], datos["pnlRealizado"],
+                   datetime.fromisoformat(fecha) if fecha else None)
+
+
+class LibroPosiciones:
+    """Mapa en memoria idUsuario -> {instrumento -> EstadoPosicion}."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._posiciones = {}
+
+    def obtener(self, id_usuario, instrumento):
+        return self._posiciones.get(id_usuario, {}).get(instrumento)
+
+    def de_usuario(self, id_usuario):
+        """Posiciones del usuario (lectura O(1) sobre el mapa)."""
+        return dict(self._posiciones.get(id_usuario, {}))
+
+    def fijar(self, id_usuario, instrumento, estado):
+        with self._lock:
+            self._posiciones.setdefault(id_usuario, {})[instrumento] = estado
+
+    def cargar_desde_db(self, session):
+        filas = session.query(Posicion).all()
+        with self._lock:
+            self._posiciones.clear()
+            for p in filas:
+                self._posiciones.setdefault(p.idUsuario, {})[p.instrumento] = EstadoPosicion(
+                    p.cantidadNeta, p.costoPromedio, p.pnlRealizado, p.fechaActualizacion
+                )
+        return len(filas)
+
+
+libro_posiciones = LibroPosiciones()
+
+
+BLOQUEO_POSICIONES = "posiciones"
+
+
+def bloquear_tabla_posiciones(session, exclusivo=False):
+    """
+    Candado de `posiciones` en la transacción en curso: compartido para quien
+    modifica filas sueltas (las ejecuciones de todos los procesos conviven) y
+    exclusivo para reconstruir_posiciones(), que así no pierde ejecuciones que
+    se confirmen mientras reescribe la tabla.
+    """
+    fila = session.get(Bloqueo, BLOQUEO_POSICIONES, with_for_update={"read": not exclusivo})
+    if fila is not None:
+        return
+    try:
+        with session.begin_nested():
+            session.add(Bloqueo(nombre=BLOQUEO_POSICIONES))
+    except IntegrityError:
+        pass  # la creó otra transacción
+    session.get(Bloqueo, BLOQUEO_POSICIONES, with_for_update={"read": not exclusivo}, populate_existing=True)
+
+def _fila_bloqueada(session, id_usuario, instrumento):
+    """Fila de la posición con SELECT ... FOR UPDATE; si no existe se crea en cero (ya bloqueada)."""
+    clave = (id_usuario, instrumento)
+    fila = session.get(Posicion, clave, with_for_update=True, populate_existing=True)
+    if fila is not None:
+        return fila
+    try:
+        with session.begin_nested():
+            session.add(Posicion(idUsuario=id_usuario, instrumento=instrumento,
+                                 cantidadNeta=0, costoPromedio=0.0, pnlRealizado=0.0))
+    except IntegrityError:
+        pass  # otra transacción la creó primero: se espera su bloqueo
+    return session.get(Posicion, clave, with_for_update=True, populate_existing=True)
+
+def bloquear_posiciones(session, claves):
+    """
+    Bloquea en la transacción en curso las posiciones {(idUsuario, instrumento)}
+    que se van a modificar, en orden de clave para que dos escritores no se
+    bloqueen cruzados. Retorna {clave: EstadoPosicion} con el estado de MySQL.
+    """
+    estados = {}
+    if claves:
+        bloquear_tabla_posiciones(session)
+    for clave in sorted(claves):
+        fila = _fila_bloqueada(session, *clave)
+        estados[clave] = EstadoPosicion(fila.cantidadNeta, fila.costoPromedio,
+                                        fila.pnlRealizado, fila.fechaActualizacion)
+    return estados
+
+def aplicar_ejecucion(session, id_usuario, instrumento, tipo, cantidad, precio, actual=None):
+    """
+    Calcula la nueva posición tras una ejecución. `actual` es el estado del
+    que se parte: el de bloquear_posiciones() o uno aún no confirmado (varias
+    ejecuciones de la misma posición en una transacción); si no se indica, se
+    lee la fila bloqueada de MySQL.
+    La escritura la hace guardar_posiciones() y el mapa en memoria se
+    actualiza con libro_posiciones.fijar() una vez confirmada la transacción.
+    """
+    if actual is None:
+        actual = bloquear_posiciones(session, [(id_usuario, instrumento)])[(id_usuario, instrumento)]
+    return actual.aplicar(tipo, cantidad, precio)
+
+def guardar_posiciones(session, estados):
+    """Escribe el estado final de cada posición {(idUsuario, instrumento): estado} sobre su fila bloqueada."""
+    for (id_usuario, instrumento), estado in estados.items():
+        fila = session.get(Posicion, (id_usuario, instrumento))
+        if fila is None:
+            fila = _fila_bloqueada(session, id_usuario, instrumento)
+        fila.cantidadNeta = estado.cantidadNeta
+        fila.costoPromedio = estado.costoPromedio
+        fila.pnlRealizado = estado.pnlRealizado
+        fila.fechaActualizacion = estado.fechaActualizacion
+
+
+# ============= RECONSTRUCCIÓN DESDE EL HISTORIAL =============
+
+def _refs(t):
+    """(idOrdenCompra, idOrdenVenta) enteros de una transacción archivada."""
+    compra, venta = t.get("idOrdenCompraRef"), t.get("idOrdenVentaRef")
+    if compra is None and venta is None:
+        compra, venta = id_orden_numerico(t["idOrdenCompra"]), id_orden_numerico(t["idOrdenVenta"])
+    return compra, venta
+
+def _lado(columna_ref, tipo):
+    """Ejecuciones de un lado de la transacción unidas a su orden por la PK."""
+    return (
+        select(Orden.idUsuario, func.coalesce(Transaccion.instrumento, Orden.instrumento).label("instrumento"),
+               literal(tipo).label("tipo"), Transaccion.cantidadEjecutada, Transaccion.precioEjecucion,
+               Transaccion.fechaEjecucion, Transaccion.idTransaccion)
+        .join(Orden, Orden.idOrden == columna_ref)
+    )
+
+def reconstruir_posiciones():
+    """
+    Recalcula `posiciones` recorriendo todas las ejecuciones en orden
+    cronológico. La historia caliente se lee y la tabla se reescribe con el
+    candado exclusivo de posiciones: las ejecuciones de cualquier proceso
+    esperan a que termine (y luego aplican su cambio sobre la fila
+    reconstruida) en vez de perderse con el DELETE.
+    """
+    from db_coneccion import get_mysql_session
+    from particiones import iterar_archivo
+
+    estados = {}
+
+    def aplicar(id_usuario, instrumento, tipo, cantidad, precio, fecha):
+        clave = (id_usuario, instrumento)
+        estados[clave] = estados.get(clave, EstadoPosicion()).aplicar(tipo, cantidad, precio, fecha)
+
+    # 1. Historia archivada (más antigua que cualquier fila en MySQL)
+    ordenes_archivadas = {}
+    for lote in iterar_archivo("ordenes", ascendente=True):
+        for o in lote:
+            ordenes_archivadas[o["idOrden"]] = (o["idUsuario"], o["tipo"], o["instrumento"])
+    for lote in iterar_archivo("transacciones", ascendente=True):
+        faltantes = {i for t in lote for i in _refs(t) if i is not None and i not in ordenes_archivadas}
+        if faltantes:
+            with get_mysql_session() as session:
+                for o in session.execute(select(Orden.idOrden, Orden.idUsuario, Orden.tipo, Orden.instrumento)
+                                         .where(Orden.idOrden.in_(faltantes))):
+                    ordenes_archivadas[o.idOrden] = (o.idUsuario, o.tipo, o.instrumento)
+        for t in lote:
+            for id_orden in _refs(t):
+                info = ordenes_archivadas.get(id_orden)
+                if info is not None:
+                    aplicar(info[0], info[2], info[1], t["cantidadEjecutada"], t["precioEjecucion"], t["fechaEjecucion"])
+    ordenes_archivadas.clear()
+
+    # 2. Historia caliente: cada lado real de la transacción une con su orden
+    #    por las referencias tipadas (requiere migraciones.py en tablas antiguas)
+    with get_mysql_session() as session:
+        # Antes de la primera lectura: la instantánea incluye todo lo confirmado hasta aquí
+        bloquear_tabla_posiciones(session, exclusivo=True)
+        lados = union_all(_lado(Transaccion.idOrdenCompraRef, 'Compra'),
+                          _lado(Transaccion.idOrdenVentaRef, 'Venta')).subquery()
+        consulta = (
+            select(lados)
+            .order_by(lados.c.fechaEjecucion, lados.c.idTransaccion)
+            .execution_options(stream_results=True, yield_per=10000)
+        )
+        for fila in session.execute(consulta):
+            aplicar(fila.idUsuario, fila.instrumento, fila.tipo,
+                    fila.cantidadEjecutada, fila.precioEjecucion, fila.fechaEjecucion)
+
+        session.execute(delete(Posicion))
+        session.bulk_insert_mappings(Posicion, [
+            {"idUsuario": u, "instrumento": i, "cantidadNeta": e.cantidadNeta, "costoPromedio": e.costoPromedio,
+             "pnlRealizado": e.pnlRealizado, "fechaActualizacion": e.fechaActualizacion}
+            for (u, i), e in estados.items()
+        ])
+    print(f"✅ Posiciones reconstruidas: {len(estados)} (usuario, instrumento).")
+    return len(estados)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Posiciones por usuario e instrumento")
+    parser.add_argument("--reconstruir", action="store_true", help="Recalcula la tabla desde el historial")
+    args = parser.parse_args()
+    if args.reconstruir:
+        reconstruir_posiciones()
+    else:
+        parser.print_help()
@@ -0,0 +1,222 @@
+# riesgo.py
+"""
+Controles pre-trade en memoria.
+
+Límites (resueltos por usuario -> bolsa -> global):
+- max_notional_orden: cantidad * precio de la orden.
+- max_posicion_instrumento: |posición neta + órdenes abiertas del mismo lado + orden|.
+- max_ordenes_abiertas: órdenes pendientes simultáneas del usuario.
+
+Las exposiciones (órdenes abiertas por usuario, cantidad pendiente por
+usuario/instrumento/lado) se mantienen en memoria y se actualizan al
+colocar, ejecutar, modificar y cancelar, así cada verificación es un par de
+búsquedas en diccionarios, sin consultar la base de datos.
+
+Las órdenes a mercado se valoran al precio de referencia del instrumento
+(última ejecución, precargada desde MySQL al iniciar); sin referencia se
+rechazan, ya que no hay con qué verificar el notional.
+"""
+import itertools
+import os
+import threading
+
+from sqlalchemy import select, func
+
+from modelo_sql import Transaccion
+from posiciones import libro_posiciones
+
+COLECCION_LIMITES = "limites_riesgo"
+CAMPOS_LIMITE = ("max_notional_orden", "max_posicion_instrumento", "max_ordenes_abiertas")
+
+LIMITES_POR_DEFECTO = {
+    "max_notional_orden": float(os.getenv("NUAM_RIESGO_MAX_NOTIONAL", "5000000")),
+    "max_posicion_instrumento": int(os.getenv("NUAM_RIESGO_MAX_POSICION", "10000000")),
+    "max_ordenes_abiertas": int(os.getenv("NUAM_RIESGO_MAX_ORDENES_ABIERTAS", "10000")),
+}
+
+
+class ControlRiesgo:
+
+    def __init__(self, limites=None):
+        self._lock = threading.Lock()
+        self._limites = {"global": dict(limites or LIMITES_POR_DEFECTO), "bolsa": {}, "usuario": {}}
+        self._cache_limites = {}      # (idUsuario, bolsa) -> (notional, posicion, abiertas)
+        self._abiertas = {}           # idUsuario -> cantidad de órdenes abiertas (incluye reservas)
+        self._pendiente = {}          # (idUsuario, instrumento, tipo) -> cantidad en órdenes abiertas
+        self._ordenes = {}            # idOrden/reserva -> (idUsuario, instrumento, tipo, cantidad)
+        self._reservas = itertools.count(1)
+        self.precio_referencia = {}   # instrumento -> último precio de ejecución
+        self.rechazos = 0
+
+    # ---------- Límites ----------
+
+    def _limites_de(self, id_usuario, bolsa):
+        clave = (id_usuario, bolsa)
+        limites = self._cache_limites.get(clave)
+        if limites is None:
+            resueltos = dict(self._limites["global"])
+            resueltos.update(self._limites["bolsa"].get(bolsa, {}))
+            resueltos.update(self._limites["usuario"].get(id_usuario, {}))
+            limites = tuple(resueltos[c] for c in CAMPOS_LIMITE)
+            self._cache_limites[clave] = limites
+        return limites
+
+    def fijar_limites(self, ambito, clave, **valores):
+        """Actualiza límites de un ámbito ('global', 'bolsa' o 'usuario')."""
+        valores = {c: v for c, v in valores.items() if c in CAMPOS_LIMITE and v is not None}
+        with self._lock:
+            destino = self._limites["global"] if ambito == "global" else \
+                self._limites[ambito].setdefault(clave, {})
+            destino.update(valores)
+            self._cache_limites.clear()
+
+    def limites(self):
+        return {
+            "global": dict(self._limites["global"]),
+            "bolsa": {k: dict(v) for k, v in self._limites["bolsa"].items()},
+            "usuario": {k: dict(v) for k, v in self._limites["usuario"].items()},
+        }
+
+    def cargar_limites(self, db):
+        """Carga los límites persistidos en MongoDB."""
+        for doc in db[COLECCION_LIMITES].find({}, {"_id": 0}):
+            self.fijar_limites(doc["ambito"], doc.get("clave"), **{c: doc.get(c) for c in CAMPOS_LIMITE})
+
+    # ---------- Verificación ----------
+
+    def _verificar(self, id_usuario, bolsa, instrumento, tipo, cantidad, precio, cantidad_previa=0, nueva=True):
+        max_notional, max_posicion, max_abiertas = self._limites_de(id_usuario, bolsa)
+
+        precio = precio or self.precio_referencia.get(instrumento)
+        if precio is None:
+            return f"Orden a mercado rechazada: {instrumento} no tiene precio de referencia (indique un precio límite)"
+        if cantidad * precio > max_notional:
+            return f"Orden rechazada por riesgo: notional {cantidad * precio:,.2f} supera el máximo {max_notional:,.2f}"
+
+        if nueva and self._abiertas.get(id_usuario, 0) >= max_abiertas:
+            return f"Orden rechazada por riesgo: máximo de {max_abiertas} órdenes abiertas alcanzado"
+
+        estado = libro_posiciones.obtener(id_usuario, instrumento)
+        posicion = estado.cantidadNeta if estado is not None else 0
+        pendiente = self._pendiente.get((id_usuario, instrumento, tipo), 0) - cantidad_previa + cantidad
+        proyectada = posicion + pendiente if tipo == 'Compra' else posicion - pendiente
+        if abs(proyectada) > max_posicion:
+            return f"Orden rechazada por riesgo: posición proyectada {proyectada} en {instrumento} supera el máximo {max_posicion}"
+        return None
+
+    def reservar(self, id_usuario, bolsa, instrumento, tipo, cantidad, precio):
+        """
+        Verifica la orden y, si pasa, reserva su exposición hasta conocer el
+        resultado. Retorna (reserva, None) o (None, motivo_de_rechazo).
+        """
+        with self._lock:
+            motivo = self._verificar(id_usuario, bolsa, instrumento, tipo, cantidad, precio)
+            if motivo is not None:
+                self.rechazos += 1
+                return None, motivo
+            reserva = ("reserva", next(self._reservas))
+            self._abrir(reserva, id_usuario, instrumento, tipo, cantidad)
+            return reserva, None
+
+    def verificar_modificacion(self, id_orden, id_usuario, bolsa, cantidad, precio):
+        """Verifica una modificación de una orden abierta. Retorna el motivo de rechazo o None."""
+        with self._lock:
+            datos = self._ordenes.get(id_orden)
+            if datos is None:
+                return None
+            _, instrumento, tipo, cantidad_previa = datos
+            motivo = self._verificar(id_usuario, bolsa, instrumento, tipo, cantidad, precio,
+                                     cantidad_previa=cantidad_previa, nueva=False)
+            if motivo is not None:
+                self.rechazos += 1
+            return motivo
+
+    # ---------- Exposiciones ----------
+
+    def _abrir(self, clave, id_usuario, instrumento, tipo, cantidad):
+        self._ordenes[clave] = (id_usuario, instrumento, tipo, cantidad)
+        self._abiertas[id_usuario] = self._abiertas.get(id_usuario, 0) + 1
+        llave = (id_usuario, instrumento, tipo)
+        self._pendiente[llave] = self._pendiente.get(llave, 0) + cantidad
+
+    def _cerrar(self, clave):
+        datos = self._ordenes.pop(clave, None)
+        if datos is None:
+            return
+        id_usuario, instrumento, tipo, cantidad = datos
+        self._abiertas[id_usuario] -= 1
+        llave = (id_usuario, instrumento, tipo)
+        self._pendiente[llave] -= cantidad
+
+    def confirmar(self, reserva, id_orden=None, precio_ejecucion=None):
+        """
+        Resuelve una reserva: si la orden quedó pendiente (`id_orden`) pasa a
+        ser una orden abierta; si se ejecutó, su exposición ya está en la posición.
+        """
+        with self._lock:
+            datos = self._ordenes.get(reserva)
+            self._cerrar(reserva)
+            if id_orden is not None and datos is not None:
+                self._abrir(id_orden, *datos)
+            if precio_ejecucion is not None and datos is not None:
+                self.precio_referencia[datos[1]] = precio_ejecucion
+
+    def orden_abierta(self, id_orden, id_usuario, instrumento, tipo, cantidad):
+        with self._lock:
+            self._abrir(id_orden, id_usuario, instrumento, tipo, cantidad)
+
+    def orden_cerrada(self, id_orden):
+        """Cancelación o ejecución total de una orden abierta (o descarte de una reserva)."""
+        with self._lock:
+            self._cerrar(id_orden)
+
+    def orden_modificada(self, id_orden, cantidad):
+        """Nueva cantidad abierta tras una modificación o una ejecución parcial."""
+        with self._lock:
+            datos = self._ordenes.get(id_orden)
+            if datos is None:
+                return
+            self._cerrar(id_orden)
+            self._abrir(id_orden, datos[0], datos[1], datos[2], cantidad)
+
+    def cargar_desde_indice(self, ordenes):
+        """
+        Reconstruye las exposiciones a partir de las órdenes en reposo,
+        conservando las reservas de órdenes aún en proceso.
+        """
+        with self._lock:
+            reservas = {c: d for c, d in self._ordenes.items() if isinstance(c, tuple)}
+            self._abiertas.clear()
+            self._pendiente.clear()
+            self._ordenes.clear()
+            for clave, datos in reservas.items():
+                self._abrir(clave, *datos)
+            for o in ordenes:
+                self._abrir(o.idOrden, o.idUsuario, o.instrumento, o.tipo, o.cantidad)
+
+    def cargar_precios_referencia(self, session):
+        """Precio de la última transacción de cada instrumento (sin pisar precios ya conocidos)."""
+        ultimas = (
+            select(func.max(Transaccion.idTransaccion).label("idTransaccion"))
+            .where(Transaccion.instrumento.is_not(None))
+            .group_by(Transaccion.instrumento)
+            .subquery()
+        )
+        filas = session.execute(
+            select(Transaccion.instrumento, Transaccion.precioEjecucion)
+            .join(ultimas, Transaccion.idTransaccion == ultimas.c.idTransaccion)
+        ).all()
+        with self._lock:
+            for instrumento, precio in filas:
+                self.precio_referencia.setdefault(instrumento, precio)
+        return len(filas)
+
+    def metricas(self):
+        return {
+            "ordenes_abiertas": len(self._ordenes),
+            "rechazos": self.rechazos,
+            "instrumentos_con_precio": len(self.precio_referencia),
+        }
+
+
+control_riesgo = ControlRiesgo()
@@ -2,6 +2,8 @@
 import bcrypt
 from db_coneccion import get_mongodb, create_all_mysql_tables
 from modelo_sql import Base
+from auditoria import crear_indices_auditoria
+from migraciones import migrar_todo
 
 def crear_usuarios_mongo():
     db = get_mongodb()
@@ -30,10 +32,14 @@ def crear_usuarios_mongo():
     else:
         print("ℹ Los usuarios ya existen en MongoDB.")
 
+    crear_indices_auditoria(db)
+    print("✅ Índices de auditoría creados/verificados.")
+
 def inicializar_todo():
     print("\n--- INICIALIZACIÓN DE BASES DE DATOS NUAM EXCHANGE ---")
     crear_usuarios_mongo()
     create_all_mysql_tables(Base)
+    migrar_todo()
 
 if __name__ == "__main__":
     inicializar_todo()
\ No newline at end of file
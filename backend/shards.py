@@ -0,0 +1,252 @@
+# shards.py
+"""
+Procesamiento de órdenes particionado por instrumento en procesos locales.
+
+Cada instrumento pertenece a un único shard (crc32(instrumento) % N). Cada
+shard es un proceso que procesa sus órdenes de forma secuencial, por lo que
+el orden de llegada por instrumento se respeta estrictamente, mientras que
+instrumentos distintos avanzan en paralelo en núcleos distintos.
+
+La API envía las solicitudes por un Pipe (una conexión por shard) y un hilo
+receptor por shard resuelve los Future pendientes con las respuestas.
+
+Lo que se reparte es la escritura en MySQL (procesar_orden): el índice de
+órdenes, el control de riesgo y el espejo de posiciones siguen en el proceso
+de la API, que es el único enrutador. Con shards debe haber un solo proceso
+de API por base (uvicorn sin --workers): si dos tuvieran su propio grupo, el
+mismo instrumento se procesaría en dos shards a la vez. Al iniciar, el grupo
+toma un bloqueo de enrutador (GET_LOCK en MySQL, visible desde cualquier
+equipo; un archivo de bloqueo en otras bases) y un segundo proceso con
+NUAM_SHARDS > 0 no inicia.
+"""
+import hashlib
+import itertools
+import multiprocessing
+import os
+import tempfile
+import threading
+import zlib
+from concurrent.futures import Future
+
+NUM_SHARDS = int(os.getenv("NUAM_SHARDS", "0"))  # 0 = procesar en el mismo proceso de la API
+NOMBRE_BLOQUEO_ENRUTADOR = "nuam_enrutador_shards"
+VERIFICAR_BLOQUEO_CADA = 60  # segundos entre verificaciones de que la conexión del GET_LOCK sigue viva
+
+
+def shard_de(instrumento, num_shards):
+    """Shard dueño del instrumento (hash estable entre procesos y reinicios)."""
+    return zlib.crc32(instrumento.encode()) % num_shards
+
+
+def _trabajador(numero, conexion):
+    """Bucle del proceso shard: procesa solicitudes en orden de llegada."""
+    from db_coneccion import Engine_MYSQL
+    from motor_ordenes import procesar_orden
+
+    Engine_MYSQL.dispose(close=False)  # no reutilizar conexiones heredadas del padre
+    while True:
+        try:
+            mensaje = conexion.recv()
+        except EOFError:
+            break
+        if mensaje is None:
+            break
+        id_solicitud, argumentos = mensaje
+        try:
+            respuesta = (id_solicitud, True, procesar_orden(*argumentos))
+        except Exception as e:
+            respuesta = (id_solicitud, False, e)
+        try:
+            conexion.send(respuesta)
+        except Exception:
+            # La excepción no se puede serializar: se envía su descripción
+            conexion.send((id_solicitud, False, RuntimeError(f"Shard {numero}: {respuesta[2]!r}")))
+    conexion.close()
+
+
+class _Shard:
+    def __init__(self, numero, contexto):
+        self.numero = numero
+        self.contexto = contexto
+        self.lock_envio = threading.Lock()
+        self.pendientes = {}
+        self.activo = True
+        self._lanzar()
+
+    def _lanzar(self):
+        self.conexion, conexion_hijo = self.contexto.Pipe()
+        self.proceso = self.contexto.Process(
+            target=_trabajador, args=(self.numero, conexion_hijo),
+            name=f"nuam-shard-{self.numero}", daemon=True
+        )
+        self.proceso.start()
+        conexion_hijo.close()
+        self.receptor = threading.Thread(target=self._recibir, args=(self.conexion,), daemon=True)
+        self.receptor.start()
+
+    def _recibir(self, conexion):
+        while True:
+            try:
+                id_solicitud, ok, valor = conexion.recv()
+            except (EOFError, OSError):
+                break
+            futuro = self.pendientes.pop(id_solicitud, None)
+            if futuro is None:
+                continue
+            if ok:
+                futuro.set_result(valor)
+            else:
+                futuro.set_exception(valor)
+
+        # El proceso terminó: fallar lo pendiente y relanzarlo si no fue una detención
+        with self.lock_envio:
+            pendientes, self.pendientes = self.pendientes, {}
+            for futuro in pendientes.values():
+                futuro.set_exception(RuntimeError(f"El shard {self.numero} terminó inesperadamente"))
+            if self.activo:
+                print(f"Shard {self.numero} caído; relanzando proceso.")
+                self._lanzar()
+
+    def enviar(self, id_solicitud, argumentos):
+        futuro = Future()
+        with self.lock_envio:
+            self.pendientes[id_solicitud] = futuro
+            self.conexion.send((id_solicitud, argumentos))
+        return futuro
+
+    def detener(self):
+        with self.lock_envio:
+            self.activo = False
+            try:
+                self.conexion.send(None)
+            except OSError:
+                pass
+        self.proceso.join(timeout=10)
+
+
+class EnrutadorOcupado(RuntimeError):
+    """Otro proceso de la API ya enruta órdenes a sus shards sobre la misma base."""
+
+
+class _BloqueoEnrutador:
+    """Bloqueo de enrutador único por base, retenido mientras el grupo de shards está activo."""
+
+    def __init__(self):
+        self._conexion = None
+        self._archivo = None
+        self._detener = threading.Event()
+
+    def tomar(self):
+        from db_coneccion import Engine_MYSQL, DB_URL_MYSQL
+        from bloqueo_instancia import BloqueoInstancia, BloqueoOcupado
+
+        if Engine_MYSQL.dialect.name != "mysql":
+            huella = hashlib.sha256(DB_URL_MYSQL.encode()).hexdigest()[:16]
+            self._archivo = BloqueoInstancia(os.path.join(tempfile.gettempdir(), f"nuam-shards-{huella}.lock"))
+            try:
+                self._archivo.tomar("API NUAM con shards")
+            except BloqueoOcupado as e:
+                self._archivo = None
+                raise EnrutadorOcupado(f"Otra API con shards usa la misma base: {e}")
+            return
+        self._conexion = Engine_MYSQL.connect()
+        if not self._obtener():
+            self._conexion.close()
+            self._conexion = None
+            raise EnrutadorOcupado("Otra API con shards usa la misma base (GET_LOCK "
+                                   f"'{NOMBRE_BLOQUEO_ENRUTADOR}' tomado); use un solo proceso de API con NUAM_SHARDS")
+        self._detener.clear()
+        threading.Thread(target=self._vigilar, name="bloqueo-enrutador", daemon=True).start()
+
+    def _obtener(self):
+        from sqlalchemy import text
+        obtenido = self._conexion.execute(text("SELECT GET_LOCK(:nombre, 0)"),
+                                          {"nombre": NOMBRE_BLOQUEO_ENRUTADOR}).scalar()
+        self._conexion.commit()   # el GET_LOCK es de la sesión; no dejar la transacción abierta
+        return obtenido == 1
+
+    def _vigilar(self):
+        """Si la conexión se cortó (wait_timeout, reinicio de MySQL), el bloqueo se perdió: se retoma."""
+        from sqlalchemy import text
+        from db_coneccion import Engine_MYSQL
+
+        while not self._detener.wait(VERIFICAR_BLOQUEO_CADA):
+            try:
+                propio = self._conexion.execute(text("SELECT IS_USED_LOCK(:nombre) = CONNECTION_ID()"),
+                                                {"nombre": NOMBRE_BLOQUEO_ENRUTADOR}).scalar()
+                self._conexion.commit()
+                if propio == 1:
+                    continue
+            except Exception:
+                try:
+                    self._conexion.close()
+                except Exception:
+                    pass
+                try:
+                    self._conexion = Engine_MYSQL.connect()
+                except Exception as e:
+                    print(f"⚠ Bloqueo de enrutador de shards perdido (sin conexión a MySQL): {e}")
+                    continue
+            try:
+                if not self._obtener():
+                    print("⚠ Bloqueo de enrutador de shards perdido: otro proceso lo tomó. "
+                          "El orden por instrumento no está garantizado.")
+            except Exception as e:
+                print(f"⚠ No se pudo retomar el bloqueo de enrutador de shards: {e}")
+
+    def liberar(self):
+        self._detener.set()
+        if self._archivo is not None:
+            self._archivo.liberar()
+            self._archivo = None
+        if self._conexion is not None:
+            try:
+                self._conexion.close()   # cerrar la sesión de MySQL libera el GET_LOCK
+            except Exception:
+                pass
+            self._conexion = None
+
+
+class GrupoShards:
+    """Enrutador de órdenes hacia los procesos shard."""
+
+    def __init__(self, num_shards=NUM_SHARDS):
+        self.num_shards = num_shards
+        self._shards = []
+        self._ids = itertools.count(1)
+        self._bloqueo = _BloqueoEnrutador()
+
+    @property
+    def activo(self):
+        return bool(self._shards)
+
+    def iniciar(self):
+        """Lanza los shards; EnrutadorOcupado si otro proceso de la API ya los tiene sobre la misma base."""
+        self._bloqueo.tomar()
+        contexto = multiprocessing.get_context("spawn")
+        self._shards = [_Shard(i, contexto) for i in range(self.num_shards)]
+        print(f"{self.num_shards} shards de órdenes iniciados.")
+
+    def enviar_orden(self, usuario, instrumento, tipo, cantidad, precio_limite, ejecutar=True):
+        """Envía la orden al shard dueño del instrumento. Retorna un concurrent.futures.Future."""
+        shard = self._shards[shard_de(instrumento, self.num_shards)]
+        return shard.enviar(next(self._ids), (usuario, instrumento, tipo, cantidad, precio_limite, ejecutar))
+
+    def detener(self):
+        for shard in self._shards:
+            shard.detener()
+        self._shards = []
+        self._bloqueo.liberar()
+
+    def metricas(self):
+        return {
+            "num_shards": self.num_shards,
+            "shards": [
+                {"shard": s.numero, "pid": s.proceso.pid, "vivo": s.proceso.is_alive(),
+                 "pendientes": len(s.pendientes)}
+                for s in self._shards
+            ]
+        }
+
+
+grupo_shards = GrupoShards()
@@ -0,0 +1,297 @@
+# subasta.py
+"""
+Subastas de apertura/cierre (call auction) por instrumento.
+
+Mientras un instrumento está en fase de subasta, /api/orden solo registra las
+órdenes (quedan 'Pendiente', sin simular ejecución). Al calce:
+
+- precio_equilibrio(): con NumPy sobre las curvas acumuladas de demanda
+  (compras con límite >= p) y oferta (ventas con límite <= p) elige el precio
+  que maximiza el volumen ejecutado; en empate, el de menor desbalance y luego
+  el más cercano al precio de referencia.
+- asignar(): reparte el volumen con prioridad precio-tiempo (cumsum).
+- emparejar(): corta compras y ventas asignadas en segmentos compra/venta.
+- calzar(): escribe transacciones, órdenes y posiciones en una sola
+  transacción de MySQL. Las parciales conservan `cantidad` (la original) y
+  acumulan lo ejecutado en `cantidadEjecutada`.
+
+Las órdenes a mercado participan como compras a +inf y ventas a -inf.
+"""
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import bindparam, func, insert, select, update
+
+from db_coneccion import get_mysql_session
+from modelo_sql import Orden, Transaccion
+from libro_ordenes import indice_ordenes
+from posiciones import aplicar_ejecucion, bloquear_posiciones, guardar_posiciones, libro_posiciones
+
+try:
+    import numpy as np
+except ImportError:  # numpy es opcional: solo se necesita para el modo subasta
+    np = None
+
+LOTE_UPDATE = 10000
+
+
+def _requiere_numpy():
+    if np is None:
+        raise RuntimeError("El modo subasta requiere numpy: pip install numpy")
+
+
+# ============= CALCE VECTORIZADO =============
+
+def precio_equilibrio(precio_compra, cant_compra, precio_venta, cant_venta, referencia=None):
+    """
+    Precio de calce sobre arreglos de compras y ventas (precios +inf/-inf para
+    órdenes a mercado). Retorna (precio, volumen, desbalance), o (None, 0, 0)
+    si las curvas no se cruzan.
+    """
+    candidatos = np.unique(np.concatenate([precio_compra[np.isfinite(precio_compra)],
+                                           precio_venta[np.isfinite(precio_venta)]]))
+    if candidatos.size == 0:
+        if referencia is None:
+            return None, 0, 0
+        candidatos = np.array([referencia], dtype=np.float64)
+
+    orden_c = np.argsort(precio_compra, kind="stable")
+    acum_c = np.concatenate(([0], np.cumsum(cant_compra[orden_c])))
+    demanda = acum_c[-1] - acum_c[np.searchsorted(precio_compra[orden_c], candidatos, side="left")]
+
+    orden_v = np.argsort(precio_venta, kind="stable")
+    acum_v = np.concatenate(([0], np.cumsum(cant_venta[orden_v])))
+    oferta = acum_v[np.searchsorted(precio_venta[orden_v], candidatos, side="right")]
+
+    volumen = np.minimum(demanda, oferta)
+    maximo = volumen.max()
+    if maximo <= 0:
+        return None, 0, 0
+    mejores = np.flatnonzero(volumen == maximo)
+    desbalance = np.abs(demanda[mejores] - oferta[mejores])
+    mejores = mejores[desbalance == desbalance.min()]
+    if referencia is not None:
+        elegido = mejores[np.argmin(np.abs(candidatos[mejores] - referencia))]
+    else:
+        elegido = mejores[len(mejores) // 2]
+    return float(candidatos[elegido]), int(maximo), int(abs(demanda[elegido] - oferta[elegido]))
+
+def asignar(precios, cantidades, secuencia, volumen, compra):
+    """
+    Cantidad ejecutada por orden (en el orden de entrada) con prioridad
+    precio-tiempo, y el orden de prioridad usado.
+    """
+    prioridad = np.lexsort((secuencia, -precios if compra else precios))
+    ordenadas = cantidades[prioridad]
+    previas = np.cumsum(ordenadas) - ordenadas
+    llenado = np.empty_like(cantidades)
+    llenado[prioridad] = np.clip(volumen - previas, 0, ordenadas)
+    return llenado, prioridad
+
+def emparejar(llenado_c, prioridad_c, llenado_v, prioridad_v):
+    """Segmentos (índice compra, índice venta, cantidad) que cubren el volumen calzado."""
+    ic = prioridad_c[llenado_c[prioridad_c] > 0]
+    iv = prioridad_v[llenado_v[prioridad_v] > 0]
+    fin_c = np.cumsum(llenado_c[ic])
+    fin_v = np.cumsum(llenado_v[iv])
+    cortes = np.union1d(fin_c, fin_v)
+    cantidades = np.diff(cortes, prepend=0)
+    return (ic[np.searchsorted(fin_c, cortes, side="left")],
+            iv[np.searchsorted(fin_v, cortes, side="left")],
+            cantidades)
+
+def _arreglos(ordenes):
+    compra = ordenes[0].tipo == 'Compra' if ordenes else True
+    infinito = np.inf if compra else -np.inf
+    precios = np.array([o.precioLimite if o.precioLimite else infinito for o in ordenes], dtype=np.float64)
+    cantidades = np.array([o.cantidad for o in ordenes], dtype=np.int64)
+    secuencia = np.array([o.idOrden for o in ordenes], dtype=np.int64)
+    return precios, cantidades, secuencia
+
+def precio_indicativo(ordenes, referencia=None):
+    """Precio/volumen que resultaría de calzar ahora las órdenes dadas."""
+    _requiere_numpy()
+    compras = [o for o in ordenes if o.tipo == 'Compra']
+    ventas = [o for o in ordenes if o.tipo == 'Venta']
+    if not compras or not ventas:
+        return None, 0, 0
+    pc, qc, _ = _arreglos(compras)
+    pv, qv, _ = _arreglos(ventas)
+    return precio_equilibrio(pc, qc, pv, qv, referencia)
+
+
+# ============= CALCE CON ESCRITURA EN MYSQL =============
+
+def _bloquear_pendientes(session, ids):
+    """Bloquea (FOR UPDATE) las órdenes aún 'Pendiente' en MySQL; retorna sus ids."""
+    vigentes = set()
+    for i in range(0, len(ids), LOTE_UPDATE):
+        vigentes.update(session.execute(
+            select(Orden.idOrden)
+            .where(Orden.idOrden.in_(ids[i:i + LOTE_UPDATE]), Orden.estado == 'Pendiente')
+            .with_for_update()
+        ).scalars())
+    return vigentes
+
+
+def calzar(instrumento, bolsa, referencia=None):
+    """
+    Calza el libro completo del instrumento. Las órdenes se retiran del índice
+    mientras dura la escritura (cancelaciones concurrentes reciben 404) y se
+    devuelven después, descontando lo ejecutado. Sus filas se bloquean en MySQL
+    antes de calcular el precio: las que otro proceso ya ejecutó o canceló no
+    participan y salen del índice (`retiradas`).
+    `Orden.cantidad` conserva la cantidad original; lo ejecutado se acumula en
+    `Orden.cantidadEjecutada`.
+    Retorna un resumen con `ejecuciones` [(idOrden, idUsuario, cantidad, restante)]
+    y `retiradas` [(idOrden, idUsuario)].
+    """
+    _requiere_numpy()
+    inicio = time.perf_counter()
+    ordenes = [o for o in indice_ordenes.tomar_varias(instrumento=instrumento) if o is not None]
+    resumen = {"instrumento": instrumento, "precio": None, "volumen": 0, "desbalance": 0,
+               "transacciones": 0, "ejecuciones": [], "retiradas": [], "ordenes_en_libro": len(ordenes)}
+    retiradas, ejecuciones, estados = [], [], {}
+    try:
+        with get_mysql_session() as session:
+            vigentes = _bloquear_pendientes(session, [o.idOrden for o in ordenes])
+            retiradas = [o for o in ordenes if o.idOrden not in vigentes]
+            ordenes = [o for o in ordenes if o.idOrden in vigentes]
+            resumen["ordenes_en_libro"] = len(ordenes)
+            compras = [o for o in ordenes if o.tipo == 'Compra']
+            ventas = [o for o in ordenes if o.tipo == 'Venta']
+            precio = None
+            if compras and ventas:
+                pc, qc, sc = _arreglos(compras)
+                pv, qv, sv = _arreglos(ventas)
+                precio, volumen, desbalance = precio_equilibrio(pc, qc, pv, qv, referencia)
+            if precio is not None:
+                transacciones, ejecuciones, estados = _escribir_calce(
+                    session, instrumento, bolsa, precio, volumen, compras, ventas, pc, qc, sc, pv, qv, sv)
+                resumen.update(precio=precio, volumen=volumen, desbalance=desbalance,
+                               transacciones=len(transacciones))
+    except Exception:
+        for o in ordenes + retiradas:
+            indice_ordenes.devolver(o)
+        raise
+
+    # Confirmado el commit: índice (y journal) y posiciones en memoria
+    for o in retiradas:
+        indice_ordenes.descartar(o)
+    resumen["retiradas"] = [(o.idOrden, o.idUsuario) for o in retiradas]
+    resumen["ejecuciones"] = [(o.idOrden, o.idUsuario, q, o.cantidad - q) for o, q in ejecuciones]
+    for o in ordenes:
+        indice_ordenes.devolver(o)
+    for o, q in ejecuciones:
+        indice_ordenes.registrar_ejecucion(o.idOrden, q)
+    for (id_usuario, instr), estado in estados.items():
+        libro_posiciones.fijar(id_usuario, instr, estado)
+
+    resumen["duracion_ms"] = round((time.perf_counter() - inicio) * 1000, 1)
+    return resumen
+
+
+def _escribir_calce(session, instrumento, bolsa, precio, volumen, compras, ventas, pc, qc, sc, pv, qv, sv):
+    """Transacciones, órdenes y posiciones del calce, en la sesión que tiene bloqueadas las órdenes."""
+    llenado_c, prioridad_c = asignar(pc, qc, sc, volumen, compra=True)
+    llenado_v, prioridad_v = asignar(pv, qv, sv, volumen, compra=False)
+    seg_c, seg_v, cantidades = emparejar(llenado_c, prioridad_c, llenado_v, prioridad_v)
+
+    ahora = datetime.utcnow()
+    transacciones = [
+        {"idOrdenCompra": str(compras[i].idOrden), "idOrdenVenta": str(ventas[j].idOrden),
+         "idOrdenCompraRef": compras[i].idOrden, "idOrdenVentaRef": ventas[j].idOrden,
+         "instrumento": instrumento, "precioEjecucion": precio, "cantidadEjecutada": q,
+         "monto": precio * q, "fechaEjecucion": ahora, "bolsaOrigen": bolsa}
+        for i, j, q in zip(seg_c.tolist(), seg_v.tolist(), cantidades.tolist())
+    ]
+    ejecuciones = [(o, q) for o, q in zip(compras, llenado_c.tolist()) if q] + \
+                  [(o, q) for o, q in zip(ventas, llenado_v.tolist()) if q]
+
+    # Una ejecución agregada por usuario y lado: todas son al mismo precio
+    netos = {}
+    for o, q in ejecuciones:
+        netos[(o.idUsuario, o.tipo)] = netos.get((o.idUsuario, o.tipo), 0) + q
+
+    session.execute(insert(Transaccion), transacciones)
+    actualizadas = 0
+    completas = [o.idOrden for o, q in ejecuciones if q == o.cantidad]
+    for i in range(0, len(completas), LOTE_UPDATE):
+        actualizadas += session.execute(
+            update(Orden)
+            .where(Orden.idOrden.in_(completas[i:i + LOTE_UPDATE]), Orden.estado == 'Pendiente')
+            .values(estado='Ejecutada', cantidadEjecutada=Orden.cantidad)
+        ).rowcount
+    # Parciales: la cantidad original se conserva y se acumula lo ejecutado
+    parciales = [{"_id": o.idOrden, "_ejecutada": q} for o, q in ejecuciones if q < o.cantidad]
+    if parciales:
+        tabla = Orden.__table__
+        actualizadas += session.connection().execute(
+            update(tabla)
+            .where(tabla.c.idOrden == bindparam("_id"), tabla.c.estado == 'Pendiente')
+            .values(cantidadEjecutada=func.coalesce(tabla.c.cantidadEjecutada, 0) + bindparam("_ejecutada")),
+            parciales
+        ).rowcount
+    if actualizadas != len(ejecuciones):
+        raise RuntimeError(f"Calce de {instrumento}: {len(ejecuciones) - actualizadas} órdenes dejaron de estar pendientes")
+
+    estados = bloquear_posiciones(session, {(id_usuario, instrumento) for id_usuario, _ in netos})
+    for (id_usuario, tipo), q in netos.items():
+        clave = (id_usuario, instrumento)
+        estados[clave] = aplicar_ejecucion(session, id_usuario, instrumento, tipo, q, precio,
+                                           actual=estados.get(clave))
+    guardar_posiciones(session, estados)
+    return transacciones, ejecuciones, estados
+
+
+# ============= MODO SUBASTA POR INSTRUMENTO =============
+
+class GestorSubastas:
+    """Instrumentos en fase de subasta; con `intervalo` se calzan periódicamente."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subastas = {}   # instrumento -> {"bolsa", "desde", "intervalo", "proximo_calce"}
+
+    def en_subasta(self, instrumento):
+        return instrumento in self._subastas
+
+    def abrir(self, instrumento, bolsa, intervalo=None):
+        _requiere_numpy()
+        with self._lock:
+            self._subastas[instrumento] = {
+                "bolsa": bolsa,
+                "desde": datetime.utcnow(),
+                "intervalo": intervalo,
+                "proximo_calce": time.monotonic() + intervalo if intervalo else None,
+            }
+
+    def cerrar(self, instrumento):
+        """Sale de la fase de subasta (vuelve a negociación continua). Retorna la configuración."""
+        with self._lock:
+            return self._subastas.pop(instrumento, None)
+
+    def obtener(self, instrumento):
+        return self._subastas.get(instrumento)
+
+    def vencidas(self):
+        """Subastas periódicas cuyo calce corresponde ahora (y reprograma el siguiente)."""
+        ahora = time.monotonic()
+        vencidas = []
+        with self._lock:
+            for instrumento, subasta in self._subastas.items():
+                if subasta["proximo_calce"] is not None and subasta["proximo_calce"] <= ahora:
+                    subasta["proximo_calce"] = ahora + subasta["intervalo"]
+                    vencidas.append((instrumento, subasta["bolsa"]))
+        return vencidas
+
+    def estado(self):
+        with self._lock:
+            return {
+                instrumento: {"bolsa": s["bolsa"], "desde": s["desde"].isoformat(), "intervalo": s["intervalo"]}
+                for instrumento, s in self._subastas.items()
+            }
+
+
+gestor_subastas = GestorSubastas()
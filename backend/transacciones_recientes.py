@@ -0,0 +1,120 @@
+# transacciones_recientes.py
+"""
+Buffer circular en memoria con las últimas transacciones, ya serializadas a
+JSON. /api/reportes con límite pequeño y sin filtros se responde desde aquí
+sin consultar MySQL (ni la réplica).
+
+- Se precarga al iniciar la API con las `capacidad` más recientes.
+- Cada ejecución confirmada en este proceso se agrega al frente (sin
+  duplicar si ya llegó con una recarga).
+- Antes de responder se compara con la marca de versiones.py
+  (MAX(idTransaccion), cacheada ~1s): si la base tiene transacciones que el
+  buffer no vio (shards, carga por lotes, otro proceso de la API), se
+  invalida y la consulta va a MySQL, que vuelve a llenarlo.
+- Un calce de subasta (insert masivo sin idTransaccion) también lo invalida.
+
+Capacidad con NUAM_REPORTES_RECIENTES (0 lo deshabilita).
+"""
+import json
+import os
+import threading
+from collections import deque
+
+CAPACIDAD = int(os.getenv("NUAM_REPORTES_RECIENTES", "1000"))
+
+
+class TransaccionesRecientes:
+
+    def __init__(self, capacidad=CAPACIDAD):
+        self.capacidad = capacidad
+        self._lock = threading.Lock()
+        self._buffer = deque()   # (fechaEjecucion ISO, idTransaccion, bytes JSON), más reciente a la derecha
+        self._ids = set()        # idTransaccion presentes en el buffer
+        self._ultimo_id = 0      # mayor idTransaccion visto desde la última carga
+        self._valido = False
+        self._completo = False   # el buffer contiene todas las transacciones existentes
+        self.aciertos = 0
+        self.fallos = 0
+        self.desactualizaciones = 0
+
+    @property
+    def habilitado(self):
+        return self.capacidad > 0
+
+    @staticmethod
+    def _codificar(transaccion):
+        return (transaccion["fechaEjecucion"], transaccion["idTransaccion"],
+                json.dumps(transaccion, ensure_ascii=False, separators=(",", ":")).encode())
+
+    def cargar(self, transacciones):
+        """Reemplaza el contenido con transacciones serializadas, de la más reciente a la más antigua."""
+        if not self.habilitado:
+            return
+        codificadas = [self._codificar(t) for t in transacciones[:self.capacidad]]
+        with self._lock:
+            self._buffer.clear()
+            self._buffer.extend(reversed(codificadas))
+            self._ids = {entrada[1] for entrada in codificadas}
+            self._ultimo_id = max(self._ids, default=0)
+            self._completo = len(codificadas) < self.capacidad
+            self._valido = True
+
+    def agregar(self, transaccion):
+        """Agrega una transacción serializada recién confirmada."""
+        if not self.habilitado:
+            return
+        entrada = self._codificar(transaccion)
+        with self._lock:
+            if not self._valido or entrada[1] in self._ids:
+                return
+            posicion = len(self._buffer)
+            # Commits concurrentes pueden llegar fuera de orden: se inserta en su lugar
+            while posicion > 0 and self._buffer[posicion - 1][0] > entrada[0]:
+                posicion -= 1
+            if posicion == 0 and len(self._buffer) == self.capacidad:
+                return   # más antigua que todo el buffer lleno
+            if len(self._buffer) == self.capacidad:
+                self._ids.discard(self._buffer.popleft()[1])
+                posicion -= 1
+            self._buffer.insert(posicion, entrada)
+            self._ids.add(entrada[1])
+            self._ultimo_id = max(self._ultimo_id, entrada[1])
+
+    def invalidar(self):
+        with self._lock:
+            self._valido = False
+            self._buffer.clear()
+            self._ids.clear()
+
+    def ultimas(self, limite, ultimo_id_base=None):
+        """
+        JSON (bytes) de la lista con las `limite` más recientes, o None si hay
+        que ir a MySQL. `ultimo_id_base` es el MAX(idTransaccion) de la base
+        (None si no se pudo leer): si es mayor que el último visto, otro
+        proceso agregó transacciones y el buffer se invalida.
+        """
+        with self._lock:
+            if self._valido and ultimo_id_base is not None and ultimo_id_base > self._ultimo_id:
+                self._valido = False
+                self._buffer.clear()
+                self._ids.clear()
+                self.desactualizaciones += 1
+            if not self._valido or limite > self.capacidad or (limite > len(self._buffer) and not self._completo):
+                self.fallos += 1
+                return None
+            self.aciertos += 1
+            n = min(limite, len(self._buffer))
+            return b"[" + b",".join(self._buffer[-1 - i][2] for i in range(n)) + b"]"
+
+    def metricas(self):
+        return {
+            "capacidad": self.capacidad,
+            "transacciones": len(self._buffer),
+            "valido": self._valido,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "desactualizaciones": self.desactualizaciones,
+        }
+
+
+transacciones_recientes = TransaccionesRecientes()
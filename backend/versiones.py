@@ -0,0 +1,96 @@
+# versiones.py
+"""
+Versiones de recursos para GET condicionales (ETag / 304), derivadas de la
+base para que sean las mismas en todos los procesos (workers, shards, carga
+por lotes, réplicas de la API) y sobrevivan a un reinicio.
+
+Cada tipo de recurso registra una fuente que lee su marca de la base:
+- ("ordenes", idUsuario): COUNT y MAX(fechaActualizacion) de sus órdenes.
+- ("transacciones",): MAX(idTransaccion).
+- ("tarifas",): cantidad y último timestamp de configuracion_mercado.
+
+La marca se cachea NUAM_VERSIONES_VERIFICAR_CADA segundos (0 = en cada
+consulta): un cambio hecho por otro proceso se ve a más tardar en ese plazo.
+Las escrituras de este proceso llaman a `invalidar`, así la siguiente
+consulta vuelve a leer la marca. El ETag combina la marca y un hash de los
+parámetros de la consulta, así que /api/ordenes, /api/reportes y /api/tarifas
+responden 304 sin consultar los datos ni serializar cuando nada cambió. Si la
+marca no se puede leer, la respuesta va sin ETag.
+"""
+import hashlib
+import os
+import threading
+import time
+
+CACHE_CONTROL = "private, no-cache"
+VERIFICAR_CADA = float(os.getenv("NUAM_VERSIONES_VERIFICAR_CADA", "1"))
+
+
+class Versiones:
+
+    def __init__(self, verificar_cada=VERIFICAR_CADA):
+        self.verificar_cada = verificar_cada
+        self._lock = threading.Lock()
+        self._fuentes = {}   # tipo -> función(*resto de la clave) que lee la marca
+        self._marcas = {}    # clave -> (marca, time.monotonic() de la lectura)
+        self._cambios = {}   # clave -> time.monotonic() del último cambio visto
+        self.lecturas = 0
+        self.no_modificadas = 0
+
+    def registrar_fuente(self, tipo, funcion):
+        self._fuentes[tipo] = funcion
+
+    def invalidar(self, *clave):
+        """Este proceso acaba de modificar `clave`: la próxima versión se lee de la base."""
+        with self._lock:
+            self._marcas.pop(clave, None)
+            self._cambios[clave] = time.monotonic()
+
+    def version(self, *clave):
+        """Marca actual de `clave` (cacheada), o None si no se pudo leer."""
+        ahora = time.monotonic()
+        entrada = self._marcas.get(clave)
+        if entrada is not None and ahora - entrada[1] < self.verificar_cada:
+            return entrada[0]
+        try:
+            marca = self._fuentes[clave[0]](*clave[1:])
+        except Exception as e:
+            print(f"No se pudo leer la versión de {clave}: {e}")
+            marca = None
+        with self._lock:
+            self.lecturas += 1
+            anterior = self._marcas.get(clave)
+            # Sin lectura previa no se sabe desde cuándo rige la marca: se trata como un cambio
+            if marca is not None and (anterior is None or anterior[0] != marca):
+                self._cambios[clave] = ahora
+            self._marcas[clave] = (marca, ahora)
+        return marca
+
+    def cambio_reciente(self, clave, segundos):
+        """True si `clave` cambió (aquí o en otro proceso) hace menos de `segundos`."""
+        cambio = self._cambios.get(clave)
+        return cambio is not None and time.monotonic() - cambio < segundos
+
+    def etag(self, clave, *parametros):
+        """ETag (débil) de la versión actual de `clave` para los parámetros dados, o None."""
+        marca = self.version(*clave)
+        if marca is None:
+            return None
+        huella = hashlib.blake2b(repr((clave, marca, parametros)).encode(), digest_size=9).hexdigest()
+        return f'W/"{huella}"'
+
+    def no_modificado(self, if_none_match, etag):
+        """True si el cliente ya tiene `etag` (header If-None-Match)."""
+        if not if_none_match or etag is None:
+            return False
+        if if_none_match.strip() == "*" or etag in (e.strip() for e in if_none_match.split(",")):
+            self.no_modificadas += 1
+            return True
+        return False
+
+    def metricas(self):
+        return {"claves": len(self._marcas), "lecturas": self.lecturas, "no_modificadas": self.no_modificadas,
+                "verificar_cada": self.verificar_cada}
+
+
+versiones = Versiones()
@@ -0,0 +1,106 @@
+"""
+Benchmark del journal de órdenes: escritura de N eventos y tiempo de
+recuperación del índice (snapshot + cola vs. reproducción completa).
+
+Uso (desde la raíz del repositorio):
+    python benchmarks/bench_journal.py --eventos 10000000
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from journal_ordenes import Journal, REGISTRO
+from libro_ordenes import IndiceOrdenes, OrdenReposo
+
+INSTRUMENTOS = ["ENEL", "SQM-B", "BSANTANDER", "AAPL", "BBVA"]
+
+
+def generar(indice, eventos, ordenes_vivas, semilla):
+    """Flujo determinista: ~50% altas, el resto ejecuciones y cancelaciones."""
+    rng = random.Random(semilla)
+    activas = []
+    siguiente_id = 1
+    ahora = datetime.utcnow()
+    for _ in range(eventos):
+        if len(activas) < ordenes_vivas // 2 or (rng.random() < 0.5 and len(activas) < ordenes_vivas):
+            orden = OrdenReposo(siguiente_id, f"{rng.randrange(1000):024x}", rng.choice(("Compra", "Venta")),
+                                rng.choice(INSTRUMENTOS), rng.randint(10, 500),
+                                round(rng.uniform(20, 150), 2), ahora)
+            siguiente_id += 1
+            indice.registrar(orden)
+            activas.append(orden.idOrden)
+            continue
+        pos = rng.randrange(len(activas))
+        id_orden = activas[pos]
+        orden = indice.obtener(id_orden)
+        if rng.random() < 0.6:
+            cantidad = rng.randint(1, orden.cantidad)
+            parcial = cantidad < orden.cantidad
+            indice.registrar_ejecucion(id_orden, cantidad)
+            if parcial:
+                continue
+        else:
+            indice.confirmar_cancelacion([indice.tomar(id_orden)])
+        activas[pos] = activas[-1]
+        activas.pop()
+
+
+def recuperar(directorio):
+    indice = IndiceOrdenes()
+    inicio = time.perf_counter()
+    total = indice.usar_journal(Journal(directorio))
+    duracion = time.perf_counter() - inicio
+    indice._journal.cerrar()
+    return total, duracion
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--eventos", type=int, default=10_000_000)
+    parser.add_argument("--ordenes-vivas", type=int, default=200_000)
+    parser.add_argument("--snapshot-cada", type=int, default=1_000_000)
+    parser.add_argument("--lote-fsync", type=int, default=256, help="Eventos por fsync")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--directorio", default=None, help="Directorio de trabajo (por defecto, temporal)")
+    args = parser.parse_args()
+
+    directorio = args.directorio or tempfile.mkdtemp(prefix="nuam_journal_")
+    try:
+        indice = IndiceOrdenes(snapshot_cada=args.snapshot_cada)
+        indice.usar_journal(Journal(directorio, lote_fsync=args.lote_fsync))
+        inicio = time.perf_counter()
+        generar(indice, args.eventos, args.ordenes_vivas, args.semilla)
+        indice._journal.sincronizar()
+        escritura = time.perf_counter() - inicio
+        if indice._hilo_snapshot is not None:
+            indice._hilo_snapshot.join()
+        # Sin snapshot final: simula una caída y deja una cola por reproducir
+        indice._journal.cerrar()
+        ordenes_finales = len(indice)
+
+        tamano = os.path.getsize(os.path.join(directorio, "ordenes.journal"))
+        print(f"Eventos escritos:     {args.eventos:,} ({tamano / 2**20:,.1f} MiB, {REGISTRO.size} B/evento)")
+        print(f"Escritura (fsync cada {args.lote_fsync}): {escritura:.2f}s ({args.eventos / escritura:,.0f} eventos/s)")
+
+        total, con_snapshot = recuperar(directorio)
+        assert total == ordenes_finales, (total, ordenes_finales)
+        print(f"Recuperación (snapshot + cola): {con_snapshot:.2f}s -> {total:,} órdenes en reposo")
+
+        os.remove(os.path.join(directorio, "ordenes.snapshot"))
+        total, completa = recuperar(directorio)
+        assert total == ordenes_finales, (total, ordenes_finales)
+        print(f"Recuperación (journal completo): {completa:.2f}s ({args.eventos / completa:,.0f} eventos/s)")
+    finally:
+        if args.directorio is None:
+            shutil.rmtree(directorio, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
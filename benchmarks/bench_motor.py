@@ -0,0 +1,265 @@
+"""
+Microbenchmark del motor de órdenes sin HTTP ni base de datos: reproduce el
+camino de /api/orden (colocar_orden) sobre un flujo determinista de órdenes
+con el mismo código —validar_orden y motor_ordenes.ColocacionOrdenes: control
+pre-trade, fase de subasta, índice de órdenes en reposo, posiciones y buffer
+de transacciones recientes— y el commit de MySQL reemplazado por un contador
+de idOrden con la simulación del match.
+
+Reporta órdenes/s, percentiles de latencia por orden y memoria por orden en
+reposo (tracemalloc, en un proceso aparte para no distorsionar la latencia).
+El flujo se genera con la mezcla de locustfile.py (ENEL, SQM-B, BSANTANDER,
+AAPL, BBVA; cantidad 10-500; precio 20-150) o se reproduce desde un NDJSON.
+
+Uso (desde la raíz del repositorio):
+    python benchmarks/bench_motor.py --ordenes 1000000 --guardar base.json
+    # ... cambio en el motor ...
+    python benchmarks/bench_motor.py --ordenes 1000000 --comparar base.json
+
+    python benchmarks/bench_motor.py --grabar flujo.ndjson      # guarda el flujo generado
+    python benchmarks/bench_motor.py --flujo flujo.ndjson       # lo reproduce
+
+La huella (sha256 de los resultados de cada orden) cambia solo si cambia el
+comportamiento del motor para el mismo flujo.
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from motor_ordenes import validar_orden, precio_de_ejecucion, ColocacionOrdenes
+from posiciones import LibroPosiciones, EstadoPosicion
+from libro_ordenes import IndiceOrdenes
+from riesgo import ControlRiesgo
+from subasta import GestorSubastas
+from transacciones_recientes import TransaccionesRecientes
+
+INSTRUMENTOS = ["ENEL", "SQM-B", "BSANTANDER", "AAPL", "BBVA"]
+BOLSAS = ["CL", "PE", "CO"]
+
+
+# ============= FLUJO DE ÓRDENES =============
+
+def generar_flujo(ordenes, usuarios, semilla):
+    """Flujo determinista con la mezcla de locustfile.py: (idUsuario, bolsa, instrumento, tipo, cantidad, precio)."""
+    rng = random.Random(semilla)
+    ids = [f"{i:024x}" for i in range(usuarios)]
+    bolsa_de = {u: BOLSAS[i % len(BOLSAS)] for i, u in enumerate(ids)}
+    flujo = []
+    for _ in range(ordenes):
+        u = rng.choice(ids)
+        flujo.append((u, bolsa_de[u], rng.choice(INSTRUMENTOS), rng.choice(("Compra", "Venta")),
+                      rng.randint(10, 500), round(rng.uniform(20, 150), 2)))
+    return flujo
+
+
+def leer_flujo(ruta):
+    flujo = []
+    with open(ruta, encoding="utf-8") as f:
+        for linea in f:
+            if linea.strip():
+                r = json.loads(linea)
+                flujo.append((r["idUsuario"], r["perfilBolsa"], r["instrumento"], r["tipo"],
+                              int(r["cantidad"]), r.get("precioLimite")))
+    return flujo
+
+
+def grabar_flujo(flujo, ruta):
+    with open(ruta, "w", encoding="utf-8") as f:
+        for u, bolsa, instrumento, tipo, cantidad, precio in flujo:
+            f.write(json.dumps({"idUsuario": u, "perfilBolsa": bolsa, "instrumento": instrumento,
+                                "tipo": tipo, "cantidad": cantidad, "precioLimite": precio}) + "\n")
+
+
+# ============= MOTOR EN MEMORIA =============
+
+class MotorMemoria:
+    """
+    ColocacionOrdenes con estado propio (índice, riesgo, subastas, posiciones,
+    transacciones recientes) para un proceso de benchmark; `procesar`
+    reemplaza a procesar_orden con el resultado que daría el commit de MySQL.
+    """
+
+    def __init__(self, semilla):
+        self.posiciones = LibroPosiciones()
+        recientes = TransaccionesRecientes()
+        recientes.cargar([])
+        self.colocacion = ColocacionOrdenes(indice=IndiceOrdenes(), riesgo=ControlRiesgo(), subastas=GestorSubastas(),
+                                            posiciones=self.posiciones, recientes=recientes)
+        self.indice = self.colocacion.indice
+        self.rng = random.Random(semilla)
+        self.usuarios = {}
+        self.siguiente_id = 1
+        self.siguiente_transaccion = 1
+        self.huella = hashlib.sha256()
+        self.ejecutadas = self.pendientes = self.rechazadas = 0
+
+    def procesar(self, usuario, instrumento, tipo, cantidad, precio_limite, ejecutar):
+        """Lo que haría ejecutar_ordenes sin MySQL: el idOrden lo daría el flush."""
+        precio_ejecucion = precio_de_ejecucion(precio_limite, self.rng) if ejecutar else None
+        id_orden = self.siguiente_id
+        self.siguiente_id += 1
+        ahora = datetime.utcnow().isoformat()
+        orden = {"idOrden": id_orden, "tipo": tipo, "instrumento": instrumento, "cantidad": cantidad,
+                 "precioLimite": precio_limite, "estado": "Pendiente" if precio_ejecucion is None else "Ejecutada",
+                 "fechaCreacion": ahora}
+        resultado = {"orden": orden, "transaccion": None, "posicion": None}
+        if precio_ejecucion is not None:
+            id_usuario = usuario['idUsuario']
+            actual = self.posiciones.obtener(id_usuario, instrumento) or EstadoPosicion()
+            resultado["posicion"] = actual.aplicar(tipo, cantidad, precio_ejecucion).to_dict()
+            resultado["transaccion"] = {
+                "idTransaccion": self.siguiente_transaccion, "bolsaOrigen": usuario['perfilBolsa'],
+                "instrumento": instrumento,
+                "idOrdenCompra": str(id_orden) if tipo == "Compra" else "MATCH_FICTICIO",
+                "idOrdenVenta": str(id_orden) if tipo == "Venta" else "MATCH_FICTICIO",
+                "precioEjecucion": precio_ejecucion, "cantidadEjecutada": cantidad,
+                "monto": precio_ejecucion * cantidad, "fechaEjecucion": ahora,
+            }
+            self.siguiente_transaccion += 1
+        return resultado
+
+    def colocar(self, id_usuario, bolsa, instrumento, tipo, cantidad, precio_limite):
+        """Mismos pasos que colocar_orden (validar_orden y ColocacionOrdenes.colocar)."""
+        if validar_orden(instrumento, tipo, cantidad) is not None:
+            self.rechazadas += 1
+            return None
+        precio_final = precio_limite if precio_limite and precio_limite > 0 else None
+        usuario = self.usuarios.get(id_usuario)
+        if usuario is None:
+            usuario = self.usuarios[id_usuario] = {"idUsuario": id_usuario, "perfilBolsa": bolsa}
+
+        resultado, motivo = self.colocacion.colocar(usuario, instrumento, tipo, cantidad, precio_final, self.procesar)
+        if motivo is not None:
+            self.rechazadas += 1
+            return None
+        if resultado["transaccion"] is None:
+            self.pendientes += 1
+            return resultado["orden"]["idOrden"], None
+        self.ejecutadas += 1
+        return resultado["orden"]["idOrden"], resultado["transaccion"]["precioEjecucion"]
+
+    def reproducir(self, flujo, latencias=None):
+        reloj = time.perf_counter_ns
+        actualizar = self.huella.update
+        for pedido in flujo:
+            t0 = reloj()
+            resultado = self.colocar(*pedido)
+            if latencias is not None:
+                latencias.append(reloj() - t0)
+            actualizar(repr(resultado).encode())
+
+
+# ============= MEDICIONES =============
+
+def _flujo(args):
+    if args.flujo:
+        return leer_flujo(args.flujo)
+    return generar_flujo(args.ordenes, args.usuarios, args.semilla)
+
+
+def medir_memoria(args):
+    """Bytes por orden en reposo (índice, exposición de riesgo y posiciones). Se ejecuta en un proceso nuevo."""
+    flujo = _flujo(args)
+    motor = MotorMemoria(args.semilla)
+    tracemalloc.start()
+    antes = tracemalloc.take_snapshot()
+    motor.reproducir(flujo)
+    despues = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    # Incluye posiciones y precios de referencia, acotados por usuarios x instrumentos
+    crecimiento = sum(s.size_diff for s in despues.compare_to(antes, "filename"))
+    return crecimiento / max(len(motor.indice), 1)
+
+
+def percentiles(latencias):
+    latencias.sort()
+    def p(q):
+        return latencias[min(int(len(latencias) * q), len(latencias) - 1)] / 1000
+    return {"p50": p(0.50), "p90": p(0.90), "p99": p(0.99), "p99.9": p(0.999), "max": latencias[-1] / 1000}
+
+
+def comparar(actual, ruta):
+    with open(ruta, encoding="utf-8") as f:
+        base = json.load(f)
+    print(f"\nComparación con {ruta}:")
+    def linea(nombre, a, b, unidad, mayor_es_mejor=False):
+        cambio = (a - b) / b * 100 if b else 0.0
+        mejora = cambio > 0 if mayor_es_mejor else cambio < 0
+        print(f"  {nombre:<18} {b:>12,.2f} -> {a:>12,.2f} {unidad:<8} ({cambio:+.1f}%{' mejor' if mejora else ''})")
+    linea("órdenes/s", actual["ordenes_por_segundo"], base["ordenes_por_segundo"], "", mayor_es_mejor=True)
+    for clave in ("p50", "p99", "p99.9"):
+        linea(f"latencia {clave}", actual["latencia_us"][clave], base["latencia_us"][clave], "µs")
+    if actual.get("bytes_por_orden_reposo") and base.get("bytes_por_orden_reposo"):
+        linea("bytes/orden reposo", actual["bytes_por_orden_reposo"], base["bytes_por_orden_reposo"], "B")
+    if actual["huella"] == base["huella"]:
+        print("  Huella idéntica: mismo resultado orden por orden.")
+    else:
+        print("  ⚠ Huella distinta: el motor (o el flujo) produce resultados diferentes.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ordenes", type=int, default=1_000_000)
+    parser.add_argument("--usuarios", type=int, default=1_000)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--flujo", help="Reproduce un flujo NDJSON en vez de generarlo")
+    parser.add_argument("--grabar", help="Escribe el flujo generado en un NDJSON")
+    parser.add_argument("--sin-memoria", action="store_true", help="Omite la medición con tracemalloc")
+    parser.add_argument("--guardar", help="Guarda los resultados en un JSON")
+    parser.add_argument("--comparar", help="Compara con un JSON guardado con --guardar")
+    args = parser.parse_args()
+
+    flujo = _flujo(args)
+    if args.grabar:
+        grabar_flujo(flujo, args.grabar)
+        print(f"Flujo de {len(flujo):,} órdenes escrito en {args.grabar}")
+
+    motor = MotorMemoria(args.semilla)
+    latencias = []
+    inicio = time.perf_counter()
+    motor.reproducir(flujo, latencias)
+    total = time.perf_counter() - inicio
+
+    resultados = {
+        "ordenes": len(flujo),
+        "ordenes_por_segundo": len(flujo) / total,
+        "latencia_us": percentiles(latencias),
+        "ejecutadas": motor.ejecutadas,
+        "en_reposo": len(motor.indice),
+        "rechazadas": motor.rechazadas,
+        "huella": motor.huella.hexdigest(),
+        "bytes_por_orden_reposo": None,
+    }
+    if not args.sin_memoria:
+        with multiprocessing.get_context("spawn").Pool(1) as pool:
+            resultados["bytes_por_orden_reposo"] = pool.apply(medir_memoria, (args,))
+
+    lat = resultados["latencia_us"]
+    print(f"Órdenes: {len(flujo):,} ({motor.ejecutadas:,} ejecutadas, {len(motor.indice):,} en reposo, "
+          f"{motor.rechazadas:,} rechazadas)")
+    print(f"Tiempo: {total:.2f}s ({resultados['ordenes_por_segundo']:,.0f} órdenes/s)")
+    print(f"Latencia por orden: p50 {lat['p50']:.2f} µs  p90 {lat['p90']:.2f} µs  p99 {lat['p99']:.2f} µs  "
+          f"p99.9 {lat['p99.9']:.2f} µs  máx {lat['max']:.1f} µs")
+    if resultados["bytes_por_orden_reposo"] is not None:
+        print(f"Memoria por orden en reposo: {resultados['bytes_por_orden_reposo']:.0f} B")
+    print(f"Huella: {resultados['huella'][:16]}")
+
+    if args.guardar:
+        resultados["argumentos"] = vars(args)
+        with open(args.guardar, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2)
+    if args.comparar:
+        comparar(resultados, args.comparar)
+
+
+if __name__ == "__main__":
+    main()
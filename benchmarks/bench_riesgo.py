@@ -0,0 +1,96 @@
+"""
+Microbenchmark de los controles pre-trade (riesgo.py): latencia de
+reservar() + confirmar() con exposiciones ya cargadas en memoria.
+
+Uso (desde la raíz del repositorio):
+    python benchmarks/bench_riesgo.py --ordenes 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from posiciones import libro_posiciones, EstadoPosicion
+from riesgo import ControlRiesgo
+
+INSTRUMENTOS = ["ENEL", "SQM-B", "BSANTANDER", "AAPL", "BBVA"]
+BOLSAS = ["CL", "PE", "CO"]
+
+
+def preparar(control, usuarios, ordenes_vivas, rng):
+    """Posiciones y órdenes en reposo iniciales; retorna la lista de órdenes abiertas."""
+    for u in usuarios:
+        for instrumento in INSTRUMENTOS:
+            libro_posiciones.fijar(u, instrumento, EstadoPosicion(rng.randint(-5000, 5000), 100.0))
+    abiertas = []
+    for id_orden in range(1, ordenes_vivas + 1):
+        control.orden_abierta(id_orden, rng.choice(usuarios), rng.choice(INSTRUMENTOS),
+                              rng.choice(("Compra", "Venta")), rng.randint(10, 500))
+        abiertas.append(id_orden)
+    for instrumento in INSTRUMENTOS:
+        control.precio_referencia[instrumento] = 95.0
+    return abiertas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ordenes", type=int, default=1_000_000)
+    parser.add_argument("--usuarios", type=int, default=10_000)
+    parser.add_argument("--ordenes-vivas", type=int, default=200_000)
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.semilla)
+    control = ControlRiesgo()
+    usuarios = [f"{i:024x}" for i in range(args.usuarios)]
+    bolsa_de = {u: rng.choice(BOLSAS) for u in usuarios}
+    abiertas = preparar(control, usuarios, args.ordenes_vivas, rng)
+    control.fijar_limites("bolsa", "PE", max_notional_orden=50_000)
+
+    # Flujo pre-generado para no medir al generador aleatorio
+    flujo = [
+        (rng.choice(usuarios), rng.choice(INSTRUMENTOS), rng.choice(("Compra", "Venta")),
+         rng.randint(10, 500), round(rng.uniform(20, 150), 2) if rng.random() < 0.8 else None,
+         rng.random() < 0.7)
+        for _ in range(args.ordenes)
+    ]
+
+    latencias = []
+    siguiente_id = args.ordenes_vivas + 1
+    reloj = time.perf_counter_ns
+    inicio = time.perf_counter()
+    for id_usuario, instrumento, tipo, cantidad, precio, ejecutada in flujo:
+        t0 = reloj()
+        reserva, motivo = control.reservar(id_usuario, bolsa_de[id_usuario], instrumento, tipo, cantidad, precio)
+        latencias.append(reloj() - t0)
+        if motivo is not None:
+            continue
+        if ejecutada:
+            control.confirmar(reserva, precio_ejecucion=precio or 95.0)
+        else:
+            control.confirmar(reserva, id_orden=siguiente_id)
+            abiertas.append(siguiente_id)
+            siguiente_id += 1
+            # Mantiene estable la cantidad de órdenes en reposo
+            pos = rng.randrange(len(abiertas))
+            abiertas[pos], abiertas[-1] = abiertas[-1], abiertas[pos]
+            control.orden_cerrada(abiertas.pop())
+    total = time.perf_counter() - inicio
+
+    latencias.sort()
+    def percentil(p):
+        return latencias[min(int(len(latencias) * p), len(latencias) - 1)] / 1000
+
+    print(f"Órdenes verificadas: {args.ordenes:,} ({control.rechazos:,} rechazadas), "
+          f"{args.usuarios:,} usuarios, {args.ordenes_vivas:,} órdenes en reposo")
+    print(f"Ciclo completo (reservar + confirmar/cerrar): {total:.2f}s "
+          f"({args.ordenes / total:,.0f} órdenes/s, {total / args.ordenes * 1e6:.2f} µs/orden)")
+    print(f"reservar(): p50 {percentil(0.50):.2f} µs  p99 {percentil(0.99):.2f} µs  "
+          f"p99.9 {percentil(0.999):.2f} µs  máx {latencias[-1] / 1000:.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
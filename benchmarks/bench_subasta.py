@@ -0,0 +1,157 @@
+"""
+Benchmark del calce de subastas (subasta.py): precio de equilibrio,
+asignación precio-tiempo y emparejamiento vectorizados con NumPy, contra una
+implementación en Python puro, con N órdenes por instrumento.
+
+Uso (desde la raíz del repositorio):
+    python benchmarks/bench_subasta.py --ordenes 100000
+
+Con --con-db además se mide calzar() completo (índice + escritura en una
+transacción) contra la base de NUAM_MYSQL_URL, por ejemplo:
+    NUAM_MYSQL_URL=sqlite:///bench_subasta.db python benchmarks/bench_subasta.py --con-db
+"""
+import argparse
+import bisect
+import itertools
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from subasta import precio_equilibrio, asignar, emparejar
+
+INSTRUMENTOS = ["ENEL", "SQM-B", "BSANTANDER", "AAPL", "BBVA"]
+
+
+def generar(n, rng):
+    """Libro sintético: mitad compras, mitad ventas, precios en ticks de 0.01 alrededor de 100, 5% a mercado."""
+    tipo = rng.random(n) < 0.5
+    precios = np.round(rng.normal(100, 2, n), 2)
+    precios[rng.random(n) < 0.05] = np.nan
+    cantidades = rng.integers(10, 501, n)
+    return tipo, precios, cantidades
+
+
+def separar(tipo, precios, cantidades):
+    pc = np.where(np.isnan(precios[tipo]), np.inf, precios[tipo])
+    pv = np.where(np.isnan(precios[~tipo]), -np.inf, precios[~tipo])
+    return pc, cantidades[tipo], pv, cantidades[~tipo]
+
+
+def calce_numpy(pc, qc, pv, qv):
+    precio, volumen, _ = precio_equilibrio(pc, qc, pv, qv, referencia=100.0)
+    llenado_c, prioridad_c = asignar(pc, qc, np.arange(len(pc)), volumen, compra=True)
+    llenado_v, prioridad_v = asignar(pv, qv, np.arange(len(pv)), volumen, compra=False)
+    segmentos = emparejar(llenado_c, prioridad_c, llenado_v, prioridad_v)
+    return precio, volumen, len(segmentos[2])
+
+
+def calce_python(pc, qc, pv, qv):
+    """Misma regla con listas, sort y bisect (referencia de comparación)."""
+    compras = sorted(zip(pc.tolist(), qc.tolist()), key=lambda x: x[0])
+    ventas = sorted(zip(pv.tolist(), qv.tolist()), key=lambda x: x[0])
+    precios_c = [p for p, _ in compras]
+    precios_v = [p for p, _ in ventas]
+    acum_c = [0] + list(itertools.accumulate(q for _, q in compras))
+    acum_v = [0] + list(itertools.accumulate(q for _, q in ventas))
+    candidatos = sorted({p for p in precios_c + precios_v if p not in (float("inf"), float("-inf"))})
+    mejor = (0, 0, 0.0, None)
+    for p in candidatos:
+        demanda = acum_c[-1] - acum_c[bisect.bisect_left(precios_c, p)]
+        oferta = acum_v[bisect.bisect_right(precios_v, p)]
+        volumen = min(demanda, oferta)
+        clave = (volumen, -abs(demanda - oferta), -abs(p - 100.0), p)
+        if clave > mejor:
+            mejor = clave
+    volumen, precio = mejor[0], mejor[3]
+
+    # Prioridad precio-tiempo (la secuencia es la posición en el arreglo)
+    cola_c = [q for _, _, q in sorted((-p, i, q) for i, (p, q) in enumerate(zip(pc.tolist(), qc.tolist())))]
+    cola_v = [q for _, _, q in sorted((p, i, q) for i, (p, q) in enumerate(zip(pv.tolist(), qv.tolist())))]
+    segmentos, i, j = 0, 0, 0
+    resto_c, resto_v, pendiente = cola_c[0], cola_v[0], volumen
+    while pendiente > 0:
+        q = min(resto_c, resto_v, pendiente)
+        segmentos += 1
+        pendiente -= q
+        resto_c -= q
+        resto_v -= q
+        if resto_c == 0 and i + 1 < len(cola_c):
+            i += 1
+            resto_c = cola_c[i]
+        if resto_v == 0 and j + 1 < len(cola_v):
+            j += 1
+            resto_v = cola_v[j]
+    return precio, volumen, segmentos
+
+
+def medir(funcion, *argumentos, repeticiones=3):
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion(*argumentos)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor, resultado
+
+
+def con_db(n, rng):
+    from sqlalchemy import insert
+    from db_coneccion import Engine_MYSQL, get_mysql_session
+    from modelo_sql import Base, Orden
+    from libro_ordenes import indice_ordenes
+    from subasta import calzar
+
+    Base.metadata.create_all(Engine_MYSQL)
+    ahora = datetime.utcnow()
+    with get_mysql_session() as session:
+        for instrumento in INSTRUMENTOS:
+            tipo, precios, cantidades = generar(n, rng)
+            session.execute(insert(Orden), [
+                {"idUsuario": f"u{u}", "tipo": "Compra" if t else "Venta", "instrumento": instrumento,
+                 "cantidad": q, "precioLimite": None if np.isnan(p) else p, "estado": "Pendiente",
+                 "fechaCreacion": ahora}
+                for u, t, p, q in zip(rng.integers(0, 1000, n).tolist(), tipo.tolist(),
+                                      precios.tolist(), cantidades.tolist())
+            ])
+        indice_ordenes.cargar_desde_db(session)
+    print(f"\ncalzar() con escritura ({Engine_MYSQL.dialect.name}, {len(indice_ordenes):,} órdenes en el índice):")
+    for instrumento in INSTRUMENTOS:
+        inicio = time.perf_counter()
+        resumen = calzar(instrumento, "CL", 100.0)
+        duracion = time.perf_counter() - inicio
+        print(f"  {instrumento:<11} precio {resumen['precio']:.2f}  volumen {resumen['volumen']:,}  "
+              f"{resumen['transacciones']:,} transacciones  {duracion:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ordenes", type=int, default=100_000, help="Órdenes por instrumento")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--con-db", action="store_true", help="Mide también calzar() contra NUAM_MYSQL_URL")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.semilla)
+    total_np = total_py = 0.0
+    print(f"{args.ordenes:,} órdenes por instrumento")
+    for instrumento in INSTRUMENTOS:
+        libro = separar(*generar(args.ordenes, rng))
+        t_np, (precio, volumen, segmentos) = medir(calce_numpy, *libro)
+        t_py, (precio_py, volumen_py, segmentos_py) = medir(calce_python, *libro, repeticiones=1)
+        assert (precio, volumen, segmentos) == (precio_py, volumen_py, segmentos_py), \
+            ((precio, volumen, segmentos), (precio_py, volumen_py, segmentos_py))
+        total_np += t_np
+        total_py += t_py
+        print(f"  {instrumento:<11} precio {precio:.2f}  volumen {volumen:,}  {segmentos:,} transacciones  "
+              f"NumPy {t_np * 1000:.1f} ms  Python {t_py * 1000:.1f} ms")
+    print(f"Total: NumPy {total_np * 1000:.1f} ms  Python {total_py * 1000:.1f} ms  ({total_py / total_np:.1f}x)")
+
+    if args.con_db:
+        con_db(args.ordenes, rng)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+// precomprimir.js - Genera variantes .br y .gz del build (dist/) para que la API
+// las sirva tal cual en modo producción (backend/frontend_estatico.py).
+import { readdirSync, readFileSync, statSync, writeFileSync } from "node:fs";
+import { join, extname } from "node:path";
+import { fileURLToPath } from "node:url";
+import { brotliCompressSync, gzipSync, constants } from "node:zlib";
+
+const DIST = fileURLToPath(new URL("../dist/", import.meta.url));
+const EXTENSIONES = new Set([".html", ".js", ".css", ".json", ".svg", ".txt", ".map"]);
+const TAMANO_MINIMO = 1024;
+
+const archivos = (dir) =>
+  readdirSync(dir).flatMap((nombre) => {
+    const ruta = join(dir, nombre);
+    return statSync(ruta).isDirectory() ? archivos(ruta) : [ruta];
+  });
+
+let total = 0;
+for (const ruta of archivos(DIST)) {
+  if (!EXTENSIONES.has(extname(ruta))) continue;
+  const contenido = readFileSync(ruta);
+  if (contenido.length < TAMANO_MINIMO) continue;
+  writeFileSync(`${ruta}.br`, brotliCompressSync(contenido, {
+    params: {
+      [constants.BROTLI_PARAM_QUALITY]: constants.BROTLI_MAX_QUALITY,
+      [constants.BROTLI_PARAM_SIZE_HINT]: contenido.length,
+    },
+  }));
+  writeFileSync(`${ruta}.gz`, gzipSync(contenido, { level: 9 }));
+  total += 1;
+}
+console.log(`Precomprimidos ${total} archivos en ${DIST} (.br y .gz)`);
@@ -655,6 +655,7 @@ export default function AdminDashboard({ user, onLogout }) {
                   <tr style={{ background: '#F5F5F5', borderBottom: '1px solid #D9D9D9' }}>
                     <th style={{ padding: 12, textAlign: 'left', fontWeight: '600', fontSize: 12, color: '#1E1E1E' }}>ID</th>
                     <th style={{ padding: 12, textAlign: 'left', fontWeight: '600', fontSize: 12, color: '#1E1E1E' }}>Bolsa</th>
+                    <th style={{ padding: 12, textAlign: 'left', fontWeight: '600', fontSize: 12, color: '#1E1E1E' }}>Instrumento</th>
                     <th style={{ padding: 12, textAlign: 'left', fontWeight: '600', fontSize: 12, color: '#1E1E1E' }}>Orden Compra</th>
                     <th style={{ padding: 12, textAlign: 'left', fontWeight: '600', fontSize: 12, color: '#1E1E1E' }}>Orden Venta</th>
                     <th style={{ padding: 12, textAlign: 'left', fontWeight: '600', fontSize: 12, color: '#1E1E1E' }}>Cantidad</th>
@@ -674,6 +675,7 @@ export default function AdminDashboard({ user, onLogout }) {
                           {t.bolsaOrigen}
                         </span>
                       </td>
+                      <td style={{ padding: 12, fontSize: 12, color: '#1E1E1E', fontWeight: '600' }}>{t.instrumento || 'N/D'}</td>
                       <td style={{ padding: 12, fontSize: 12, color: '#1E1E1E' }}>{t.idOrdenCompra}</td>
                       <td style={{ padding: 12, fontSize: 12, color: '#1E1E1E' }}>{t.idOrdenVenta}</td>
                       <td style={{ padding: 12, fontSize: 12, color: '#1E1E1E' }}>{t.cantidadEjecutada}</td>
@@ -1,5 +1,8 @@
 // api.js - Centralized API service for NUAM Exchange
-const API_BASE_URL = "http://localhost:8000/api";
+// En producción el build lo sirve la propia API (mismo origen, sin preflight CORS);
+// en desarrollo Vite corre en otro puerto. VITE_API_URL permite apuntar a otro backend.
+const API_ORIGIN = import.meta.env.VITE_API_URL ?? (import.meta.env.PROD ? "" : "http://localhost:8000");
+const API_BASE_URL = `${API_ORIGIN}/api`;
 
 // Helper function to get session token from localStorage
 const getSessionToken = () => {
@@ -30,7 +33,7 @@ const handleResponse = async (response) => {
     if (error instanceof SyntaxError) {
       throw new Error("Invalid response from server. Backend may not be running.");
     }
-    throw new Error(error.message || "Failed to connect to server. Is the backend running on http://localhost:8000?");
+    throw new Error(error.message || `Failed to connect to server. Is the backend running on ${API_ORIGIN || window.location.origin}?`);
   }
 };
 
@@ -77,7 +80,7 @@ export const authAPI = {
    * @returns {Promise<{mongodb, mysql, status}>}
    */
   healthCheck: async () => {
-    const response = await fetch(`http://localhost:8000/health`);
+    const response = await fetch(`${API_ORIGIN}/health`);
     return handleResponse(response);
   },
 };
@@ -130,9 +133,14 @@ export const adminAPI = {
    * @param {number} limite - Maximum number of transactions (default 10)
    * @returns {Promise<{success, transacciones}>}
    */
-  getReports: async (limite = 10) => {
+  // filtros: { desde, hasta, instrumento, bolsaOrigen, lado, monto_minimo, group_by }
+  getReports: async (limite = 10, filtros = {}) => {
+    const params = new URLSearchParams({ limite });
+    for (const [clave, valor] of Object.entries(filtros)) {
+      if (valor !== undefined && valor !== null && valor !== "") params.append(clave, valor);
+    }
     const response = await fetch(
-      `${API_BASE_URL}/reportes?limite=${limite}`,
+      `${API_BASE_URL}/reportes?${params}`,
       {
         method: "GET",
         headers: getAuthHeaders(),